@@ -0,0 +1,69 @@
+"""
+Per-link latency: subprocess shell-out vs in-process backend
+On Windows this compares 'mklink' with the native Win32 backend. Elsewhere a
+shell 'ln' backend stands in for mklink and the POSIX backend for native.
+
+    python benchmarks/bench_backends.py [--links N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from junctwin_backends import HARDLINK, LinkError, get_backend  # noqa: E402
+
+
+class ShellLnBackend:
+    """POSIX stand-in for mklink: one shell process per link"""
+
+    name = "shell-ln"
+
+    def create(self, kind, link_path, target):
+        flag = "" if kind == HARDLINK else "-s"
+        result = subprocess.run(f'ln {flag} "{target}" "{link_path}"', shell=True,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise LinkError(result.stderr.strip(), None, str(link_path))
+
+
+def time_backend(backend, count, work_dir):
+    """Create count hard links to one file, return seconds per link"""
+    work_dir.mkdir()
+    target = work_dir / "target.bin"
+    target.write_bytes(b"junctwin")
+    links_dir = work_dir / backend.name
+    links_dir.mkdir()
+
+    start = time.perf_counter()
+    for i in range(count):
+        backend.create(HARDLINK, links_dir / f"target{i}[link].bin", target)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--links", type=int, default=200, help="links per backend")
+    args = parser.parse_args()
+
+    if os.name == "nt":
+        subprocess_backend, native_backend = get_backend("mklink"), get_backend("native")
+    else:
+        subprocess_backend, native_backend = ShellLnBackend(), get_backend("posix")
+
+    with tempfile.TemporaryDirectory(prefix="junctwin-bench-") as tmp:
+        slow = time_backend(subprocess_backend, args.links, Path(tmp) / "a")
+        fast = time_backend(native_backend, args.links, Path(tmp) / "b")
+
+    print(f"{subprocess_backend.name:<10} {slow * 1e6:10.1f} us/link")
+    print(f"{native_backend.name:<10} {fast * 1e6:10.1f} us/link")
+    print(f"speedup    {slow / fast:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+End-to-end latency of N concurrent Send To invocations, with and without the daemon
+Without the daemon every invocation starts its own interpreter and loads the
+GUI (the window itself is not opened, so this runs headless). With it, each
+invocation only forwards its path and exits; the time runs until the daemon
+has received every path as one batch.
+
+    python benchmarks/bench_daemon.py [--invocations N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from junctwin_daemon import SendToDaemon  # noqa: E402
+
+
+def launch_all(commands, env=None):
+    """Start every command at once and wait for all of them to exit"""
+    processes = [subprocess.Popen(c, env=env, stdout=subprocess.DEVNULL) for c in commands]
+    for process in processes:
+        process.wait()
+
+
+def time_standalone(paths):
+    """Each invocation pays for the interpreter and the GUI import"""
+    code = f"import sys; sys.path.insert(0, {str(ROOT)!r}); import junctwin_gui"
+    start = time.perf_counter()
+    launch_all([[sys.executable, "-c", code, path] for path in paths])
+    return time.perf_counter() - start
+
+
+def time_daemon(paths, address, window):
+    """Invocations forward to a daemon that is already running"""
+    received = []
+    done = threading.Event()
+
+    def handler(batch):
+        received.append(batch)
+        if sum(map(len, received)) >= len(paths):
+            done.set()
+
+    daemon = SendToDaemon(handler, address=address, window=window)
+    threading.Thread(target=daemon.serve, daemon=True).start()
+    time.sleep(0.2)
+
+    env = dict(os.environ, JUNCTWIN_DAEMON=address)
+    start = time.perf_counter()
+    launch_all([[sys.executable, str(ROOT / "junctwin.py"), path] for path in paths], env)
+    done.wait(30)
+    elapsed = time.perf_counter() - start
+    daemon.stop()
+    return elapsed, len(received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invocations", type=int, default=20, help="concurrent Send To invocations")
+    parser.add_argument("--window", type=int, default=300, metavar="MS", help="daemon batching window")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="junctwin-bench-") as tmp:
+        paths = []
+        for i in range(args.invocations):
+            folder = Path(tmp) / f"folder{i}"
+            folder.mkdir()
+            paths.append(str(folder))
+        if os.name == "nt":
+            address = rf"\\.\pipe\junctwin-bench-{os.getpid()}"
+        else:
+            address = str(Path(tmp) / "daemon.sock")
+
+        standalone = time_standalone(paths)
+        resident, batches = time_daemon(paths, address, args.window / 1000)
+
+    print(f"{args.invocations} invocations")
+    print(f"standalone  {standalone * 1000:8.0f} ms  ({args.invocations} interpreters with GUI)")
+    print(f"daemon      {resident * 1000:8.0f} ms  ({batches} batch(es), includes {args.window} ms window)")
+
+
+if __name__ == "__main__":
+    main()
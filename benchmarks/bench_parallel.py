@@ -0,0 +1,78 @@
+"""
+Batch link creation scaling from 1 to N worker threads
+Builds a tree of source files on tmpfs (/dev/shm when available) and hard-links
+every file into a per-folder target, once for each worker count.
+
+    python benchmarks/bench_parallel.py [--dirs D] [--files F] [--max-jobs N]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from junctwin_backends import get_backend  # noqa: E402
+from junctwin_engine import LinkEngine, run_batch, TO_SOURCE, FAILED  # noqa: E402
+
+
+def build_tree(root, dirs, files):
+    """Create dirs source folders holding files small files each"""
+    for d in range(dirs):
+        source_dir = root / "src" / f"d{d}"
+        source_dir.mkdir(parents=True)
+        for f in range(files):
+            (source_dir / f"f{f}.dat").write_bytes(b"x")
+
+
+def make_specs(root, dirs, files, run):
+    """One link spec per source file, into a fresh target folder per run"""
+    specs = []
+    for d in range(dirs):
+        target_dir = root / f"run{run}" / f"d{d}"
+        target_dir.mkdir(parents=True)
+        for f in range(files):
+            specs.append((root / "src" / f"d{d}" / f"f{f}.dat", target_dir, TO_SOURCE))
+    return specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dirs", type=int, default=64)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--max-jobs", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    tmp_base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    root = Path(tempfile.mkdtemp(prefix="junctwin-bench-", dir=tmp_base))
+    try:
+        build_tree(root, args.dirs, args.files)
+        engine = LinkEngine(get_backend())
+        total = args.dirs * args.files
+
+        jobs_list, jobs = [], 1
+        while jobs < args.max_jobs:
+            jobs_list.append(jobs)
+            jobs *= 2
+        jobs_list.append(args.max_jobs)
+
+        baseline = None
+        for run, jobs in enumerate(jobs_list):
+            specs = make_specs(root, args.dirs, args.files, run)
+            start = time.perf_counter()
+            failed = sum(1 for r in run_batch(specs, engine, jobs=jobs) if r.status == FAILED)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"jobs={jobs:<3} {total} links in {elapsed:7.3f}s "
+                  f"({total / elapsed:9.0f} links/s, {baseline / elapsed:4.2f}x)"
+                  + (f"  {failed} failed" if failed else ""))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Startup cost of the junctwin command line
+Runs junctwin under 'python -X importtime' and reports the modules it loads
+and their cumulative import time. Fails if the command line pulls in the GUI
+toolkit or goes over the time budget.
+
+    python benchmarks/bench_startup.py [--runs N] [--max-ms MS]
+"""
+
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "junctwin.py"
+
+# Command lines to time, and modules none of them should need
+COMMAND_LINES = (["--help"], ["history", "--help"], ["batch", "--help"])
+FORBIDDEN = ("tkinter", "sqlite3", "concurrent.futures", "hashlib")
+
+
+def import_times(args):
+    """{module: cumulative microseconds} for one run of junctwin with args"""
+    result = subprocess.run([sys.executable, "-X", "importtime", str(SCRIPT)] + args,
+                            capture_output=True, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="runs per command line (best is kept)")
+    parser.add_argument("--max-ms", type=float, default=100.0,
+                        help="fail if junctwin's own imports take longer than this")
+    args = parser.parse_args()
+
+    failed = False
+    for command in COMMAND_LINES:
+        runs = [import_times(command) for _ in range(args.runs)]
+        best = min(runs, key=lambda t: t.get("junctwin_cli", 0))
+        total_ms = best.get("junctwin_cli", 0) / 1000
+        heavy = [m for m in FORBIDDEN if any(name == m or name.startswith(m + ".") for name in best)]
+
+        print(f"junctwin {' '.join(command):<16} {total_ms:8.1f} ms  {len(best):4d} modules")
+        if heavy:
+            print(f"  loads {', '.join(heavy)}, which this command does not need")
+            failed = True
+        if total_ms > args.max_ms:
+            print(f"  over the {args.max_ms:.0f} ms budget")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Benchmark suite for the link engine on synthetic folder trees
+Generates wide, deep, many-small-files and many-links-to-one-target trees in
+a temporary folder and times the main code paths through the same engine and
+backend the application uses (the POSIX backend off Windows). Results are
+printed as JSON and can be compared against a stored baseline.
+
+    python benchmarks/bench_suite.py [--scale S] [--output FILE]
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json [--tolerance 1.5]
+    python benchmarks/bench_suite.py --save-baseline benchmarks/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from junctwin_backends import JUNCTION, HARDLINK, SYMLINK, get_backend  # noqa: E402
+from junctwin_engine import LinkEngine, LinkPlan, TO_SOURCE, FAILED, run_batch, link_name_for  # noqa: E402
+from junctwin_journal import Journal, Transaction  # noqa: E402
+from junctwin_mirror import mirror_tree  # noqa: E402
+from junctwin_index import LinkIndex  # noqa: E402
+from junctwin_audit import audit_links  # noqa: E402
+from junctwin_capture import capture_links  # noqa: E402
+
+
+# Synthetic trees
+
+def build_wide(root, dirs, files):
+    """dirs sibling folders of files small files each"""
+    for d in range(dirs):
+        folder = root / f"d{d}"
+        folder.mkdir(parents=True)
+        for f in range(files):
+            (folder / f"f{f}.dat").write_bytes(b"x")
+
+
+def build_deep(root, depth, files):
+    """One chain of depth nested folders with files files at each level"""
+    folder = root
+    for level in range(depth):
+        folder = folder / f"level{level}"
+        folder.mkdir(parents=True)
+        for f in range(files):
+            (folder / f"f{f}.dat").write_bytes(b"x")
+
+
+def build_small_files(root, count):
+    """count tiny files in one folder"""
+    root.mkdir(parents=True)
+    for i in range(count):
+        (root / f"small{i}.txt").write_bytes(b"%d" % i)
+
+
+def build_links_to_one(root, count):
+    """One target file with count hard links to it in a sibling folder"""
+    root.mkdir(parents=True)
+    target = root / "target.dat"
+    target.write_bytes(b"shared")
+    links = root / "links"
+    links.mkdir()
+    for i in range(count):
+        os.link(target, links / f"target{i}[link].dat")
+    return target
+
+
+# Timed cases: each returns the number of operations it performed
+
+class Case:
+    def __init__(self, name, setup, run):
+        self.name, self.setup, self.run = name, setup, run
+
+
+def plans_into(sources, folder, kind):
+    folder.mkdir(parents=True, exist_ok=True)
+    return [LinkPlan(kind, folder / link_name_for(s, kind), s, "") for s in sources]
+
+
+def make_cases(work, scale, engine):
+    small = work / "small"
+    wide = work / "wide"
+    deep = work / "deep"
+    shared = work / "shared"
+    count = 2000 * scale
+
+    build_small_files(small, count)
+    build_wide(wide, 20 * scale, 50)
+    build_deep(deep, 40, 10 * scale)
+    target = build_links_to_one(shared, count)
+    sources = sorted(small.iterdir())
+    folders = [d for d in (work / "folders" / f"dir{i}" for i in range(count))]
+    for folder in folders:
+        folder.mkdir(parents=True)
+    runs = iter(range(1 << 30))
+
+    def fresh(name):
+        return work / "out" / f"{name}{next(runs)}"
+
+    def apply_run(plans):
+        for plan in plans:
+            engine.apply(plan)
+        return len(plans)
+
+    def single(kind, items):
+        def setup():
+            return plans_into(items, fresh(kind), kind)
+
+        return setup, apply_run
+
+    def replace_setup():
+        plans = plans_into(sources, fresh("replace"), HARDLINK)
+        for plan in plans:
+            engine.apply(plan)
+        return plans
+
+    def replace_run(plans):
+        for plan in plans:
+            engine.apply(plan, replace=True)
+        return len(plans)
+
+    def batch_setup():
+        out = fresh("batch")
+        out.mkdir(parents=True)
+        return [(s, out, TO_SOURCE) for s in sources]
+
+    def batch_run(specs, jobs=1):
+        results = list(run_batch(specs, engine, jobs=jobs))
+        assert not any(r.status == FAILED for r in results)
+        return len(results)
+
+    def transaction_run(specs):
+        journal = Journal(work / "journal.jsonl")
+        try:
+            transaction = Transaction(engine, journal, "bench")
+            results = list(run_batch(specs, transaction))
+            transaction.commit()
+        finally:
+            journal.close()
+        return len(results)
+
+    def links_to_one_setup():
+        out = fresh("fanout")
+        out.mkdir(parents=True)
+        return [LinkPlan(HARDLINK, out / f"target{i}[link].dat", target, "") for i in range(count)]
+
+    def mirror_run(source):
+        def run(dest):
+            return sum(1 for _ in mirror_tree(source, dest, engine))
+        return run
+
+    def scan_setup():
+        index_path = fresh("index").with_suffix(".sqlite")
+        return LinkIndex(index_path)
+
+    def scan_run(index):
+        try:
+            return index.scan(shared).links_found + index.scan(work / "out").links_found
+        finally:
+            index.close()
+
+    audit_index = LinkIndex(work / "audit.sqlite")
+
+    def audit_setup():
+        audit_index.scan(work / "out")
+        return audit_index
+
+    def audit_run(index):
+        return sum(1 for _ in audit_links(index, work / "out"))
+
+    def capture_run(_):
+        # Every name of one file lands in one InodeMap group: must stay linear in the names
+        entries, _ = capture_links(shared, work / "capture.json")
+        return len(entries) + 1
+
+    return [
+        Case("create_hardlink", *single(HARDLINK, sources)),
+        Case("create_symlink", *single(SYMLINK, sources)),
+        Case("create_junction", *single(JUNCTION, folders)),
+        Case("replace_existing", replace_setup, replace_run),
+        Case("batch_create", batch_setup, batch_run),
+        Case("batch_create_j4", batch_setup, lambda specs: batch_run(specs, jobs=4)),
+        Case("batch_journaled", batch_setup, transaction_run),
+        Case("links_to_one_target", links_to_one_setup, apply_run),
+        Case("mirror_wide", lambda: fresh("mirror_wide"), mirror_run(wide)),
+        Case("mirror_deep", lambda: fresh("mirror_deep"), mirror_run(deep)),
+        Case("scan", scan_setup, scan_run),
+        Case("audit", audit_setup, audit_run),
+        Case("capture_links_to_one", lambda: None, capture_run),
+    ]
+
+
+def time_case(case, repeat):
+    """Best of repeat runs (setup is not timed): (seconds, operations)"""
+    best, ops = None, 0
+    for _ in range(repeat):
+        arg = case.setup()
+        start = time.perf_counter()
+        ops = case.run(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, ops
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against the baseline; returns the names of cases that regressed"""
+    regressed = []
+    previous = {r["case"]: r for r in baseline["results"]}
+    for result in results:
+        old = previous.get(result["case"])
+        if not old or not old["us_per_op"]:
+            continue
+        ratio = result["us_per_op"] / old["us_per_op"]
+        flag = "REGRESSION" if ratio > tolerance else ""
+        print(f"{result['case']:<22} {old['us_per_op']:10.1f} -> {result['us_per_op']:10.1f} us/op  "
+              f"{ratio:5.2f}x {flag}", file=sys.stderr)
+        if flag:
+            regressed.append(result["case"])
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=int, default=1, help="multiply tree sizes by S")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the best is kept")
+    parser.add_argument("--case", action="append", default=[], help="only run this case (repeatable)")
+    parser.add_argument("--output", metavar="FILE", help="write the JSON results to FILE instead of stdout")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with stored results; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="slowdown factor counted as a regression (default: 1.5)")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    tmp_base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    work = Path(tempfile.mkdtemp(prefix="junctwin-bench-", dir=tmp_base))
+    try:
+        engine = LinkEngine(get_backend())
+        results = []
+        for case in make_cases(work, args.scale, engine):
+            if args.case and case.name not in args.case:
+                continue
+            seconds, ops = time_case(case, args.repeat)
+            results.append({"case": case.name, "ops": ops, "seconds": round(seconds, 6),
+                            "us_per_op": round(seconds / max(ops, 1) * 1e6, 3)})
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {"backend": engine.backend.name, "scale": args.scale, "python": platform.python_version(),
+              "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("scale") != args.scale:
+            print(f"Baseline was recorded at scale {baseline.get('scale')}, not {args.scale}", file=sys.stderr)
+        regressed = compare(results, baseline, args.tolerance)
+        if regressed:
+            print(f"{len(regressed)} case(s) slower than the baseline: {', '.join(regressed)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
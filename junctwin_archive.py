@@ -0,0 +1,229 @@
+"""
+Link-preserving archives for junctwin
+Exports a folder tree as a standard tar stream in which every hard-linked file's
+data is stored once, the other names become tar hard link entries, and
+junctions and symbolic links are stored as links with their targets instead of
+the trees they point to. Importing rebuilds the links through the link engine.
+"""
+
+import os
+import sys
+import stat
+import tarfile
+import posixpath
+from pathlib import Path
+
+from junctwin_backends import JUNCTION, SYMLINK, HARDLINK, entry_link_kind, entry_lstat, read_link_target
+from junctwin_engine import LinkPlan, LinkResult, CREATED, FAILED
+from junctwin_inodes import InodeMap
+from junctwin_mirror import iter_files
+
+
+# Entry kinds besides the link kinds
+FOLDER = "folder"
+FILE = "file"
+
+# Large reads and writes: the archive and file data are streamed, never held whole
+BUFFER_SIZE = 1024 * 1024
+
+# PAX header fields junctwin adds to link entries (other tar tools ignore them)
+KIND_FIELD = "JUNCTWIN.kind"
+INSIDE_FIELD = "JUNCTWIN.inside"
+
+COMPRESSION = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".xz": "xz"}
+
+
+def _is_within(path, folder):
+    path, folder = os.path.normcase(path), os.path.normcase(folder).rstrip(os.sep)
+    return path == folder or path.startswith(folder + os.sep)
+
+
+def _open_stream(path, write):
+    """Binary stream for an archive path, '-' meaning stdout/stdin"""
+    if str(path) == "-":
+        return (sys.stdout if write else sys.stdin).buffer, False
+    return open(path, "wb" if write else "rb", buffering=BUFFER_SIZE), True
+
+
+def _tar_info(name, st, type_):
+    info = tarfile.TarInfo(name)
+    info.type = type_
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.mtime = int(st.st_mtime)
+    if type_ == tarfile.DIRTYPE:
+        info.mode |= 0o700
+    return info
+
+
+def export_tree(root, archive_path, exclude=()):
+    """Write root to a tar archive, yielding (kind, name) for each entry written
+
+    The tree is walked folder by folder and each file's data is copied
+    straight into the stream, so nothing is staged in memory or on disk.
+    Only files with more than one name are remembered, in a compact
+    InodeMap, to turn their later names into hard link entries. Links
+    whose target lies inside root are stored as relative links, so they
+    point into the imported copy rather than back at the original.
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        raise NotADirectoryError(f"Not a folder: {root}")
+    suffix = os.path.splitext(str(archive_path))[1].lower()
+    # An archive written inside root must not be archived into itself
+    own_path = None if str(archive_path) == "-" else os.path.normcase(os.path.abspath(archive_path))
+    stream, owned = _open_stream(archive_path, write=True)
+    seen = InodeMap()
+    try:
+        with tarfile.open(fileobj=stream, mode="w|" + COMPRESSION.get(suffix, ""),
+                          format=tarfile.PAX_FORMAT, bufsize=BUFFER_SIZE) as tar:
+            tar.copybufsize = BUFFER_SIZE
+            for rel, entry in iter_files(root, exclude=exclude):
+                if entry is None:
+                    st = os.stat(os.path.join(root, rel), follow_symlinks=False)
+                    tar.addfile(_tar_info(rel, st, tarfile.DIRTYPE))
+                    yield FOLDER, rel
+                    continue
+
+                if own_path is not None and os.path.normcase(entry.path) == own_path:
+                    continue
+                name = posixpath.join(rel, entry.name) if rel else entry.name
+                st = entry_lstat(entry)
+                kind = entry_link_kind(entry, st)
+                if kind in (JUNCTION, SYMLINK):
+                    info = _tar_info(name, st, tarfile.SYMTYPE)
+                    target = read_link_target(entry.path)
+                    info.pax_headers = {KIND_FIELD: kind}
+                    absolute = os.path.normpath(os.path.join(os.path.dirname(entry.path), target))
+                    if _is_within(absolute, root):
+                        # Relative to the link's folder, as plain tar tools expect
+                        target = os.path.relpath(absolute, os.path.dirname(entry.path)).replace(os.sep, "/")
+                        info.pax_headers[INSIDE_FIELD] = "1"
+                    info.linkname = target
+                    tar.addfile(info)
+                    yield kind, name
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+
+                if st.st_nlink > 1:
+                    first = seen.get(st.st_dev, st.st_ino)
+                    if first:
+                        info = _tar_info(name, st, tarfile.LNKTYPE)
+                        info.linkname = first[0]
+                        tar.addfile(info)
+                        yield HARDLINK, name
+                        continue
+                    seen.add(st.st_dev, st.st_ino, name)
+                info = _tar_info(name, st, tarfile.REGTYPE)
+                info.size = st.st_size
+                with open(entry.path, "rb", buffering=0) as f:
+                    tar.addfile(info, f)
+                yield FILE, name
+    finally:
+        if owned:
+            stream.close()
+        else:
+            stream.flush()
+
+
+def _safe_path(dest, name):
+    """dest/name, refusing names that would land outside dest"""
+    parts = name.replace("\\", "/").split("/")
+    if name.startswith(("/", "\\")) or os.path.splitdrive(name)[0] or ".." in parts:
+        raise ValueError(f"Unsafe path in archive: {name}")
+    return dest.joinpath(*[part for part in parts if part not in ("", ".")])
+
+
+def _check_inside(path, dest):
+    """Refuse path if it resolves outside dest through links already on disk
+
+    Those include links this import has just made: an entry 'a/x' after a
+    link 'a' pointing elsewhere must not be written through it.
+    """
+    if not _is_within(os.path.realpath(path), str(dest)):
+        raise ValueError(f"Path in archive leads outside the destination: {path}")
+
+
+def _write_file(tar, member, path):
+    source = tar.extractfile(member)
+    with open(path, "wb", buffering=0) as f:
+        buffer = bytearray(BUFFER_SIZE)
+        view = memoryview(buffer)
+        while True:
+            count = source.readinto(buffer)
+            if not count:
+                break
+            f.write(view[:count])
+    if os.name != "nt":
+        os.chmod(path, member.mode)
+    os.utime(path, (member.mtime, member.mtime))
+
+
+def import_tree(archive_path, dest, engine):
+    """Unpack a tar archive into dest, yielding a LinkResult per entry
+
+    Folders and file data are written directly (their results carry
+    FOLDER or FILE as the plan's kind); hard links, junctions and
+    symbolic links are created through engine, so they are indexed and
+    measured like any other junctwin link. Junctions and symbolic links
+    are made last, once everything they may point to inside the archive
+    exists. Archives from other tar tools work too; their symbolic links
+    are restored as symbolic links.
+    """
+    dest = Path(dest).resolve()
+    dest.mkdir(parents=True, exist_ok=True)
+    stream, owned = _open_stream(archive_path, write=False)
+    deferred = []
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*", bufsize=BUFFER_SIZE) as tar:
+            for member in tar:
+                plan = LinkPlan(None, dest / member.name, None, "")
+                try:
+                    path = _safe_path(dest, member.name)
+                    plan = LinkPlan(FOLDER if member.isdir() else FILE, path, None, "")
+                    if member.isdir():
+                        _check_inside(path, dest)
+                        path.mkdir(parents=True, exist_ok=True)
+                    elif member.isfile():
+                        # The file itself too: writing follows a link already at its name
+                        _check_inside(path, dest)
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        _write_file(tar, member, path)
+                    elif member.islnk():
+                        plan = LinkPlan(HARDLINK, path, _safe_path(dest, member.linkname), "")
+                        _check_inside(path.parent, dest)
+                        _check_inside(plan.target, dest)
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        yield engine.apply(plan)
+                        continue
+                    elif member.issym():
+                        kind = member.pax_headers.get(KIND_FIELD, SYMLINK)
+                        target = member.linkname
+                        if member.pax_headers.get(INSIDE_FIELD):
+                            # Junctions need an absolute target: resolve it within dest
+                            target = os.path.normpath(os.path.join(path.parent, target))
+                            if not _is_within(target, str(dest)):
+                                raise ValueError(f"Link target outside the archive: {member.linkname}")
+                        deferred.append(LinkPlan(kind if kind in (JUNCTION, SYMLINK) else SYMLINK,
+                                                 path, Path(target), ""))
+                        continue
+                    else:
+                        # Devices, fifos and the like are not junctwin's business
+                        continue
+                except (OSError, ValueError, tarfile.TarError) as e:
+                    yield LinkResult(plan, FAILED, e)
+                    continue
+                yield LinkResult(plan, CREATED, None)
+    finally:
+        if owned:
+            stream.close()
+
+    for plan in deferred:
+        try:
+            # Checked now, after the links made before it in this loop exist
+            _check_inside(plan.link_path.parent, dest)
+            plan.link_path.parent.mkdir(parents=True, exist_ok=True)
+        except (OSError, ValueError) as e:
+            yield LinkResult(plan, FAILED, e)
+            continue
+        yield engine.apply(plan)
@@ -0,0 +1,137 @@
+"""
+Broken link auditor for junctwin
+Checks the junctions and symbolic links under a folder for missing targets,
+targets on another volume and cycles, using the link index so only changed
+folders are re-read.
+"""
+
+import os
+import errno
+from collections import namedtuple
+from pathlib import Path
+
+from junctwin_backends import JUNCTION, SYMLINK
+from junctwin_engine import LinkPlan
+
+
+# Audit outcomes
+OK = "ok"
+MISSING = "missing"
+CROSS_VOLUME = "cross-volume"
+CYCLE = "cycle"
+
+# Problems that make a link unusable (as opposed to merely unusual)
+BROKEN = (MISSING, CYCLE)
+
+# One audited link: the index record, what is wrong with it and its absolute target
+AuditFinding = namedtuple("AuditFinding", "record problem target")
+
+
+def resolve_target(link_path, target):
+    """Absolute form of a link target (relative symlink targets are relative to the link's folder)"""
+    return os.path.normpath(os.path.join(os.path.dirname(link_path), target))
+
+
+def _is_within(path, folder):
+    path, folder = os.path.normcase(path), os.path.normcase(folder).rstrip(os.sep)
+    return path == folder or path.startswith(folder + os.sep)
+
+
+class TargetCache:
+    """Remembers the state of each target, so many links to one folder cost one stat"""
+
+    def __init__(self):
+        self.states = {}
+        self.folders = {}
+
+    def state(self, target):
+        """(problem, (st_dev, st_ino)) for a target: problem is None, MISSING or CYCLE"""
+        key = os.path.normcase(target)
+        if key not in self.states:
+            try:
+                st = os.stat(target)
+                self.states[key] = (None, (st.st_dev, st.st_ino))
+            except OSError as e:
+                self.states[key] = (CYCLE if e.errno == errno.ELOOP else MISSING, None)
+        return self.states[key]
+
+    def ancestors(self, folder):
+        """(device, inode) of folder and every folder above it, worked out once per folder"""
+        keys = self.folders.get(folder)
+        if keys is None:
+            parent = os.path.dirname(folder)
+            keys = self.ancestors(parent) if parent != folder else frozenset()
+            key = self.state(folder)[1]
+            if key is not None:
+                keys = keys | {key}
+            self.folders[folder] = keys
+        return keys
+
+    def inside(self, path, folder_key):
+        """Whether the folder identified by folder_key is path's folder or one of its ancestors
+
+        Compared by (device, inode), as the cycle-safe walker does, so a
+        link reaching its own ancestor through another drive letter, a
+        subst drive or a mount point is caught too. Links in one folder
+        share its ancestor set, so each folder is only climbed once.
+        """
+        return folder_key in self.ancestors(os.path.dirname(path))
+
+
+def audit_links(index, root, cache=None):
+    """Check every junction and symbolic link indexed under root
+
+    Bring the index up to date first (index.scan) to pick up links added
+    since the last scan; unchanged folders are not re-read.
+    """
+    cache = cache if cache is not None else TargetCache()
+    for kind in (JUNCTION, SYMLINK):
+        for record in index.query(kind=kind, under=root):
+            if record.target is None:
+                continue
+            target = resolve_target(record.path, record.target)
+            problem, key = cache.state(target)
+            if problem is None:
+                if _is_within(record.path, target) or cache.inside(record.path, key):
+                    # The link sits inside its own target: following it never ends
+                    problem = CYCLE
+                elif key[0] != record.dev:
+                    problem = CROSS_VOLUME
+            yield AuditFinding(record, problem or OK, target)
+
+
+def moved_target(target, old, new):
+    """target with its OLD prefix swapped for NEW, or None if it is not under OLD"""
+    if not _is_within(target, old):
+        return None
+    return new.rstrip(os.sep) + target[len(old.rstrip(os.sep)):]
+
+
+def repair_plan(finding, prefix_map):
+    """Plan re-pointing a broken link whose target moved, from OLD=NEW prefixes"""
+    for old, new in prefix_map:
+        new_target = moved_target(finding.target, old, new)
+        if new_target is not None and os.path.exists(new_target):
+            link_path = Path(finding.record.path)
+            return LinkPlan(finding.record.kind, link_path, Path(new_target),
+                            f"in {link_path.parent.name}")
+    return None
+
+
+def retarget_plans(index, root, old, new):
+    """Plans re-pointing every junction and symlink indexed under root whose target is under old
+
+    Yields (plan, old_target) whether or not the target is broken, so a
+    data folder can be moved from one drive to another and its links
+    rewritten in bulk. Links that would point at themselves are skipped.
+    """
+    for kind in (JUNCTION, SYMLINK):
+        for record in index.query(kind=kind, under=root):
+            if record.target is None:
+                continue
+            target = resolve_target(record.path, record.target)
+            new_target = moved_target(target, old, new)
+            if new_target is None or _is_within(record.path, new_target):
+                continue
+            link_path = Path(record.path)
+            yield LinkPlan(kind, link_path, Path(new_target), f"in {link_path.parent.name}"), target
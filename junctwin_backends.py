@@ -0,0 +1,511 @@
+"""
+Link creation backends for junctwin
+Each backend knows how to create and remove junctions, hard links and
+symbolic links on one platform, so the link engine never touches the OS directly.
+Copy-on-write clones and plain copies stand in for file links where those are refused.
+"""
+
+import os
+import sys
+import stat
+import errno
+import struct
+
+
+# Link kinds understood by every backend
+JUNCTION = "junction"
+HARDLINK = "hardlink"
+SYMLINK = "symlink"
+# Not links: independent files, a clone sharing the target's blocks until either is written
+CLONE = "clone"
+COPY = "copy"
+
+# Chunk size for copies the kernel cannot do by itself
+COPY_BUFFER_SIZE = 1024 * 1024
+# Linux _IOW(0x94, 9, int), for Pythons whose fcntl does not name it
+FICLONE = 0x40049409
+
+
+class LinkError(OSError):
+    """Raised by a backend when a link operation fails"""
+
+    def __init__(self, message, code=None, path=None, winerror=None):
+        super().__init__(code, message, path)
+        self.code = code
+        self.message = message
+        self.winerror = winerror
+
+    def __str__(self):
+        return self.message
+
+    @property
+    def access_denied(self):
+        return self.code in (errno.EACCES, errno.EPERM)
+
+
+def _fill_new_file(source, dest, fill):
+    """Create dest (never over an existing file), fill(src_fd, dst_fd, size) it from source
+
+    Mode and timestamps are copied too, so an unchanged source can be told
+    from a stale copy; a failure leaves no half-written dest behind.
+    """
+    binary = getattr(os, "O_BINARY", 0)
+    try:
+        src = os.open(source, os.O_RDONLY | binary)
+        try:
+            st = os.fstat(src)
+            dst = os.open(dest, os.O_RDWR | os.O_CREAT | os.O_EXCL | binary, 0o666)
+            try:
+                fill(src, dst, st.st_size)
+            except BaseException:
+                os.close(dst)
+                os.unlink(dest)
+                raise
+            os.close(dst)
+        finally:
+            os.close(src)
+        os.chmod(dest, stat.S_IMODE(st.st_mode))
+        os.utime(dest, ns=(st.st_atime_ns, st.st_mtime_ns))
+    except OSError as e:
+        raise LinkError(e.strerror or str(e), e.errno, str(dest), getattr(e, "winerror", None)) from e
+
+
+def _clone_range(src, dst, size):
+    import fcntl
+    fcntl.ioctl(dst, getattr(fcntl, "FICLONE", FICLONE), src)
+
+
+def _copy_range(src, dst, size):
+    """Copy in the kernel where it can (which may share blocks too), else in large chunks"""
+    copied = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while copied < size:
+                count = copy_file_range(src, dst, size - copied)
+                if not count:
+                    break
+                copied += count
+        except OSError as e:
+            # Not between these filesystems: both offsets are still at 'copied'
+            if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(src, "rb", buffering=0, closefd=False) as reader:
+        while True:
+            count = reader.readinto(buffer)
+            if not count:
+                break
+            written = 0
+            while written < count:
+                written += os.write(dst, view[written:count])
+
+
+def clone_file(source, dest):
+    """Make dest a copy-on-write clone of source, sharing its blocks until either is written
+
+    Uses the FICLONE ioctl (btrfs, XFS, bcachefs, ...). Raises LinkError
+    with EXDEV or EOPNOTSUPP where the two cannot share blocks, so the
+    caller can fall back to another kind.
+    """
+    if not sys.platform.startswith("linux"):
+        raise LinkError("Cloning files is not supported on this system", errno.EOPNOTSUPP, str(dest))
+    _fill_new_file(source, dest, _clone_range)
+
+
+def copy_file(source, dest):
+    """Copy source to a new file dest, with copy_file_range where available"""
+    _fill_new_file(source, dest, _copy_range)
+
+
+class MklinkBackend:
+    """Create links by running the Windows 'mklink' command"""
+
+    name = "mklink"
+    flags = {JUNCTION: "/J", HARDLINK: "/H", SYMLINK: ""}
+
+    def create(self, kind, link_path, target):
+        import subprocess
+
+        if kind == COPY:
+            return copy_file(target, link_path)
+        if kind == CLONE:
+            raise LinkError("mklink cannot clone files", errno.EOPNOTSUPP, str(link_path))
+        flag = self.flags[kind]
+        cmd = f'mklink {flag} "{link_path}" "{target}"' if flag else f'mklink "{link_path}" "{target}"'
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            error_msg = (result.stderr or result.stdout).strip()
+            code = errno.EACCES if "access is denied" in error_msg.lower() else None
+            raise LinkError(error_msg, code, str(link_path))
+
+    def remove(self, link_path):
+        # Junctions are removed like empty directories, without touching the target
+        if os.path.isdir(link_path):
+            os.rmdir(link_path)
+        else:
+            os.unlink(link_path)
+
+
+# Win32 error codes mapped to errno values, so callers never parse message text
+WINERROR_TO_ERRNO = {
+    1: errno.EINVAL,      # ERROR_INVALID_FUNCTION (e.g. no reparse point support)
+    2: errno.ENOENT,      # ERROR_FILE_NOT_FOUND
+    3: errno.ENOENT,      # ERROR_PATH_NOT_FOUND
+    5: errno.EACCES,      # ERROR_ACCESS_DENIED
+    17: errno.EXDEV,      # ERROR_NOT_SAME_DEVICE
+    50: errno.EOPNOTSUPP, # ERROR_NOT_SUPPORTED
+    80: errno.EEXIST,     # ERROR_FILE_EXISTS
+    183: errno.EEXIST,    # ERROR_ALREADY_EXISTS
+    1142: errno.EMLINK,   # ERROR_TOO_MANY_LINKS
+    1314: errno.EPERM,    # ERROR_PRIVILEGE_NOT_HELD
+}
+
+GENERIC_WRITE = 0x40000000
+OPEN_EXISTING = 3
+FILE_FLAG_OPEN_REPARSE_POINT = 0x00200000
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+FSCTL_SET_REPARSE_POINT = 0x000900A4
+IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003
+SYMBOLIC_LINK_FLAG_DIRECTORY = 0x1
+SYMBOLIC_LINK_FLAG_ALLOW_UNPRIVILEGED_CREATE = 0x2
+INVALID_HANDLE_VALUE = -1
+COPY_FILE_FAIL_IF_EXISTS = 0x1
+FILE_END_OF_FILE_INFO = 6
+FSCTL_SET_SPARSE = 0x000900C4
+FSCTL_GET_INTEGRITY_INFORMATION = 0x0009027C
+FSCTL_SET_INTEGRITY_INFORMATION = 0x0009C280
+FSCTL_DUPLICATE_EXTENTS_TO_FILE = 0x00098344
+# Block clone requests must stay under 4 GB each
+CLONE_CHUNK_SIZE = 1024 ** 3
+
+
+def mount_point_reparse_data(target):
+    """Build the REPARSE_DATA_BUFFER that turns an empty folder into a junction"""
+    substitute = ("\\??\\" + str(target)).encode("utf-16-le")
+    printable = str(target).encode("utf-16-le")
+    # Both names are stored NUL-terminated; lengths exclude the terminator
+    path_buffer = substitute + b"\0\0" + printable + b"\0\0"
+    data_length = 8 + len(path_buffer)
+    header = struct.pack("<IHHHHHH", IO_REPARSE_TAG_MOUNT_POINT, data_length, 0,
+                         0, len(substitute), len(substitute) + 2, len(printable))
+    return header + path_buffer
+
+
+class NativeBackend:
+    """Create links in-process with the Win32 API instead of spawning cmd.exe"""
+
+    name = "native"
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self._ctypes = ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+        self._create_hard_link = kernel32.CreateHardLinkW
+        self._create_hard_link.argtypes = (wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.LPVOID)
+        self._create_hard_link.restype = wintypes.BOOL
+
+        self._create_symbolic_link = kernel32.CreateSymbolicLinkW
+        self._create_symbolic_link.argtypes = (wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD)
+        self._create_symbolic_link.restype = wintypes.BOOLEAN
+
+        self._create_file = kernel32.CreateFileW
+        self._create_file.argtypes = (wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                      wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE)
+        self._create_file.restype = wintypes.HANDLE
+
+        self._device_io_control = kernel32.DeviceIoControl
+        self._device_io_control.argtypes = (wintypes.HANDLE, wintypes.DWORD, wintypes.LPVOID, wintypes.DWORD,
+                                            wintypes.LPVOID, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD),
+                                            wintypes.LPVOID)
+        self._device_io_control.restype = wintypes.BOOL
+
+        self._close_handle = kernel32.CloseHandle
+        self._close_handle.argtypes = (wintypes.HANDLE,)
+        self._close_handle.restype = wintypes.BOOL
+
+        self._copy_file = kernel32.CopyFileExW
+        self._copy_file.argtypes = (wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.LPVOID, wintypes.LPVOID,
+                                    wintypes.LPVOID, wintypes.DWORD)
+        self._copy_file.restype = wintypes.BOOL
+
+        self._set_file_information = kernel32.SetFileInformationByHandle
+        self._set_file_information.argtypes = (wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID, wintypes.DWORD)
+        self._set_file_information.restype = wintypes.BOOL
+
+    def _error(self, link_path):
+        winerror = self._ctypes.get_last_error()
+        message = self._ctypes.FormatError(winerror).strip()
+        return LinkError(message, WINERROR_TO_ERRNO.get(winerror), str(link_path), winerror)
+
+    def create(self, kind, link_path, target):
+        if kind == HARDLINK:
+            if not self._create_hard_link(str(link_path), str(target), None):
+                raise self._error(link_path)
+        elif kind == SYMLINK:
+            flags = SYMBOLIC_LINK_FLAG_ALLOW_UNPRIVILEGED_CREATE
+            if os.path.isdir(target):
+                flags |= SYMBOLIC_LINK_FLAG_DIRECTORY
+            if not self._create_symbolic_link(str(link_path), str(target), flags):
+                raise self._error(link_path)
+        elif kind == CLONE:
+            _fill_new_file(target, link_path, self._clone_range)
+        elif kind == COPY:
+            # Windows 11 24H2 and later clone by itself here on ReFS and Dev Drives
+            if not self._copy_file(str(target), str(link_path), None, None, None, COPY_FILE_FAIL_IF_EXISTS):
+                raise self._error(link_path)
+        else:
+            self._create_junction(link_path, target)
+
+    def _clone_range(self, src, dst, size):
+        """Block-clone the open file src into dst with FSCTL_DUPLICATE_EXTENTS_TO_FILE
+
+        Only ReFS supports it; elsewhere the first call fails with
+        ERROR_INVALID_FUNCTION. dst must match src's integrity setting and
+        sparseness and already have its full size, and every range is
+        whole clusters (the last may run past the end of the file).
+        """
+        import msvcrt
+        ctypes = self._ctypes
+        src_handle, dst_handle = msvcrt.get_osfhandle(src), msvcrt.get_osfhandle(dst)
+        returned = ctypes.c_ulong(0)
+
+        def check(ok):
+            if not ok:
+                raise ctypes.WinError(ctypes.get_last_error())
+
+        integrity = ctypes.create_string_buffer(16)
+        check(self._device_io_control(src_handle, FSCTL_GET_INTEGRITY_INFORMATION, None, 0,
+                                      integrity, len(integrity), ctypes.byref(returned), None))
+        checksum, _, flags, _, cluster = struct.unpack("<HHIII", integrity.raw)
+        if os.fstat(src).st_file_attributes & stat.FILE_ATTRIBUTE_SPARSE_FILE:
+            check(self._device_io_control(dst_handle, FSCTL_SET_SPARSE, None, 0,
+                                          None, 0, ctypes.byref(returned), None))
+        setting = struct.pack("<HHI", checksum, 0, flags)
+        check(self._device_io_control(dst_handle, FSCTL_SET_INTEGRITY_INFORMATION, setting, len(setting),
+                                      None, 0, ctypes.byref(returned), None))
+        end_of_file = ctypes.c_longlong(size)
+        check(self._set_file_information(dst_handle, FILE_END_OF_FILE_INFO, ctypes.byref(end_of_file),
+                                         ctypes.sizeof(end_of_file)))
+
+        offset = 0
+        while offset < size:
+            count = -(-min(CLONE_CHUNK_SIZE, size - offset) // cluster) * cluster
+            extents = struct.pack("Pqqq", src_handle, offset, offset, count)
+            check(self._device_io_control(dst_handle, FSCTL_DUPLICATE_EXTENTS_TO_FILE, extents, len(extents),
+                                          None, 0, ctypes.byref(returned), None))
+            offset += count
+
+    def _create_junction(self, link_path, target):
+        try:
+            os.mkdir(link_path)
+        except OSError as e:
+            raise LinkError(e.strerror or str(e), e.errno, str(link_path),
+                            getattr(e, "winerror", None)) from e
+
+        try:
+            self._set_mount_point(link_path, target)
+        except LinkError:
+            # Leave nothing behind: the folder is still empty and not yet a junction
+            os.rmdir(link_path)
+            raise
+
+    def _set_mount_point(self, link_path, target):
+        """Write junction reparse data to an empty folder or over an existing junction's"""
+        handle = self._create_file(str(link_path), GENERIC_WRITE, 0, None, OPEN_EXISTING,
+                                   FILE_FLAG_OPEN_REPARSE_POINT | FILE_FLAG_BACKUP_SEMANTICS, None)
+        if handle is None or handle == INVALID_HANDLE_VALUE:
+            raise self._error(link_path)
+
+        try:
+            data = mount_point_reparse_data(os.path.abspath(target))
+            returned = self._ctypes.c_ulong(0)
+            ok = self._device_io_control(handle, FSCTL_SET_REPARSE_POINT, data, len(data),
+                                         None, 0, self._ctypes.byref(returned), None)
+            error = None if ok else self._error(link_path)
+        finally:
+            self._close_handle(handle)
+        if error is not None:
+            raise error
+
+    def retarget(self, kind, link_path, target):
+        """Point an existing junction or file symlink elsewhere without deleting it
+
+        Junctions get new reparse data on the same folder; file symlinks are
+        made under a temporary name and renamed over the old one. Returns
+        False for what cannot be changed in place (folder symlinks), which
+        the caller then deletes and recreates.
+        """
+        if kind == JUNCTION:
+            self._set_mount_point(link_path, target)
+            return True
+        if kind != SYMLINK or os.path.isdir(link_path):
+            return False
+        temp_path = f"{link_path}.junctwin-tmp"
+        self.create(SYMLINK, temp_path, target)
+        try:
+            os.replace(temp_path, link_path)
+        except OSError as e:
+            os.unlink(temp_path)
+            raise LinkError(e.strerror or str(e), e.errno, str(link_path),
+                            getattr(e, "winerror", None)) from e
+        return True
+
+    def remove(self, link_path):
+        try:
+            # Junctions and directory symlinks go with rmdir, which never touches the target
+            if os.path.isdir(link_path):
+                os.rmdir(link_path)
+            else:
+                os.unlink(link_path)
+        except OSError as e:
+            raise LinkError(e.strerror or str(e), e.errno, str(link_path),
+                            getattr(e, "winerror", None)) from e
+
+
+class PosixBackend:
+    """Create links with os.link/os.symlink (junctions become directory symlinks)"""
+
+    name = "posix"
+
+    def create(self, kind, link_path, target):
+        if kind == CLONE:
+            return clone_file(target, link_path)
+        if kind == COPY:
+            return copy_file(target, link_path)
+        try:
+            if kind == HARDLINK:
+                os.link(target, link_path)
+            else:
+                os.symlink(target, link_path, target_is_directory=(kind == JUNCTION))
+        except OSError as e:
+            raise LinkError(e.strerror or str(e), e.errno, str(link_path)) from e
+
+    def retarget(self, kind, link_path, target):
+        """Swap a symlink for one pointing at target: made aside, then renamed over it in one step"""
+        if kind == HARDLINK:
+            return False
+        temp_path = f"{link_path}.junctwin-tmp"
+        try:
+            os.symlink(target, temp_path, target_is_directory=(kind == JUNCTION))
+            try:
+                os.replace(temp_path, link_path)
+            except OSError:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            raise LinkError(e.strerror or str(e), e.errno, str(link_path)) from e
+        return True
+
+    def remove(self, link_path):
+        try:
+            if not os.path.islink(link_path) and os.path.isdir(link_path):
+                os.rmdir(link_path)
+            else:
+                os.unlink(link_path)
+        except OSError as e:
+            raise LinkError(e.strerror or str(e), e.errno, str(link_path)) from e
+
+
+def entry_lstat(entry):
+    """lstat result for a DirEntry, with inode and link count filled in
+
+    On Windows the stat data cached by os.scandir has no st_ino or
+    st_nlink, so regular files need one extra call; elsewhere this is free.
+    """
+    st = entry.stat(follow_symlinks=False)
+    if st.st_ino == 0 and stat.S_ISREG(st.st_mode):
+        st = os.stat(entry.path, follow_symlinks=False)
+    return st
+
+
+def entry_is_link(entry):
+    """Check if a DirEntry is a symbolic link or junction, which walkers must not enter"""
+    if entry.is_symlink():
+        return True
+    if os.name == "nt":
+        # Cached by os.scandir on Windows, so this costs no extra call
+        st = entry.stat(follow_symlinks=False)
+        return getattr(st, "st_reparse_tag", 0) == IO_REPARSE_TAG_MOUNT_POINT
+    return False
+
+
+def entry_link_kind(entry, st=None):
+    """Classify a DirEntry as JUNCTION, SYMLINK or HARDLINK, or None for plain items
+
+    st is the entry's entry_lstat() result if the caller already has one.
+    Outside Windows there are no junctions, so symbolic links to folders
+    (which is what the POSIX backend creates for them) count as junctions.
+    """
+    if st is None:
+        st = entry_lstat(entry)
+    if getattr(st, "st_reparse_tag", 0) == IO_REPARSE_TAG_MOUNT_POINT:
+        return JUNCTION
+    if entry.is_symlink():
+        if os.name != "nt" and entry.is_dir():
+            return JUNCTION
+        return SYMLINK
+    if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+        return HARDLINK
+    return None
+
+
+def path_link_kind(path, st=None):
+    """Like entry_link_kind, for a path instead of a DirEntry"""
+    if st is None:
+        st = os.stat(path, follow_symlinks=False)
+    if getattr(st, "st_reparse_tag", 0) == IO_REPARSE_TAG_MOUNT_POINT:
+        return JUNCTION
+    if stat.S_ISLNK(st.st_mode):
+        if os.name != "nt" and os.path.isdir(path):
+            return JUNCTION
+        return SYMLINK
+    if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+        return HARDLINK
+    return None
+
+
+def read_link_target(link_path):
+    """Return the path a junction or symbolic link points to"""
+    target = os.readlink(link_path)
+    # Junction substitute names may come back in NT namespace form
+    for prefix in ("\\\\?\\", "\\??\\"):
+        if target.startswith(prefix):
+            target = target[len(prefix):]
+            break
+    return target
+
+
+BACKENDS = {
+    NativeBackend.name: NativeBackend,
+    MklinkBackend.name: MklinkBackend,
+    PosixBackend.name: PosixBackend,
+}
+
+
+def get_backend(name=None):
+    """Return a backend instance by name, or the platform default
+
+    On Windows the default is the in-process native backend; 'mklink' is
+    only used when the Win32 API cannot be loaded.
+    """
+    if name is None:
+        if os.name != "nt":
+            return PosixBackend()
+        try:
+            return NativeBackend()
+        except (ImportError, AttributeError, OSError):
+            return MklinkBackend()
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend: {name} (choose from {', '.join(sorted(BACKENDS))})")
+    try:
+        return backend_class()
+    except (ImportError, AttributeError, OSError) as e:
+        raise ValueError(f"Backend '{name}' is not available on this system: {e}")
@@ -0,0 +1,96 @@
+"""
+Capture existing links for junctwin
+Reads every junction, symbolic link and hard link group under a folder and
+writes them as a manifest that batch/apply can replay on another machine,
+with paths relative to the manifest wherever possible.
+"""
+
+import os
+import json
+from collections import namedtuple
+
+from junctwin_backends import HARDLINK, entry_link_kind, entry_lstat, read_link_target
+from junctwin_inodes import InodeMap
+from junctwin_walk import Walker, is_plain_dir
+
+
+# What capture found: links written, hard link groups with names outside the
+# root (captured partly), and hard-linked files with no other name under the root
+CaptureStats = namedtuple("CaptureStats", "links partial_groups lone_names")
+
+
+def _visit(entry):
+    """(kind, path, target or (dev, ino)) for a link, else None; at most one stat per entry"""
+    if is_plain_dir(entry):
+        return None
+    st = entry_lstat(entry)
+    kind = entry_link_kind(entry, st)
+    if kind is None:
+        return None
+    if kind == HARDLINK:
+        return kind, entry.path, (st.st_dev, st.st_ino)
+    target = read_link_target(entry.path)
+    return kind, entry.path, os.path.normpath(os.path.join(os.path.dirname(entry.path), target))
+
+
+def _portable(path, base):
+    """path relative to base with '/' separators, or absolute where it cannot be (another drive)"""
+    try:
+        return os.path.relpath(path, base).replace(os.sep, "/")
+    except ValueError:
+        return path
+
+
+def capture_links(root, manifest_path, jobs=8):
+    """Manifest entries for every link under root: (entries, CaptureStats)
+
+    Folders are read on jobs threads and each entry is stat'ed once.
+    Junctions and symbolic links become one entry each; the names of a
+    hard-linked file become entries linking every name but the first
+    (in path order) to the first. Only links are kept, never the other
+    entries, and hard link names are grouped in a compact InodeMap.
+    """
+    root = os.path.abspath(root)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    entries, groups = [], InodeMap()
+    for kind, path, detail in Walker().walk_parallel(root, _visit, jobs):
+        if kind == HARDLINK:
+            groups.add(*detail, path)
+        else:
+            entries.append({"link": _portable(path, base), "target": _portable(detail, base), "kind": kind})
+
+    partial = lone = 0
+    for _, _, names in groups.items():
+        try:
+            # One more stat per group (not per name): are all its names under root?
+            if len(names) < os.stat(names[0], follow_symlinks=False).st_nlink:
+                partial += 1
+        except OSError:
+            pass
+        if len(names) < 2:
+            lone += 1
+            continue
+        names.sort()
+        first = _portable(names[0], base)
+        for name in names[1:]:
+            entries.append({"link": _portable(name, base), "target": first, "kind": HARDLINK})
+
+    entries.sort(key=lambda entry: entry["link"])
+    return entries, CaptureStats(len(entries), partial, lone)
+
+
+def write_manifest(entries, manifest_path):
+    """Write entries as a .csv or .json manifest (by extension), replacing it in one step"""
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    temp_path = f"{manifest_path}.junctwin-tmp"
+    if str(manifest_path).lower().endswith(".csv"):
+        import csv
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=("link", "target", "kind"))
+            writer.writeheader()
+            writer.writerows(entries)
+    else:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"links": entries}, f, indent=1)
+            f.write("\n")
+    os.replace(temp_path, manifest_path)
@@ -0,0 +1,808 @@
+"""
+Command line interface for junctwin
+Runs link operations without the GUI, e.g.:
+    python junctwin.py batch manifest.json
+"""
+
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+from contextlib import contextmanager
+
+from junctwin_backends import BACKENDS, JUNCTION, SYMLINK, HARDLINK, CLONE, COPY, get_backend
+from junctwin_engine import (LinkEngine, LinkResult, LinkSpecError, load_manifest, plan_specs, run_batch,
+                             parse_file_kinds, set_file_kinds, CREATED, REPLACED, EXISTS, FAILED)
+from junctwin_metrics import NULL_METRICS
+
+# Feature modules (SQLite, hashing, process pools, ...) are imported inside the
+# commands that need them, so starting junctwin only pays for what it runs
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+@contextmanager
+def open_engine(args):
+    """Link engine for a command, keeping an existing link index up to date"""
+    from junctwin_index import LinkIndex, default_index_path
+    index_path = args.index or default_index_path()
+    listeners = [LinkIndex(index_path)] if os.path.exists(index_path) else []
+    try:
+        yield LinkEngine(get_backend(args.backend), listeners, args.collector)
+    finally:
+        for listener in listeners:
+            listener.close()
+
+
+@contextmanager
+def open_journal(args):
+    from junctwin_journal import Journal
+    journal = Journal(args.journal)
+    try:
+        yield journal
+    finally:
+        journal.close()
+
+
+def format_result(result):
+    """One line per link: status, link path and what it points to"""
+    line = f"{result.status:<9} {result.plan.link_path} -> {result.plan.target}"
+    if result.plan.kind in (CLONE, COPY) and result.error is None:
+        # Not a link: say so, since a manifest's own names need not carry the suffix
+        line += f"  ({result.plan.kind})"
+    if result.error is not None:
+        line += f"  ({result.error})"
+    return line
+
+
+def cmd_batch(args):
+    """Apply every link spec in a manifest"""
+    from junctwin_journal import Transaction
+    try:
+        specs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read manifest {args.manifest}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    counts = {CREATED: 0, REPLACED: 0, EXISTS: 0, FAILED: 0}
+    with open_engine(args) as engine, open_journal(args) as journal:
+        transaction = Transaction(engine, journal, f"batch {os.path.abspath(args.manifest)}",
+                                  all_or_nothing=not args.partial)
+        for result in run_batch(specs, transaction, replace=args.replace, jobs=args.jobs):
+            counts[result.status] += 1
+            if not args.quiet or result.status == FAILED:
+                print(format_result(result))
+
+        if counts[FAILED] and not args.partial:
+            restored = transaction.rollback()
+            print(f"Batch {transaction.batch_id} failed, rolled back {restored} links")
+        else:
+            transaction.commit()
+            print(f"Batch {transaction.batch_id}: "
+                  + ", ".join(f"{count} {status}" for status, count in counts.items()))
+    return EXIT_FAILED if counts[FAILED] else EXIT_OK
+
+
+def _manifest_changes(args):
+    """Plan a manifest and diff it against the disk: (changes, planning failures)"""
+    from junctwin_plan import diff_plans
+    specs = load_manifest(args.manifest)
+    changes, failures = [], []
+    for item in diff_plans(plan_specs(specs), prune=args.prune):
+        (failures if isinstance(item, LinkResult) else changes).append(item)
+    return changes, failures
+
+
+def _print_changes(changes, failures, verbose):
+    from junctwin_plan import ACTIONS, DIFF_MARKS, UNCHANGED
+    for change in changes:
+        if change.action != UNCHANGED or verbose:
+            print(f"{DIFF_MARKS[change.action]} {change.action:<9} {change.plan.link_path}"
+                  + (f" -> {change.plan.target}" if change.plan.target is not None else ""))
+    for failure in failures:
+        print(format_result(failure))
+    counts = Counter(change.action for change in changes)
+    summary = ", ".join(f"{counts[action]} to {action}" if action != UNCHANGED else f"{counts[action]} unchanged"
+                        for action in ACTIONS)
+    print(summary + (f", {len(failures)} invalid" if failures else ""))
+
+
+def cmd_plan(args):
+    """Show what applying a manifest would change, without changing anything"""
+    try:
+        changes, failures = _manifest_changes(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read manifest {args.manifest}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    _print_changes(changes, failures, args.verbose)
+    return EXIT_FAILED if failures else EXIT_OK
+
+
+def cmd_apply(args):
+    """Bring the disk in line with a manifest, touching only what differs"""
+    from junctwin_journal import Transaction
+    from junctwin_plan import apply_changes, UNCHANGED
+    try:
+        changes, failures = _manifest_changes(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read manifest {args.manifest}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    for failure in failures:
+        print(format_result(failure))
+    if failures and not args.partial:
+        print("Nothing applied: fix the invalid entries or use --partial")
+        return EXIT_FAILED
+
+    pending = [change for change in changes if change.action != UNCHANGED]
+    unchanged = len(changes) - len(pending)
+    if not pending:
+        print(f"Up to date: {unchanged} unchanged")
+        return EXIT_FAILED if failures else EXIT_OK
+
+    counts = Counter()
+    with open_engine(args) as engine, open_journal(args) as journal:
+        transaction = Transaction(engine, journal, f"apply {os.path.abspath(args.manifest)}",
+                                  all_or_nothing=not args.partial)
+        for result in apply_changes(pending, transaction, jobs=args.jobs):
+            counts[result.status] += 1
+            if not args.quiet or result.status == FAILED:
+                print(format_result(result) if result.plan.kind else f"{result.status:<9} {result.plan.link_path}")
+
+        if counts[FAILED] and not args.partial:
+            restored = transaction.rollback()
+            print(f"Batch {transaction.batch_id} failed, rolled back {restored} links")
+        else:
+            transaction.commit()
+            print(f"Batch {transaction.batch_id}: "
+                  + ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+                  + f", {unchanged} unchanged")
+    return EXIT_FAILED if counts[FAILED] or failures else EXIT_OK
+
+
+def cmd_mirror(args):
+    """Recreate a folder tree with every file linked back to the original"""
+    from junctwin_mirror import mirror_tree, SKIPPED
+    counts = {CREATED: 0, EXISTS: 0, SKIPPED: 0, FAILED: 0}
+    try:
+        with open_engine(args) as engine:
+            for result in mirror_tree(args.source, args.dest, engine,
+                                      include=args.include, exclude=args.exclude):
+                counts[result.status] = counts.get(result.status, 0) + 1
+                if args.verbose or result.status == FAILED:
+                    print(format_result(result))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    return EXIT_FAILED if counts[FAILED] else EXIT_OK
+
+
+def cmd_watch(args):
+    """Mirror a folder tree, then keep the mirror current as files come and go"""
+    from junctwin_watch import TreeWatch
+    with open_engine(args) as engine:
+        watch = TreeWatch(args.source, args.dest, engine, include=args.include,
+                          exclude=args.exclude, debounce=args.debounce / 1000)
+        try:
+            counts = Counter(r.status for r in watch.start() if _print_watched(r, args.verbose))
+            print(f"Mirrored {args.source}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+            print("Watching for changes (Ctrl+C to stop)", flush=True)
+            for results in watch.batches():
+                counts = Counter(r.status for r in results if _print_watched(r, True))
+                if counts:
+                    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+                    print(f"{time.strftime('%H:%M:%S')}  {summary}", flush=True)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watch.close()
+    return EXIT_OK
+
+
+def _print_watched(result, verbose):
+    """Print a watch result worth showing; always True, for use inside a Counter"""
+    if result.status == FAILED or (verbose and result.status != EXISTS):
+        print(format_result(result))
+    return True
+
+
+def cmd_export(args):
+    """Archive a folder tree with each file's data once and links kept as links"""
+    from junctwin_archive import export_tree, FILE
+    counts = Counter({FILE: 0})
+    # With the archive on stdout, progress goes to stderr
+    out = sys.stderr if args.archive == "-" else sys.stdout
+    try:
+        for kind, name in export_tree(args.root, args.archive, exclude=args.exclude):
+            counts[kind] += 1
+            if args.verbose:
+                print(f"{kind:<9} {name}", file=out)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    print(", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())), file=out)
+    return EXIT_OK
+
+
+def cmd_import(args):
+    """Unpack an archive, recreating its hard links, junctions and symbolic links"""
+    import tarfile
+    from junctwin_archive import import_tree
+    counts = Counter()
+    try:
+        with open_engine(args) as engine:
+            for result in import_tree(args.archive, args.dest, engine):
+                counts[FAILED if result.status == FAILED else result.plan.kind] += 1
+                if args.verbose or result.status == FAILED:
+                    if result.plan.target is not None:
+                        print(format_result(result))
+                    else:
+                        print(f"{result.status:<9} {result.plan.link_path}"
+                              + (f"  ({result.error})" if result.error else ""))
+    except (OSError, EOFError, tarfile.TarError) as e:
+        print(f"Error: cannot read {args.archive}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    print(", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())))
+    return EXIT_FAILED if counts[FAILED] else EXIT_OK
+
+
+def cmd_capture(args):
+    """Write the links found under a folder as a manifest that batch/apply can replay"""
+    from junctwin_capture import capture_links, write_manifest
+    if not os.path.isdir(args.root):
+        print(f"Error: not a folder: {args.root}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        entries, stats = capture_links(args.root, args.output, jobs=args.jobs)
+        write_manifest(entries, args.output)
+    except OSError as e:
+        print(f"Error: cannot capture {args.root} to {args.output}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    counts = Counter(entry["kind"] for entry in entries)
+    print(f"Captured {stats.links} links to {args.output}: "
+          + ", ".join(f"{counts[kind]} {kind}" for kind in (JUNCTION, SYMLINK, HARDLINK)))
+    if stats.partial_groups:
+        print(f"{stats.partial_groups} hard-linked files also have names outside {args.root} (not captured)")
+    return EXIT_OK
+
+
+def cmd_scan(args):
+    """Update the link index for a folder tree"""
+    from junctwin_index import LinkIndex
+    with LinkIndex(args.index) as index:
+        try:
+            stats = index.scan(args.root, full=args.full)
+        except OSError as e:
+            print(f"Error: cannot scan {args.root}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        total = sum(1 for _ in index.query(under=args.root))
+    print(f"{stats.dirs_listed} folders listed, {stats.dirs_unchanged} unchanged, "
+          f"{total} links indexed under {args.root}")
+    return EXIT_OK
+
+
+def cmd_links(args):
+    """List links from the index without touching the disk"""
+    from junctwin_index import LinkIndex
+    with LinkIndex(args.index) as index:
+        for record in index.query(kind=args.kind, under=args.under, target_under=args.target_under):
+            target = record.target if record.target is not None else f"{record.nlink} names"
+            print(f"{record.kind:<9} {record.path} -> {target}")
+    return EXIT_OK
+
+
+def cmd_siblings(args):
+    """List the other names of hard-linked files, from the index"""
+    from junctwin_index import LinkIndex
+    status = EXIT_OK
+    with LinkIndex(args.index) as index:
+        for path in args.paths:
+            try:
+                nlink = os.stat(path, follow_symlinks=False).st_nlink
+                names = index.siblings(path)
+            except OSError as e:
+                print(f"Error: {path}: {e.strerror}", file=sys.stderr)
+                status = EXIT_FAILED
+                continue
+            print(f"{path}: {nlink} name{'s' if nlink != 1 else ''}")
+            for name in names:
+                print(f"  {name}")
+            if len(names) < nlink > 1:
+                print(f"  ({nlink - len(names)} not indexed - scan the folders that hold them)")
+    return status
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def cmd_dedupe(args):
+    """Replace identical files under a folder with hard links to one copy"""
+    from junctwin_index import LinkIndex
+    from junctwin_dedupe import HashCache, dedupe_group, find_duplicates
+    with LinkIndex(args.index) as index:
+        try:
+            groups = find_duplicates(args.root, HashCache(index.db), jobs=args.jobs,
+                                     min_size=args.min_size, exclude=args.exclude)
+        except OSError as e:
+            print(f"Error: cannot read {args.root}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+        saved = failed = 0
+        # The index already open for the hash cache keeps itself current: a second
+        # connection to the same file would wait on this one's pending writes
+        index.db.commit()
+        engine = LinkEngine(get_backend(args.backend), [index], args.collector)
+        for group in groups:
+            print(f"{format_size(group.size)}  {group.keeper.path}")
+            if args.dry_run:
+                for duplicate in group.duplicates:
+                    print(f"  would link {duplicate.path}")
+                    saved += group.size
+                continue
+            for result in dedupe_group(group, engine):
+                print(f"  {result.status:<9} {result.plan.link_path}"
+                      + (f"  ({result.error})" if result.error else ""))
+                if result.status == REPLACED:
+                    saved += group.size
+                elif result.status == FAILED:
+                    failed += 1
+
+    verb = "would save" if args.dry_run else "saved"
+    print(f"{len(groups)} duplicate groups, {verb} {format_size(saved)}"
+          + (f", {failed} failed" if failed else ""))
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_du(args):
+    """Disk usage per subfolder, counting hard-linked files once and not entering junctions"""
+    from junctwin_du import DiskUsage
+    if not os.path.isdir(args.root):
+        print(f"Error: not a folder: {args.root}", file=sys.stderr)
+        return EXIT_USAGE
+    subtrees, total = DiskUsage(args.root, jobs=args.jobs, follow=args.follow).run()
+    if args.sort:
+        subtrees.sort(key=lambda usage: usage.used, reverse=True)
+
+    print(f"{'used':>10} {'saved':>10} {'files':>9}  path")
+    for usage in subtrees:
+        print(f"{format_size(usage.used):>10} {format_size(usage.saved):>10} {usage.files:>9}  {usage.path}"
+              + (f"  ({usage.errors} unreadable)" if usage.errors else ""))
+    print(f"{format_size(total.used):>10} {format_size(total.saved):>10} {total.files:>9}  total")
+    print(f"{total.folders} folders, {total.links} junctions and symbolic links not entered"
+          + (f", {total.errors} entries could not be read" if total.errors else ""))
+    return EXIT_FAILED if total.errors else EXIT_OK
+
+
+def prefix_pair(value):
+    old, sep, new = value.partition("=")
+    if not sep or not old or not new:
+        raise argparse.ArgumentTypeError(f"expected OLD=NEW: {value}")
+    return os.path.abspath(old), os.path.abspath(new)
+
+
+def cmd_audit(args):
+    """Report (and optionally fix) broken junctions and symbolic links"""
+    from junctwin_index import LinkIndex
+    from junctwin_journal import Transaction
+    from junctwin_audit import audit_links, repair_plan, BROKEN, OK
+    problems = fixed = 0
+    with LinkIndex(args.index) as index:
+        if not args.no_scan:
+            try:
+                index.scan(args.root)
+            except OSError as e:
+                print(f"Error: cannot scan {args.root}: {e}", file=sys.stderr)
+                return EXIT_USAGE
+        findings = list(audit_links(index, args.root))
+
+    with open_engine(args) as engine, open_journal(args) as journal:
+        transaction = Transaction(engine, journal, f"audit {os.path.abspath(args.root)}",
+                                  all_or_nothing=False)
+        for finding in findings:
+            if finding.problem == OK:
+                if args.all:
+                    print(f"{OK:<12} {finding.record.path} -> {finding.target}")
+                continue
+
+            action, is_fixed = "", False
+            if finding.problem in BROKEN:
+                plan = repair_plan(finding, args.repair)
+                if plan is not None:
+                    result = transaction.apply(plan, replace=True)
+                    is_fixed = result.error is None
+                    action = f"repaired -> {plan.target}" if is_fixed else f"repair failed: {result.error}"
+                elif args.remove:
+                    result = transaction.remove(finding.record.path)
+                    is_fixed = result.error is None
+                    action = "removed" if is_fixed else f"remove failed: {result.error}"
+            if is_fixed:
+                fixed += 1
+            else:
+                problems += 1
+            print(f"{finding.problem:<12} {finding.record.path} -> {finding.target}"
+                  + (f"  [{action}]" if action else ""))
+        transaction.commit()
+        if fixed:
+            print(f"Batch {transaction.batch_id} (undo with: junctwin undo {transaction.batch_id})")
+
+    print(f"{len(findings)} links checked, {problems} problems"
+          + (f", {fixed} fixed" if fixed else ""))
+    return EXIT_FAILED if problems else EXIT_OK
+
+
+def cmd_retarget(args):
+    """Re-point every junction and symlink under a folder from one target prefix to another"""
+    from concurrent.futures import ThreadPoolExecutor
+    from junctwin_index import LinkIndex
+    from junctwin_journal import Transaction
+    from junctwin_audit import retarget_plans
+    old, new = os.path.abspath(args.old), os.path.abspath(args.new)
+    with LinkIndex(args.index) as index:
+        try:
+            index.scan(args.root)
+        except OSError as e:
+            print(f"Error: cannot scan {args.root}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        found = list(retarget_plans(index, args.root, old, new))
+
+    plans, old_targets, missing = [], {}, 0
+    for plan, old_target in found:
+        if not args.allow_missing and not os.path.exists(plan.target):
+            missing += 1
+            print(f"{'missing':<9} {plan.link_path} -> {plan.target}  (left pointing to {old_target})")
+            continue
+        plans.append(plan)
+        old_targets[plan.link_path] = old_target
+    if not plans:
+        print(f"No links to retarget under {args.root}" + (f", {missing} missing" if missing else ""))
+        return EXIT_FAILED if missing else EXIT_OK
+    if args.dry_run:
+        for plan in plans:
+            print(f"{'retarget':<9} {plan.link_path} -> {plan.target}  (was {old_targets[plan.link_path]})")
+        print(f"{len(plans)} links to retarget" + (f", {missing} missing" if missing else ""))
+        return EXIT_FAILED if missing else EXIT_OK
+
+    counts = Counter()
+    with open_engine(args) as engine, open_journal(args) as journal:
+        transaction = Transaction(engine, journal, f"retarget {old} -> {new} in {os.path.abspath(args.root)}",
+                                  all_or_nothing=not args.partial)
+        # Every plan is a different, existing link, so they can all run at once
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            for result in pool.map(transaction.retarget, plans):
+                counts[result.status] += 1
+                if not args.quiet or result.status == FAILED:
+                    print(format_result(result) + f"  (was {old_targets[result.plan.link_path]})")
+
+        if counts[FAILED] and not args.partial:
+            restored = transaction.rollback()
+            print(f"Batch {transaction.batch_id} failed, rolled back {restored} links")
+        else:
+            transaction.commit()
+            print(f"Batch {transaction.batch_id}: "
+                  + ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+                  + (f", {missing} missing" if missing else ""))
+    return EXIT_FAILED if counts[FAILED] or missing else EXIT_OK
+
+
+def cmd_undo(args):
+    """Reverse a past batch (itself recorded as a new, undoable batch)"""
+    from junctwin_index import LinkIndex
+    from junctwin_journal import undo_batch
+    with open_engine(args) as engine, open_journal(args) as journal:
+        index = next((l for l in engine.listeners if isinstance(l, LinkIndex)), None)
+        try:
+            transaction, results = undo_batch(journal, args.batch_id, engine, index)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        failed = [r for r in results if r.status == FAILED]
+        for result in results:
+            print(f"{result.status:<9} {result.plan.link_path}"
+                  + (f" -> {result.plan.target}" if result.plan.target else "")
+                  + (f"  ({result.error})" if result.error else ""))
+        if transaction.failed:
+            transaction.rollback()
+            print(f"Undo of {args.batch_id} failed and was rolled back")
+        else:
+            transaction.commit()
+            print(f"Undid {args.batch_id} as batch {transaction.batch_id}")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_history(args):
+    """List recorded batches, newest last"""
+    from junctwin_journal import Journal
+    journal = Journal(args.journal)
+    for batch_id, begin, final in journal.batches()[-args.limit:]:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(begin.get("time", 0)))
+        print(f"{batch_id}  {when}  {final or 'incomplete':<10} {begin.get('command', '')}")
+    return EXIT_OK
+
+
+def cmd_daemon(args):
+    """Stay resident and handle Send To invocations forwarded by thin clients"""
+    from junctwin_daemon import SendToDaemon
+    from junctwin_gui import open_batch_dialog
+    daemon = SendToDaemon(open_batch_dialog, window=args.window / 1000, idle_exit=args.idle_exit)
+    try:
+        daemon.listen()
+        print(f"junctwin daemon listening on {daemon.address}")
+        daemon.serve()
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    except KeyboardInterrupt:
+        pass
+    return EXIT_OK
+
+
+def cmd_worker(args):
+    """Run batches handed over by an unprivileged junctwin (started elevated by it)"""
+    from junctwin_worker import serve_worker
+    serve_worker(args.connect, bytes.fromhex(args.authkey), args.backend, args.journal)
+    return EXIT_OK
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return number
+
+
+def file_kinds_list(value):
+    try:
+        return parse_file_kinds(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def run_profiled(args):
+    """Run the command under cProfile, then print or save the statistics"""
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(args.func, args)
+    finally:
+        if args.profile_output:
+            profiler.dump_stats(args.profile_output)
+        else:
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="junctwin",
+                                     description="Create junctions and hard links")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        help="link backend (default: platform native)")
+    parser.add_argument("--file-links", metavar="KINDS", type=file_kinds_list,
+                        help="kinds to link files by, tried in order where one is refused: any of "
+                             "hardlink, clone, symlink, copy, comma-separated (default: "
+                             "$JUNCTWIN_FILE_LINKS or hardlink,symlink)")
+    parser.add_argument("--index", metavar="PATH",
+                        help="link index database (default: index.sqlite in the per-user junctwin folder)")
+    parser.add_argument("--journal", metavar="PATH",
+                        help="operation journal (default: journal.jsonl in the per-user junctwin folder)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write link counts and timings to PATH (.prom: Prometheus text file, "
+                             "else appended as JSON lines)")
+    parser.add_argument("--profile", action="store_true",
+                        help="run under cProfile and print the functions that took longest")
+    parser.add_argument("--profile-output", metavar="PATH",
+                        help="with --profile, save the statistics to PATH (for pstats/snakeviz) instead")
+    commands = parser.add_subparsers(dest="command")
+
+    batch = commands.add_parser("batch", help="apply a .json or .csv manifest of links")
+    batch.add_argument("manifest", help="manifest with source/target/direction entries")
+    batch.add_argument("--replace", action="store_true",
+                       help="delete and recreate links that already exist")
+    batch.add_argument("-j", "--jobs", type=positive_int, default=1,
+                       help="create links in N parallel workers (default: 1)")
+    batch.add_argument("--partial", action="store_true",
+                       help="keep the links that worked when others fail (default: roll back all)")
+    batch.add_argument("-q", "--quiet", action="store_true",
+                       help="only print failures and the summary")
+    batch.set_defaults(func=cmd_batch)
+
+    plan = commands.add_parser("plan", help="show what 'apply' would change for a manifest (dry run)")
+    plan.add_argument("manifest", help="manifest with source/target/direction entries")
+    plan.add_argument("--prune", action="store_true",
+                      help="also plan removing junctwin links the manifest no longer lists")
+    plan.add_argument("-v", "--verbose", action="store_true", help="also list unchanged links")
+    plan.set_defaults(func=cmd_plan)
+
+    apply = commands.add_parser("apply", help="create or fix only the links of a manifest that differ")
+    apply.add_argument("manifest", help="manifest with source/target/direction entries")
+    apply.add_argument("--prune", action="store_true",
+                       help="remove junctwin links in managed folders that the manifest no longer lists")
+    apply.add_argument("-j", "--jobs", type=positive_int, default=1,
+                       help="create links in N parallel workers (default: 1)")
+    apply.add_argument("--partial", action="store_true",
+                       help="keep the changes that worked when others fail (default: roll back all)")
+    apply.add_argument("-q", "--quiet", action="store_true",
+                       help="only print failures and the summary")
+    apply.set_defaults(func=cmd_apply)
+
+    mirror = commands.add_parser("mirror", help="recreate a folder tree with files linked to the original")
+    mirror.add_argument("source", help="folder tree to mirror")
+    mirror.add_argument("dest", help="where to create the mirror (created if missing)")
+    mirror.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="only link files matching GLOB (name or relative path, repeatable)")
+    mirror.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip files and folders matching GLOB (repeatable)")
+    mirror.add_argument("-v", "--verbose", action="store_true",
+                        help="print every file, not only failures")
+    mirror.set_defaults(func=cmd_mirror)
+
+    watch = commands.add_parser("watch", help="mirror a folder tree and keep the mirror in sync as files change")
+    watch.add_argument("source", help="folder tree to watch")
+    watch.add_argument("dest", help="where the mirror lives (created if missing)")
+    watch.add_argument("--include", action="append", default=[], metavar="GLOB",
+                       help="only link files matching GLOB (name or relative path, repeatable)")
+    watch.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                       help="skip files and folders matching GLOB (repeatable)")
+    watch.add_argument("--debounce", type=positive_int, default=500, metavar="MS",
+                       help="wait until changes pause for MS milliseconds, then apply them together "
+                            "(default: 500)")
+    watch.add_argument("-v", "--verbose", action="store_true",
+                       help="print every file of the initial pass, not only failures")
+    watch.set_defaults(func=cmd_watch)
+
+    export = commands.add_parser("export", help="archive a folder tree with hard links and junctions kept as links")
+    export.add_argument("root", help="folder tree to archive")
+    export.add_argument("archive", help="tar file to write (.tar, .tar.gz, .tar.xz, .tar.bz2) or - for stdout")
+    export.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip files and folders matching GLOB (repeatable)")
+    export.add_argument("-v", "--verbose", action="store_true", help="list every entry")
+    export.set_defaults(func=cmd_export)
+
+    import_ = commands.add_parser("import", help="unpack an archive, rebuilding its links")
+    import_.add_argument("archive", help="tar file to read (any compression) or - for stdin")
+    import_.add_argument("dest", help="folder to unpack into (created if missing)")
+    import_.add_argument("-v", "--verbose", action="store_true", help="list every entry, not only failures")
+    import_.set_defaults(func=cmd_import)
+
+    capture = commands.add_parser("capture", help="write the links under a folder as a replayable manifest")
+    capture.add_argument("root", help="folder tree to capture")
+    capture.add_argument("-o", "--output", required=True, metavar="MANIFEST",
+                         help="manifest to write (.json or .csv); paths are stored relative to it")
+    capture.add_argument("-j", "--jobs", type=positive_int, default=8,
+                         help="folders read in parallel (default: 8)")
+    capture.set_defaults(func=cmd_capture)
+
+    scan = commands.add_parser("scan", help="index the junctions and links under a folder")
+    scan.add_argument("root", help="folder tree to scan")
+    scan.add_argument("--full", action="store_true",
+                      help="list every folder again, not only those that changed")
+    scan.set_defaults(func=cmd_scan)
+
+    links = commands.add_parser("links", help="list links from the index")
+    links.add_argument("--kind", choices=(JUNCTION, SYMLINK, HARDLINK))
+    links.add_argument("--under", metavar="PATH", help="only links located below PATH")
+    links.add_argument("--target-under", metavar="PATH", help="only links pointing below PATH")
+    links.set_defaults(func=cmd_links)
+
+    siblings = commands.add_parser("siblings", help="show every indexed name of a hard-linked file")
+    siblings.add_argument("paths", nargs="+", metavar="PATH")
+    siblings.set_defaults(func=cmd_siblings)
+
+    dedupe = commands.add_parser("dedupe", help="replace identical files with hard links to one copy")
+    dedupe.add_argument("root", help="folder tree to deduplicate")
+    dedupe.add_argument("-n", "--dry-run", action="store_true",
+                        help="only report duplicates, change nothing")
+    dedupe.add_argument("-j", "--jobs", type=positive_int, default=os.cpu_count() or 1,
+                        help="hashing processes (default: one per CPU)")
+    dedupe.add_argument("--min-size", type=int, default=1, metavar="BYTES",
+                        help="ignore files smaller than this (default: 1, skip empty files)")
+    dedupe.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip files and folders matching GLOB (repeatable)")
+    dedupe.set_defaults(func=cmd_dedupe)
+
+    du = commands.add_parser("du", help="disk usage per subfolder, counting hard-linked files once")
+    du.add_argument("root", help="folder tree to measure")
+    du.add_argument("-j", "--jobs", type=positive_int, default=8,
+                    help="folders read in parallel (default: 8)")
+    du.add_argument("-s", "--sort", action="store_true", help="largest subfolders first")
+    du.add_argument("--follow", choices=("never", "once"), default="never",
+                    help="enter junctions and folder symlinks: never (default), or once per folder they lead to")
+    du.set_defaults(func=cmd_du)
+
+    audit = commands.add_parser("audit", help="find broken, cross-volume and looping links")
+    audit.add_argument("root", help="folder tree to audit")
+    audit.add_argument("--all", action="store_true", help="also list links that are fine")
+    audit.add_argument("--remove", action="store_true",
+                       help="delete links whose target is missing or that loop")
+    audit.add_argument("--repair", action="append", default=[], type=prefix_pair, metavar="OLD=NEW",
+                       help="re-point broken links whose target moved from OLD to NEW (repeatable)")
+    audit.add_argument("--no-scan", action="store_true",
+                       help="use the link index as it is, without rescanning changed folders")
+    audit.set_defaults(func=cmd_audit)
+
+    retarget = commands.add_parser("retarget", help="re-point links whose target moved to a new location")
+    retarget.add_argument("root", help="folder tree holding the links")
+    retarget.add_argument("--from", dest="old", required=True, metavar="OLD_PREFIX",
+                          help="rewrite links whose target is at or below this path")
+    retarget.add_argument("--to", dest="new", required=True, metavar="NEW_PREFIX",
+                          help="path that replaces OLD_PREFIX in their targets")
+    retarget.add_argument("-n", "--dry-run", action="store_true",
+                          help="only list the links that would change")
+    retarget.add_argument("--allow-missing", action="store_true",
+                          help="also retarget links whose new target does not exist (yet)")
+    retarget.add_argument("-j", "--jobs", type=positive_int, default=8,
+                          help="rewrite links in N parallel workers (default: 8)")
+    retarget.add_argument("--partial", action="store_true",
+                          help="keep the links that were rewritten when others fail (default: roll back all)")
+    retarget.add_argument("-q", "--quiet", action="store_true",
+                          help="only print failures and the summary")
+    retarget.set_defaults(func=cmd_retarget)
+
+    undo = commands.add_parser("undo", help="reverse a past batch from the journal")
+    undo.add_argument("batch_id", help="batch id as printed by batch/audit or listed by history")
+    undo.set_defaults(func=cmd_undo)
+
+    history = commands.add_parser("history", help="list batches recorded in the journal")
+    history.add_argument("-n", "--limit", type=positive_int, default=20,
+                         help="how many recent batches to show (default: 20)")
+    history.set_defaults(func=cmd_history)
+
+    daemon = commands.add_parser("daemon", help="stay resident so Send To opens instantly and batches selections")
+    daemon.add_argument("--window", type=positive_int, default=300, metavar="MS",
+                        help="collect paths sent within MS milliseconds into one batch (default: 300)")
+    daemon.add_argument("--idle-exit", type=positive_int, metavar="SECONDS",
+                        help="exit after SECONDS without requests (default: run until stopped)")
+    daemon.set_defaults(func=cmd_daemon)
+
+    # Started by the GUI with administrator rights, not meant to be run by hand
+    worker = commands.add_parser("worker", help="elevated helper process started by junctwin itself")
+    worker.add_argument("--connect", required=True, metavar="ADDRESS")
+    worker.add_argument("--authkey", required=True)
+    worker.set_defaults(func=cmd_worker)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return EXIT_USAGE
+    if args.file_links:
+        set_file_kinds(args.file_links)
+    args.collector = None
+    if args.metrics:
+        from junctwin_metrics import Metrics
+        args.collector = Metrics()
+    try:
+        if args.profile:
+            return run_profiled(args)
+        with (args.collector or NULL_METRICS).timer("junctwin_command_seconds", command=args.command):
+            return args.func(args)
+    except (LinkSpecError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except BrokenPipeError:
+        # Output piped into something that stopped reading (e.g. head): the
+        # rest is not wanted, and flushing it again at exit would fail too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_FAILED
+    finally:
+        if args.collector is not None:
+            args.collector.write(args.metrics, command=args.command)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
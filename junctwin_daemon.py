@@ -0,0 +1,169 @@
+"""
+Resident Send To helper for junctwin
+A long-lived junctwin process listening on a local endpoint (a named pipe on
+Windows, a Unix socket elsewhere). Send To invocations hand their paths to it
+and exit at once, and paths arriving close together are handled as one batch.
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+
+# Paths are sent NUL-separated: NUL cannot occur in a path on any platform
+SEPARATOR = "\0"
+ACK = b"ok"
+
+
+def default_address():
+    """Per-user endpoint of the daemon (JUNCTWIN_DAEMON overrides it)"""
+    if os.environ.get("JUNCTWIN_DAEMON"):
+        return os.environ["JUNCTWIN_DAEMON"]
+    if os.name == "nt":
+        user = os.environ.get("USERNAME", "user")
+        return rf"\\.\pipe\junctwin-{user}"
+    # A private folder, so other users cannot talk to the socket
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    folder = os.path.join(base, f"junctwin-{os.getuid()}")
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    return os.path.join(folder, "daemon.sock")
+
+
+def _is_elevated():
+    if os.name != "nt":
+        return False
+    import ctypes
+    try:
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+    except Exception:
+        return False
+
+
+def forward_paths(paths, address=None, timeout=2.0):
+    """Hand paths to a running daemon; False if none is listening
+
+    Kept to the bare socket/pipe calls, so a Send To invocation that finds
+    the daemon never imports the GUI or the link engine. Elevated processes
+    never forward: they were started to do the privileged work themselves.
+    """
+    if _is_elevated():
+        return False
+    address = address or default_address()
+    payload = SEPARATOR.join(os.path.abspath(p) for p in paths).encode("utf-8", "surrogateescape")
+    try:
+        if os.name == "nt":
+            # Each write to the daemon's message-mode pipe is one message
+            with open(address, "r+b", buffering=0) as pipe:
+                pipe.write(payload)
+                return pipe.read(len(ACK)) == ACK
+        import socket
+        import struct
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.settimeout(timeout)
+            sock.connect(address)
+            # Framed like multiprocessing.connection: 4-byte big-endian length, then the data
+            sock.sendall(struct.pack("!i", len(payload)) + payload)
+            reply = b""
+            while len(reply) < 4 + len(ACK):
+                chunk = sock.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+            return reply[4:] == ACK
+    except OSError:
+        return False
+
+
+class SendToDaemon:
+    """Collects forwarded paths and hands them to handler in batches
+
+    A batch is closed once no new paths arrived for window seconds, so a
+    multi-selection sent from Explorer (one process per item) becomes one
+    call of handler(paths). handler runs on the thread calling serve(),
+    which must be the main thread when it opens Tk windows.
+    """
+
+    def __init__(self, handler, address=None, window=0.3, idle_exit=None):
+        self.handler = handler
+        self.address = address or default_address()
+        self.window = window
+        self.idle_exit = idle_exit
+        self.listener = None
+        self._stopping = False
+        self._queue = queue.Queue()
+
+    def listen(self):
+        """Open the endpoint; fails if another daemon already owns it"""
+        from multiprocessing.connection import Listener
+        family = "AF_PIPE" if os.name == "nt" else "AF_UNIX"
+        if family == "AF_UNIX" and os.path.exists(self.address):
+            if forward_paths([], self.address):
+                raise OSError(f"A junctwin daemon is already listening on {self.address}")
+            # Left behind by a daemon that did not shut down cleanly
+            os.unlink(self.address)
+        # Explorer starts one process per selected item, all at once
+        self.listener = Listener(self.address, family, backlog=128)
+
+    def _accept_loop(self):
+        listener = self.listener
+        while not self._stopping:
+            try:
+                conn = listener.accept()
+            except OSError:
+                break
+            try:
+                data = conn.recv_bytes()
+                conn.send_bytes(ACK)
+            except (OSError, EOFError):
+                continue
+            finally:
+                conn.close()
+            paths = [p for p in data.decode("utf-8", "surrogateescape").split(SEPARATOR) if p]
+            if paths:
+                self._queue.put(paths)
+
+    def _next_batch(self):
+        """Wait for paths, then keep collecting until window passes without more"""
+        try:
+            paths = self._queue.get(timeout=self.idle_exit)
+        except queue.Empty:
+            return None
+        batch = []
+        while paths is not None:
+            batch.extend(paths)
+            try:
+                paths = self._queue.get(timeout=self.window)
+            except queue.Empty:
+                break
+        if self._stopping:
+            return None
+        # One dialog per item, however many times it was sent
+        return list(dict.fromkeys(batch))
+
+    def serve(self):
+        """Handle batches until stop() is called or idle_exit seconds pass without work"""
+        if self.listener is None:
+            self.listen()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        try:
+            while not self._stopping:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                try:
+                    self.handler(batch)
+                except Exception as e:
+                    # One bad batch must not take the daemon down
+                    print(f"junctwin daemon: {time.strftime('%H:%M:%S')} batch failed: {e}",
+                          file=sys.stderr)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopping = True
+        # Wakes serve() if it is waiting for paths
+        self._queue.put(None)
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
@@ -0,0 +1,205 @@
+"""
+Deduplicate files by hard-linking them, for junctwin
+Finds identical files under a folder (same size, then same head/tail hash,
+then same full hash) and replaces the copies with hard links to one of them.
+"""
+
+import os
+import hashlib
+from collections import namedtuple, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from junctwin_backends import HARDLINK, entry_is_link, entry_lstat
+from junctwin_engine import LinkPlan, LinkResult
+from junctwin_mirror import iter_files
+
+
+BLOCK_SIZE = 64 * 1024      # head and tail read for the partial hash
+READ_SIZE = 1024 * 1024     # buffer for full-file hashing
+
+# Status for duplicates modified between hashing and linking
+CHANGED = "changed"
+
+# One file considered for deduplication
+Candidate = namedtuple("Candidate", "path dev ino size mtime_ns nlink")
+
+# A set of identical files: the one kept and the ones to become links to it
+DuplicateGroup = namedtuple("DuplicateGroup", "keeper duplicates size")
+
+
+def partial_hash(path, size):
+    """Hash of the first and last block, enough to tell most different files apart"""
+    digest = hashlib.blake2b(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(BLOCK_SIZE))
+        if size > BLOCK_SIZE:
+            f.seek(max(BLOCK_SIZE, size - BLOCK_SIZE))
+            digest.update(f.read(BLOCK_SIZE))
+    return digest.digest()
+
+
+def full_hash(path):
+    """Hash of the whole file, read in large chunks into one reused buffer"""
+    digest = hashlib.blake2b()
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.digest()
+
+
+def _hash_job(job):
+    """Worker entry point: (path, size, full) -> digest, or None if unreadable"""
+    path, size, full = job
+    try:
+        return full_hash(path) if full else partial_hash(path, size)
+    except OSError:
+        return None
+
+
+class HashCache:
+    """File hashes stored in the link index, keyed by (device, inode, size, mtime)"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS hashes (
+        dev      INTEGER,
+        ino      INTEGER,
+        size     INTEGER,
+        mtime_ns INTEGER,
+        partial  BLOB,
+        full     BLOB,
+        PRIMARY KEY (dev, ino)
+    );
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.db.executescript(self.SCHEMA)
+
+    def get(self, candidate, column):
+        row = self.db.execute(
+            f"SELECT {column} FROM hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+            (candidate.dev, candidate.ino, candidate.size, candidate.mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def put(self, candidate, column, digest):
+        # Committed along with the rest of the index when it is closed
+        self.db.execute(
+            "DELETE FROM hashes WHERE dev = ? AND ino = ? AND (size != ? OR mtime_ns != ?)",
+            (candidate.dev, candidate.ino, candidate.size, candidate.mtime_ns))
+        self.db.execute(
+            "INSERT OR IGNORE INTO hashes (dev, ino, size, mtime_ns) VALUES (?, ?, ?, ?)",
+            (candidate.dev, candidate.ino, candidate.size, candidate.mtime_ns))
+        self.db.execute(f"UPDATE hashes SET {column} = ? WHERE dev = ? AND ino = ?",
+                        (digest, candidate.dev, candidate.ino))
+
+
+def collect_candidates(root, min_size=1, exclude=()):
+    """Group the regular files under root by (device, size)
+
+    Names that already share an inode count once, so existing hard links
+    are never 'deduplicated' again. Groups with a single inode are dropped.
+    """
+    by_size = defaultdict(dict)
+    for _, entry in iter_files(os.path.abspath(root), exclude=exclude):
+        if entry is None or entry_is_link(entry):
+            continue
+        try:
+            st = entry_lstat(entry)
+        except OSError:
+            continue
+        if st.st_size < min_size:
+            continue
+        inodes = by_size[(st.st_dev, st.st_size)]
+        if st.st_ino not in inodes:
+            inodes[st.st_ino] = Candidate(entry.path, st.st_dev, st.st_ino, st.st_size,
+                                          st.st_mtime_ns, st.st_nlink)
+    return [list(inodes.values()) for inodes in by_size.values() if len(inodes) > 1]
+
+
+def _hash_groups(groups, column, cache, pool, reuse=None):
+    """Split each group by hash, keeping only sub-groups with more than one file
+
+    Returns the sub-groups and the digest of every file hashed. Files in
+    reuse (e.g. small files whose partial hash already covered every
+    byte) keep the digest given there.
+    """
+    digests = dict(reuse or {})
+    todo = []
+    for group in groups:
+        for candidate in group:
+            if candidate in digests:
+                continue
+            cached = cache.get(candidate, column) if cache else None
+            if cached is not None:
+                digests[candidate] = cached
+            else:
+                todo.append(candidate)
+
+    jobs = [(c.path, c.size, column == "full") for c in todo]
+    results = pool.map(_hash_job, jobs, chunksize=16) if pool else map(_hash_job, jobs)
+    for candidate, digest in zip(todo, results):
+        if digest is not None:
+            digests[candidate] = digest
+            if cache:
+                cache.put(candidate, column, digest)
+
+    split = []
+    for group in groups:
+        by_digest = defaultdict(list)
+        for candidate in group:
+            if digests.get(candidate) is not None:
+                by_digest[digests[candidate]].append(candidate)
+        split.extend(g for g in by_digest.values() if len(g) > 1)
+    return split, digests
+
+
+def find_duplicates(root, cache=None, jobs=1, min_size=1, exclude=()):
+    """Return a DuplicateGroup for every set of identical files under root
+
+    Files are compared by size, then by a partial hash of their first and
+    last block, and only the remaining candidates are hashed in full.
+    Hashing runs on a process pool when jobs > 1.
+    """
+    groups = collect_candidates(root, min_size, exclude)
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 and groups else None
+    try:
+        groups, partial = _hash_groups(groups, "partial", cache, pool)
+        small = {c: d for c, d in partial.items() if c.size <= 2 * BLOCK_SIZE}
+        groups, _ = _hash_groups(groups, "full", cache, pool, reuse=small)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    duplicates = []
+    for group in groups:
+        # Keep the file that already has the most names, then the first by path
+        group.sort(key=lambda c: (-c.nlink, c.path))
+        duplicates.append(DuplicateGroup(group[0], group[1:], group[0].size))
+    duplicates.sort(key=lambda g: g.keeper.path)
+    return duplicates
+
+
+def _unchanged(candidate):
+    try:
+        st = os.stat(candidate.path, follow_symlinks=False)
+    except OSError:
+        return False
+    return (st.st_ino, st.st_size, st.st_mtime_ns) == (candidate.ino, candidate.size, candidate.mtime_ns)
+
+
+def dedupe_group(group, engine):
+    """Replace every duplicate in a group with a hard link to the keeper"""
+    for duplicate in group.duplicates:
+        plan = LinkPlan(HARDLINK, Path(duplicate.path), Path(group.keeper.path),
+                        f"in {Path(duplicate.path).parent.name}")
+        if not (_unchanged(group.keeper) and _unchanged(duplicate)):
+            # Modified since it was hashed, leave it alone
+            yield LinkResult(plan, CHANGED, None)
+        else:
+            yield engine.replace_file(plan)
@@ -0,0 +1,151 @@
+"""
+Link-aware disk usage for junctwin
+Measures what a folder tree really occupies: every hard-linked file is counted
+once however many names it has, junctions and symbolic links are not entered
+(or, if asked, each folder behind them is entered once), and the bytes that
+the extra names would have cost are reported as saved.
+"""
+
+import os
+import stat
+import queue
+import threading
+from collections import namedtuple
+
+from junctwin_backends import entry_is_link, entry_lstat
+from junctwin_inodes import InodeSet
+from junctwin_walk import NEVER, Walker
+
+
+# Usage of one subtree: bytes on disk counting each file once, bytes the
+# extra hard link names would take as copies, and what was found
+Usage = namedtuple("Usage", "path used saved files links folders errors")
+
+
+def disk_bytes(st):
+    """Space a file takes on disk: allocated blocks where the platform reports them, else its size"""
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+
+class _Tally:
+    """Running totals for one subtree; hard-linked files are tracked in an InodeSet"""
+
+    __slots__ = ("path", "used", "saved", "files", "links", "folders", "errors", "inodes")
+
+    def __init__(self, path):
+        self.path = path
+        self.used = self.saved = self.files = self.links = self.folders = self.errors = 0
+        # Most subtrees hold few hard-linked files: start small, the set grows
+        self.inodes = InodeSet(capacity=16)
+
+    def usage(self):
+        return Usage(self.path, self.used, self.saved, self.files, self.links, self.folders, self.errors)
+
+
+class DiskUsage:
+    """Walk a tree on several threads and total it per top-level subtree
+
+    Folders are handed out from one queue, so a single huge subfolder is
+    shared between all workers instead of keeping one busy. Each folder
+    is listed without locking and its counts are then added to its
+    subtree and the grand total in one step. Only files with more than
+    one name go into the (device, inode) sets: one set per subtree and
+    one for the whole tree, so a file linked from two subtrees counts in
+    full in each but once in the total.
+    """
+
+    def __init__(self, root, jobs=8, follow=NEVER):
+        self.root = os.path.abspath(root)
+        self.jobs = max(1, jobs)
+        # Shared by all workers: with ONCE, a folder reached through a
+        # junction is counted in the subtree that reaches it first
+        self.walker = Walker(follow)
+        self.total = _Tally(self.root)
+        self.lock = threading.Lock()
+
+    def _list(self, path):
+        """Read one folder: (subfolders, bytes of single-name files, files, links, errors, hard-linked files)"""
+        folders, linked = [], []
+        used = files = links = errors = 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry_is_link(entry) or entry.is_dir(follow_symlinks=False):
+                            if self.walker.enter(entry)[0]:
+                                folders.append(entry.path)
+                            elif entry_is_link(entry):
+                                links += 1
+                        else:
+                            st = entry_lstat(entry)
+                            if not stat.S_ISREG(st.st_mode):
+                                continue
+                            files += 1
+                            if st.st_nlink > 1:
+                                linked.append((st.st_dev, st.st_ino, disk_bytes(st)))
+                            else:
+                                used += disk_bytes(st)
+                    except OSError:
+                        errors += 1
+        except OSError:
+            errors += 1
+        return folders, used, files, links, errors, linked
+
+    def _visit(self, path, tally):
+        """List one folder and add it to its subtree and the total; returns its subfolders"""
+        folders, used, files, links, errors, linked = self._list(path)
+        with self.lock:
+            for t in (tally, self.total):
+                t.folders += 1
+                t.used += used
+                t.files += files
+                t.links += links
+                t.errors += errors
+                for dev, ino, size in linked:
+                    if t.inodes.add(dev, ino):
+                        t.used += size
+                    else:
+                        t.saved += size
+        return folders
+
+    def _worker(self, work):
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            path, tally = item
+            try:
+                for folder in self._visit(path, tally):
+                    work.put((folder, tally))
+            finally:
+                work.task_done()
+
+    def run(self):
+        """Walk the tree; returns (usage per subtree, usage of the whole tree)
+
+        The root's own files are reported as a subtree named after the
+        root, listed first when there are any.
+        """
+        top = _Tally(self.root)
+        self.walker.start(self.root)
+        work = queue.Queue()
+        subtrees = []
+        for folder in sorted(self._visit(self.root, top)):
+            tally = _Tally(folder)
+            subtrees.append(tally)
+            work.put((folder, tally))
+
+        threads = [threading.Thread(target=self._worker, args=(work,), daemon=True)
+                   for _ in range(self.jobs)]
+        for thread in threads:
+            thread.start()
+        work.join()
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+        if top.files:
+            subtrees.insert(0, top)
+        return [t.usage() for t in subtrees], self.total.usage()
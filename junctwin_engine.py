@@ -0,0 +1,421 @@
+"""
+GUI-free link engine for junctwin
+Decides link names, directions and link types, and applies link specs through
+a pluggable backend. Used by both the Send To GUI and the command line.
+"""
+
+import os
+import stat
+import errno
+from collections import namedtuple, OrderedDict
+from pathlib import Path
+
+from junctwin_backends import JUNCTION, HARDLINK, SYMLINK, CLONE, COPY, LinkError, get_backend
+from junctwin_volumes import topology
+from junctwin_metrics import NULL_METRICS
+
+
+TO_TARGET = "to_target"
+TO_SOURCE = "to_source"
+DIRECTIONS = (TO_TARGET, TO_SOURCE)
+
+SUFFIXES = {JUNCTION: "[junct]", HARDLINK: "[link]", SYMLINK: "[symlink]", CLONE: "[clone]", COPY: "[copy]"}
+LINK_TYPE_NAMES = {JUNCTION: "Junction", HARDLINK: "Hard link", SYMLINK: "Symbolic link",
+                   CLONE: "Clone", COPY: "Copy"}
+
+# What a file can be linked by, and the order tried by default: set_file_kinds()
+# or the JUNCTWIN_FILE_LINKS variable (e.g. "hardlink,clone,symlink,copy") change it
+FILE_KINDS = (HARDLINK, CLONE, SYMLINK, COPY)
+DEFAULT_FILE_KINDS = (HARDLINK, SYMLINK)
+
+# Errors meaning "not this kind here" (another volume, no support, no privilege,
+# too many links) rather than a problem any kind would have
+FALLBACK_ERRORS = {errno.EXDEV, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY,
+                   errno.ENOSYS, errno.EINVAL, errno.EPERM, errno.EACCES}
+
+# Result statuses
+CREATED = "created"
+REPLACED = "replaced"
+EXISTS = "exists"
+FAILED = "failed"
+
+# A fully decided link: what to create, where, and pointing at what
+LinkPlan = namedtuple("LinkPlan", "kind link_path target location_desc")
+
+# The outcome of applying one plan
+LinkResult = namedtuple("LinkResult", "plan status error")
+
+
+class LinkSpecError(ValueError):
+    """Raised when a link spec cannot be turned into a link plan"""
+
+
+def same_volume(path_a, path_b):
+    """Check if two folders live on the same volume (not just the same drive letter)"""
+    return topology.same_volume(path_a, path_b)
+
+
+def parse_file_kinds(value):
+    """Turn 'hardlink,clone,symlink' into a tuple of file kinds, checking each"""
+    kinds = tuple(kind.strip().lower() for kind in value.split(",") if kind.strip())
+    unknown = [kind for kind in kinds if kind not in FILE_KINDS]
+    if unknown or not kinds or len(set(kinds)) != len(kinds):
+        raise ValueError(f"Invalid file link order: {value!r} "
+                         f"(a comma-separated list of {', '.join(FILE_KINDS)}, each at most once)")
+    return kinds
+
+
+def set_file_kinds(kinds):
+    """Change the order file link kinds are tried in, for everything in this process"""
+    global file_kinds
+    file_kinds = tuple(kinds)
+
+
+file_kinds = DEFAULT_FILE_KINDS
+if os.environ.get("JUNCTWIN_FILE_LINKS"):
+    set_file_kinds(parse_file_kinds(os.environ["JUNCTWIN_FILE_LINKS"]))
+
+
+def file_link_kind(source_dir, link_dir):
+    """First kind in the file link order that the two folders allow
+
+    Hard links and clones need both folders on one volume (hard links one
+    that supports them); symbolic links and copies work anywhere. Whether
+    the volume can really clone is only found out when trying.
+    """
+    for kind in file_kinds:
+        if kind in (HARDLINK, CLONE):
+            if not topology.same_volume(source_dir, link_dir):
+                continue
+            if kind == HARDLINK and not topology.volume_of(link_dir).hardlinks:
+                continue
+        return kind
+    return file_kinds[-1]
+
+
+def fallback_plan(plan):
+    """The plan for the next kind after plan.kind in the file link order, or None
+
+    The link keeps its name with the suffix swapped ('x[link].txt' becomes
+    'x[clone].txt'). Folders never fall back.
+    """
+    if plan.kind not in file_kinds or plan.kind == file_kinds[-1] or os.path.isdir(plan.target):
+        return None
+    kind = file_kinds[file_kinds.index(plan.kind) + 1]
+    link_path = Path(plan.link_path)
+    name = link_path.name.replace(SUFFIXES[plan.kind], SUFFIXES[kind])
+    return plan._replace(kind=kind, link_path=link_path.with_name(name))
+
+
+def existing_fallback(plan):
+    """The first fallback of plan whose name is already taken on disk, or None
+
+    This is where an earlier run put the file when plan's own kind was
+    refused, so it is compared and replaced instead of plan's free name.
+    Costs one lstat per later kind in the order, nothing for folders.
+    """
+    if plan.kind not in file_kinds:
+        return None
+    link_path = Path(plan.link_path)
+    for kind in file_kinds[file_kinds.index(plan.kind) + 1:]:
+        path = link_path.with_name(link_path.name.replace(SUFFIXES[plan.kind], SUFFIXES[kind]))
+        if os.path.lexists(path):
+            return plan._replace(kind=kind, link_path=path)
+    return None
+
+
+def link_name_for(path, kind):
+    """Build the suffixed link name for the item at path"""
+    path = Path(path)
+    suffix = SUFFIXES[kind]
+    if kind == JUNCTION:
+        return f"{path.name}{suffix}"
+    return f"{path.stem}{suffix}{path.suffix}"
+
+
+def plan_link(source_path, target_path, direction, is_file=None, target_is_dir=None):
+    """Decide link location, name and type for one source/target/direction
+
+    is_file and target_is_dir may be passed in by callers that already
+    know them, to save a stat per link in large batches.
+    """
+    source_path = Path(source_path)
+    target_path = Path(target_path)
+
+    if direction not in DIRECTIONS:
+        raise LinkSpecError(f"Unknown direction: {direction}")
+    if target_path == source_path:
+        raise LinkSpecError("Source and target must be different!")
+    if is_file is None:
+        is_file = source_path.is_file()
+
+    if direction == TO_TARGET:
+        # Link IN source location pointing TO target
+        pointed_at = target_path
+        link_dir = source_path.parent if is_file else source_path
+    else:
+        # Link IN target folder pointing TO source
+        if target_is_dir is None:
+            target_is_dir = target_path.is_dir()
+        if is_file and not target_is_dir:
+            raise LinkSpecError("Please select a folder for the link location!")
+        pointed_at = source_path
+        link_dir = target_path
+
+    if is_file:
+        # Hard links cannot cross volumes, fall back to a symbolic link
+        kind = file_link_kind(pointed_at.parent, link_dir)
+    elif topology.volume_of(pointed_at).remote:
+        # Junctions can only point at local volumes
+        kind = SYMLINK
+    else:
+        kind = JUNCTION
+
+    link_path = link_dir / link_name_for(pointed_at, kind)
+    return LinkPlan(kind, link_path, pointed_at, f"in {link_dir.name}")
+
+
+class LinkEngine:
+    """Apply link plans through a backend and report per-link results"""
+
+    def __init__(self, backend=None, listeners=(), metrics=None):
+        self.backend = backend if backend is not None else get_backend()
+        # Objects with link_created(plan) / link_removed(path, st) methods,
+        # e.g. a LinkIndex that should stay current without rescanning
+        self.listeners = list(listeners)
+        # Timings and outcome counts (junctwin_metrics.Metrics), if wanted
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+
+    def record_result(self, result):
+        """Count a finished operation in the metrics and pass the result on"""
+        self.metrics.result(result, self.backend.name)
+        return result
+
+    def remove(self, link_path):
+        """Delete an existing link (never its target) and notify listeners"""
+        st = os.stat(link_path, follow_symlinks=False) if self.listeners else None
+        self.backend.remove(link_path)
+        for listener in self.listeners:
+            listener.link_removed(link_path, st)
+
+    def create(self, plan):
+        """Create plan's link through the backend, going down the file link order if refused
+
+        Returns (the plan carried out, created). A file link the volume
+        refuses (see FALLBACK_ERRORS) is tried as the next kind in
+        file_kinds, so the result names the kind really made. created is
+        False when that kind's name already exists, from an earlier run
+        that fell back the same way. If every kind fails, the first
+        kind's error is raised.
+        """
+        first_error = None
+        while True:
+            try:
+                with self.metrics.phase("create", backend=self.backend.name, kind=plan.kind):
+                    self.backend.create(plan.kind, plan.link_path, plan.target)
+                return plan, True
+            except OSError as e:
+                if first_error is None:
+                    first_error = e
+                plan = fallback_plan(plan) if e.errno in FALLBACK_ERRORS else None
+                if plan is None:
+                    raise first_error
+                if os.path.lexists(plan.link_path):
+                    return plan, False
+
+    def apply(self, plan, replace=False):
+        """Create one link, optionally replacing whatever is at its path
+
+        What is being replaced is renamed aside first and only deleted once
+        the new link exists, so a failure (or a file that had to fall back
+        to another kind's name) leaves it in place.
+        """
+        metrics, labels = self.metrics, {"backend": self.backend.name, "kind": plan.kind}
+        with metrics.phase("validate", **labels):
+            existed = os.path.lexists(plan.link_path)
+            # Without replace, create() finds a fallback name already taken by itself
+            fallback = existing_fallback(plan) if replace and not existed else None
+        if fallback is not None:
+            plan, existed = fallback, True
+        backup = st = None
+        try:
+            if existed:
+                if not replace:
+                    return self.record_result(LinkResult(plan, EXISTS, None))
+                with metrics.phase("delete-existing", **labels):
+                    st = os.stat(plan.link_path, follow_symlinks=False) if self.listeners else None
+                    link_path = Path(plan.link_path)
+                    backup = link_path.with_name(f".{link_path.name}.junctwin-old")
+                    os.replace(link_path, backup)
+            try:
+                made, created = self.create(plan)
+            except OSError:
+                if backup is not None:
+                    os.replace(backup, plan.link_path)
+                raise
+            if backup is not None:
+                if made is not plan:
+                    # Made under a later kind's name instead: the link being replaced stays
+                    os.replace(backup, plan.link_path)
+                else:
+                    with metrics.phase("delete-existing", **labels):
+                        self.backend.remove(backup)
+                    for listener in self.listeners:
+                        listener.link_removed(plan.link_path, st)
+        except (LinkError, OSError) as e:
+            return self.record_result(LinkResult(plan, FAILED, e))
+        if not created:
+            if replace:
+                # An earlier run's fallback under that name: replace it in turn
+                return self.apply(made, replace=True)
+            return self.record_result(LinkResult(made, EXISTS, None))
+        for listener in self.listeners:
+            listener.link_created(made)
+        replaced = existed and made is plan
+        return self.record_result(LinkResult(made, REPLACED if replaced else CREATED, None))
+
+    def replace_file(self, plan):
+        """Swap an existing file for a hard link without a window where it is missing
+
+        The link is made under a temporary name next to the file and then
+        renamed over it, so a failure leaves the original file in place.
+        """
+        temp_path = plan.link_path.with_name(f".{plan.link_path.name}.junctwin-tmp")
+        metrics, labels = self.metrics, {"backend": self.backend.name, "kind": HARDLINK}
+        try:
+            st = os.stat(plan.link_path, follow_symlinks=False) if self.listeners else None
+            with metrics.phase("create", **labels):
+                self.backend.create(HARDLINK, temp_path, plan.target)
+            try:
+                with metrics.phase("delete-existing", **labels):
+                    os.replace(temp_path, plan.link_path)
+            except OSError:
+                os.unlink(temp_path)
+                raise
+        except (LinkError, OSError) as e:
+            return self.record_result(LinkResult(plan, FAILED, e))
+        for listener in self.listeners:
+            listener.link_removed(plan.link_path, st)
+            listener.link_created(plan)
+        return self.record_result(LinkResult(plan, REPLACED, None))
+
+    def apply_all(self, plans, replace=False):
+        """Apply many plans in order, yielding a result for each"""
+        for plan in plans:
+            yield self.apply(plan, replace)
+
+
+def _resolve(base_dir, value):
+    path = os.path.expandvars(os.path.expanduser(value))
+    return Path(os.path.join(base_dir, path))
+
+
+def load_manifest(manifest_path):
+    """Read link specs from a .json or .csv manifest
+
+    Each entry has 'source', 'target' and an optional 'direction'
+    (default to_source, as in the GUI), or names the link exactly with
+    'link', 'target' and 'kind' (as written by capture); the latter are
+    returned as ready LinkPlans. Relative paths are resolved against the
+    manifest's folder.
+    """
+    import csv
+    import json
+
+    manifest_path = Path(manifest_path)
+    base_dir = str(manifest_path.resolve().parent)
+
+    if manifest_path.suffix.lower() == ".csv":
+        with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+            entries = list(csv.DictReader(f))
+    else:
+        with open(manifest_path, encoding="utf-8-sig") as f:
+            data = json.load(f)
+        entries = data.get("links", []) if isinstance(data, dict) else data
+
+    specs = []
+    for number, entry in enumerate(entries, 1):
+        if isinstance(entry, dict) and entry.get("link"):
+            kind = (entry.get("kind") or "").strip()
+            if kind not in SUFFIXES or not entry.get("target"):
+                raise LinkSpecError(f"Entry {number}: 'link' needs a 'target' and a 'kind' "
+                                    f"({', '.join(SUFFIXES)})")
+            link_path = _resolve(base_dir, entry["link"])
+            specs.append(LinkPlan(kind, link_path, _resolve(base_dir, entry["target"]),
+                                  f"in {link_path.parent.name}"))
+            continue
+        if not isinstance(entry, dict) or not entry.get("source") or not entry.get("target"):
+            raise LinkSpecError(f"Entry {number}: 'source' and 'target' are required")
+        direction = (entry.get("direction") or TO_SOURCE).strip()
+        specs.append((_resolve(base_dir, entry["source"]),
+                      _resolve(base_dir, entry["target"]),
+                      direction))
+    return specs
+
+
+def plan_specs(specs):
+    """Turn (source, target, direction) specs into plans, or FAILED results"""
+    # Manifests usually link many sources into a few folders: check each folder once
+    folder_checks = {}
+    for spec in specs:
+        if isinstance(spec, LinkPlan):
+            # Already exact (captured links): nothing to decide
+            yield spec
+            continue
+        source, target, direction = spec
+        try:
+            try:
+                is_file = stat.S_ISREG(os.stat(source).st_mode)
+            except OSError:
+                if not os.path.lexists(source):
+                    raise LinkSpecError(f"Path not found: {source}")
+                is_file = False
+            if target not in folder_checks:
+                folder_checks[target] = os.path.isdir(target)
+            yield plan_link(source, target, direction, is_file, folder_checks[target])
+        except LinkSpecError as e:
+            yield LinkResult(LinkPlan(None, source, target, ""), FAILED, e)
+
+
+def _serial_key(plan):
+    """Operations sharing a parent folder (and so any link name) must not overlap"""
+    return os.path.normcase(str(plan.link_path.parent))
+
+
+def apply_parallel(engine, plans, replace=False, jobs=4):
+    """Apply plans on a thread pool, returning results in input order
+
+    Plans are grouped by the folder their link lives in. Each group runs
+    in order on one worker, so the delete-then-recreate step for a link
+    name never races with another operation in the same folder, while
+    links in different folders are created concurrently.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    groups = OrderedDict()
+    for index, plan in enumerate(plans):
+        groups.setdefault(_serial_key(plan), []).append((index, plan))
+
+    def run_group(group):
+        return [(index, engine.apply(plan, replace)) for index, plan in group]
+
+    results = [None] * len(plans)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for group_results in pool.map(run_group, groups.values()):
+            for index, result in group_results:
+                results[index] = result
+    return results
+
+
+def run_batch(specs, engine, replace=False, jobs=1):
+    """Plan and apply a list of specs, yielding one result per spec in order"""
+    items = list(plan_specs(specs))
+    plans = [item for item in items if not isinstance(item, LinkResult)]
+
+    if jobs > 1:
+        applied = iter(apply_parallel(engine, plans, replace, jobs))
+    else:
+        applied = engine.apply_all(plans, replace)
+
+    for item in items:
+        yield engine.record_result(item) if isinstance(item, LinkResult) else next(applied)
@@ -0,0 +1,468 @@
+"""
+Send To dialog for junctwin
+The Tk window used when junctwin is started with a file or folder, kept in
+its own module so command line runs never load tkinter.
+"""
+
+import os
+import queue
+import ctypes
+import threading
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+from pathlib import Path
+
+from junctwin_engine import LinkEngine, LinkSpecError, plan_link, fallback_plan, LINK_TYPE_NAMES
+from junctwin_backends import SYMLINK
+from junctwin_journal import Journal, Transaction
+from junctwin_worker import ElevatedWorker
+from junctwin_volumes import volume_of
+from junctwin_metrics import Metrics
+
+# How often the dialog checks on a running batch (milliseconds)
+POLL_INTERVAL = 50
+
+
+def is_admin():
+    """Check if running with administrator privileges"""
+    try:
+        return ctypes.windll.shell32.IsUserAnAdmin()
+    except:
+        return False
+
+
+class JunctionCreatorGUI:
+    def __init__(self, source_paths):
+        if isinstance(source_paths, (str, Path)):
+            source_paths = [source_paths]
+        self.source_paths = [Path(p).resolve() for p in source_paths]
+        self.source_path = self.source_paths[0]
+        self.file_flags = [p.is_file() for p in self.source_paths]
+        self.is_file = all(self.file_flags)
+        # Files and folders together can only be linked into one target folder
+        self.mixed = any(self.file_flags) and not self.is_file
+        self.is_batch = len(self.source_paths) > 1
+        self.target_path = None
+        # Send To runs have no command line: JUNCTWIN_METRICS names the metrics file
+        self.metrics_path = os.environ.get("JUNCTWIN_METRICS")
+        self.engine = LinkEngine(metrics=Metrics() if self.metrics_path else None)
+        self.worker = None
+        # The batch running in the background, if any
+        self.busy = False
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
+        self.quit_when_done = False
+        
+        height = 360 if self.is_batch else 300
+        
+        # Create main window first
+        self.root = tk.Tk()
+        self.root.title("junctwin")
+        self.root.geometry(f"550x{height}")
+        self.root.resizable(False, False)
+        
+        # Initialize direction variable after root is created
+        self.direction = tk.StringVar(value="to_source")
+        
+        # Center window
+        self.root.update_idletasks()
+        x = (self.root.winfo_screenwidth() // 2) - (550 // 2)
+        y = (self.root.winfo_screenheight() // 2) - (height // 2)
+        self.root.geometry(f"+{x}+{y}")
+        
+        self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.cancel)
+        
+    def describe_sources(self):
+        """Heading for the source box, e.g. 'Current File:' or '3 Files, 2 Folders:'"""
+        if not self.is_batch:
+            return f"Current {'File' if self.is_file else 'Folder'}:"
+        files = sum(self.file_flags)
+        folders = len(self.file_flags) - files
+        parts = []
+        if files:
+            parts.append(f"{files} File{'s' if files != 1 else ''}")
+        if folders:
+            parts.append(f"{folders} Folder{'s' if folders != 1 else ''}")
+        return f"Selected {', '.join(parts)}:"
+        
+    def setup_ui(self):
+        # Title
+        title_frame = tk.Frame(self.root, bg="#0078D4", height=50)
+        title_frame.pack(fill=tk.X, pady=(0, 15))
+        title_label = tk.Label(title_frame, text="junctwin", 
+                               font=("Segoe UI", 14, "bold"), 
+                               bg="#0078D4", fg="white")
+        title_label.pack(pady=10)
+        
+        # Main content frame
+        content_frame = tk.Frame(self.root, padx=20)
+        content_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Source display
+        source_label = tk.Label(content_frame, text=self.describe_sources(), 
+                               font=("Segoe UI", 9, "bold"))
+        source_label.pack(anchor=tk.W)
+        
+        source_text = tk.Text(content_frame, height=4 if self.is_batch else 2, 
+                             wrap=tk.NONE if self.is_batch else tk.WORD, 
+                             font=("Segoe UI", 9), bg="#F0F0F0", 
+                             relief=tk.FLAT, padx=5, pady=5)
+        source_text.pack(fill=tk.X, pady=(2, 15))
+        source_text.insert(1.0, "\n".join(str(p) for p in self.source_paths))
+        source_text.config(state=tk.DISABLED)
+        
+        # Direction options
+        if self.is_batch:
+            link_type = "link"
+        else:
+            link_type = "hard link" if self.is_file else "junction"
+        direction_frame = tk.LabelFrame(content_frame, text=f"{link_type.title()} Direction", 
+                                       font=("Segoe UI", 9, "bold"), padx=10, pady=10)
+        direction_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        if self.is_batch:
+            rb1_text = "Create a link IN each selected item's location → pointing TO target"
+            rb2_text = "Create links IN target folder → pointing TO each selected item"
+        elif self.is_file:
+            rb1_text = "Create link IN current file's folder → pointing TO target file"
+            rb2_text = "Create link IN target file's folder → pointing TO current file"
+        else:
+            rb1_text = "Create junction IN current folder → pointing TO target folder"
+            rb2_text = "Create junction IN target folder → pointing TO current folder"
+        
+        rb1 = tk.Radiobutton(direction_frame, 
+                            text=rb1_text,
+                            variable=self.direction, value="to_target",
+                            font=("Segoe UI", 9))
+        rb1.pack(anchor=tk.W, pady=2)
+        if self.mixed:
+            # A file needs a target file and a folder a target folder
+            rb1.config(state=tk.DISABLED)
+        
+        rb2 = tk.Radiobutton(direction_frame,
+                            text=rb2_text,
+                            variable=self.direction, value="to_source",
+                            font=("Segoe UI", 9))
+        rb2.pack(anchor=tk.W, pady=2)
+        
+        # Progress of a batch, shown while links are being created
+        self.progress = ttk.Progressbar(content_frame, mode="determinate",
+                                        maximum=len(self.source_paths))
+        
+        # Buttons
+        button_frame = tk.Frame(content_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        target_type = "File" if self.is_file else "Folder"
+        self.select_btn = select_btn = tk.Button(button_frame, text=f"Select Target {target_type}", 
+                              command=self.select_target,
+                              font=("Segoe UI", 9, "bold"),
+                              bg="#0078D4", fg="white",
+                              padx=20, pady=8,
+                              cursor="hand2")
+        select_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.cancel_btn = cancel_btn = tk.Button(button_frame, text="Cancel", 
+                              command=self.cancel,
+                              font=("Segoe UI", 9),
+                              padx=20, pady=8,
+                              cursor="hand2")
+        cancel_btn.pack(side=tk.RIGHT)
+        
+    def cancel(self):
+        """Cancel button and window close: stop a running batch, otherwise close the dialog"""
+        if not self.busy:
+            self.root.quit()
+            return
+        if self.cancel_event.is_set():
+            # Closing the window a second time while the batch winds down
+            self.quit_when_done = True
+            return
+        self.cancel_event.set()
+        self.cancel_btn.config(text="Cancelling...", state=tk.DISABLED)
+        
+    def select_target(self):
+        """Open file/folder picker and create the links"""
+        if self.is_file and self.direction.get() == "to_target":
+            # Creating links in the current folders pointing to a target file
+            target = filedialog.askopenfilename(
+                title="Select Target File",
+                initialdir=self.source_path.parent
+            )
+        elif self.is_file:
+            # Creating links in a target folder pointing to the current files
+            target = filedialog.askdirectory(
+                title="Select Target Folder for Link",
+                initialdir=self.source_path.parent
+            )
+        else:
+            target = filedialog.askdirectory(
+                title="Select Target Folder",
+                initialdir=self.source_path.parent
+            )
+        
+        if not target:
+            return
+            
+        self.target_path = Path(target).resolve()
+        
+        # Validate paths are different
+        if self.target_path in self.source_paths:
+            messagebox.showerror("Error", 
+                               "Source and target must be different!")
+            return
+        
+        # For files + to_source: validate target is a folder
+        if any(self.file_flags) and self.direction.get() == "to_source":
+            if not self.target_path.is_dir():
+                messagebox.showerror("Error", 
+                                   "Please select a folder for the link location!")
+                return
+        
+        # Create the links based on selected direction
+        self.create_link()
+        
+    def plan_links(self):
+        """Plans for every source, and (source, error) for those that cannot be linked"""
+        plans, problems = [], []
+        target_is_dir = self.target_path.is_dir()
+        for source, is_file in zip(self.source_paths, self.file_flags):
+            try:
+                plans.append(plan_link(source, self.target_path, self.direction.get(),
+                                       is_file, target_is_dir))
+            except LinkSpecError as e:
+                problems.append((source, e))
+        return plans, problems
+        
+    def confirm_replace(self, plans):
+        """Ask once about links that already exist; returns (plans, replace) or None to cancel"""
+        existing = [plan for plan in plans if os.path.lexists(plan.link_path)]
+        if not existing:
+            return plans, False
+        if not self.is_batch:
+            plan = existing[0]
+            link_type = LINK_TYPE_NAMES[plan.kind]
+            response = messagebox.askyesno(
+                f"{link_type} Exists",
+                f"'{plan.link_path.name}' already exists {plan.location_desc}.\n\n"
+                f"Do you want to delete it and create a new {link_type.lower()}?"
+            )
+            return (plans, True) if response else None
+        response = messagebox.askyesnocancel(
+            "Links Exist",
+            f"{len(existing)} of the {len(plans)} links already exist.\n\n"
+            "Yes: delete and recreate them\n"
+            "No: keep them and create only the missing links"
+        )
+        if response is None:
+            return None
+        if response:
+            return plans, True
+        existing = set(existing)
+        return [plan for plan in plans if plan not in existing], False
+        
+    def ask_elevation(self, message):
+        """Ask whether to hand the batch to an elevated worker"""
+        return messagebox.askyesno(
+            "Elevation Required",
+            f"{message}\n\n"
+            "Create the links with administrator privileges? Windows will ask for permission once."
+        )
+        
+    def apply_plans(self, plans, replace, elevated, description, cancel_event, events):
+        """Create the links in one journaled transaction, here or in the elevated worker
+        
+        Runs on a background thread and never touches Tk: progress goes to
+        events as ("progress", done) and the outcome as ("done", results),
+        ("cancelled", None) or ("error", exception).
+        """
+        try:
+            if elevated:
+                # One worker for the life of the dialog, so retries do not prompt again
+                if self.worker is None:
+                    self.worker = ElevatedWorker().start()
+                events.put(("done", self.worker.run_batch(plans, replace=replace, description=description)))
+                return
+            
+            # A failure or a cancel rolls the whole batch back, putting replaced links back
+            results, failures = [], []
+            journal = Journal()
+            try:
+                transaction = Transaction(self.engine, journal, description)
+                for done, result in enumerate(transaction.apply_all(plans, replace=replace), 1):
+                    results.append(result)
+                    if result.error is not None:
+                        failures.append(result)
+                    events.put(("progress", done))
+                    if failures or cancel_event.is_set():
+                        break
+                if failures or cancel_event.is_set():
+                    transaction.rollback()
+                else:
+                    transaction.commit()
+            finally:
+                journal.close()
+            if failures or not cancel_event.is_set():
+                events.put(("done", results))
+            else:
+                events.put(("cancelled", None))
+        except Exception as e:
+            events.put(("error", e))
+        
+    def start_batch(self, plans, replace, elevated, on_done):
+        """Run apply_plans on a background thread; on_done(results) is called on the Tk thread"""
+        description = f"gui {self.source_path}" if not self.is_batch else f"gui {len(self.source_paths)} items"
+        self.busy = True
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
+        self.progress.pack(fill=tk.X, pady=(0, 5))
+        self.progress["maximum"] = max(len(plans), 1)
+        self.progress["value"] = 0
+        self.select_btn.config(state=tk.DISABLED)
+        # The elevated worker applies a batch in one step, so it cannot be stopped halfway
+        self.cancel_btn.config(text="Cancel", state=tk.DISABLED if elevated else tk.NORMAL)
+        
+        thread = threading.Thread(target=self.apply_plans, daemon=True,
+                                  args=(plans, replace, elevated, description, self.cancel_event, self.events))
+        thread.start()
+        self.root.after(POLL_INTERVAL, self.poll_batch, len(plans), on_done)
+        
+    def poll_batch(self, total, on_done):
+        """Show the progress of the running batch and hand its outcome to on_done"""
+        outcome = None
+        try:
+            while outcome is None:
+                kind, value = self.events.get_nowait()
+                if kind == "progress":
+                    self.progress["value"] = value
+                else:
+                    outcome = (kind, value)
+        except queue.Empty:
+            pass
+        if outcome is None:
+            self.root.after(POLL_INTERVAL, self.poll_batch, total, on_done)
+            return
+        
+        self.busy = False
+        self.select_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(text="Cancel", state=tk.NORMAL)
+        if self.quit_when_done:
+            self.root.quit()
+            return
+        kind, value = outcome
+        if kind == "cancelled":
+            self.progress.pack_forget()
+            messagebox.showinfo("Cancelled", "The batch was cancelled.\n\nNo links were changed.")
+        elif kind == "error":
+            self.progress.pack_forget()
+            messagebox.showerror("Error", f"Failed to create link:\n{value}")
+        else:
+            self.progress["value"] = total
+            on_done(value)
+        
+    def create_link(self):
+        """Create the junction points or hard links for every selected item"""
+        try:
+            plans, problems = self.plan_links()
+            if problems and (not plans or not self.is_batch):
+                raise problems[0][1]
+            
+            # Cross-drive file links are symbolic links, which need admin rights: ask once for the batch
+            elevated = False
+            # (not for those a copy can stand in for, when the file link order ends in one)
+            symlinks = [plan for plan in plans if plan.kind == SYMLINK and fallback_plan(plan) is None]
+            if symlinks and not is_admin():
+                plan = symlinks[0]
+                if self.is_batch:
+                    message = (f"{len(symlinks)} of the files are on a different volume than the link location.\n\n"
+                               "Symbolic links across volumes require administrator privileges.")
+                else:
+                    volumes = (volume_of(plan.target.parent).root, volume_of(plan.link_path.parent).root)
+                    message = (f"Files are on different volumes ({volumes[0]} and {volumes[1]}).\n\n"
+                               "Symbolic links across volumes require administrator privileges.")
+                if not self.ask_elevation(message):
+                    return
+                elevated = True
+            
+            # Check if links already exist
+            confirmed = self.confirm_replace(plans)
+            if confirmed is None:
+                return
+            plans, replace = confirmed
+            
+            self.start_batch(plans, replace, elevated,
+                             lambda results: self.finish_batch(plans, replace, elevated, problems, results))
+                
+        except LinkSpecError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to create link:\n{str(e)}")
+        
+    def finish_batch(self, plans, replace, elevated, problems, results):
+        """Report a finished batch, offering to retry it elevated when access was denied"""
+        failures = [result for result in results if result.error is not None]
+        if failures and getattr(failures[0].error, "access_denied", False) and not (elevated or is_admin()):
+            link_type = LINK_TYPE_NAMES[failures[0].plan.kind]
+            if self.ask_elevation(f"Failed to create {link_type.lower()} due to insufficient privileges.\n\n"
+                                  f"Error: {failures[0].error}"):
+                self.start_batch(plans, replace, True,
+                                 lambda results: self.finish_batch(plans, replace, True, problems, results))
+                return
+        
+        if not failures:
+            if self.is_batch:
+                location = self.target_path if self.direction.get() == "to_source" else "next to each item"
+                skipped = "".join(f"\nSkipped {source.name}: {error}" for source, error in problems)
+                messagebox.showinfo(
+                    "Success",
+                    f"{len(plans)} link{'s' if len(plans) != 1 else ''} created successfully!\n\n"
+                    f"Location: {location}{skipped}"
+                )
+            else:
+                # What was really made: a later kind in the file link order if the first was refused
+                plan = results[0].plan if results else plans[0]
+                messagebox.showinfo(
+                    "Success", 
+                    f"{LINK_TYPE_NAMES[plan.kind]} created successfully!\n\n"
+                    f"Link: {plan.link_path}\n"
+                    f"Points to: {plan.target}"
+                )
+            self.root.quit()
+            return
+        
+        # The first real failure explains the batch (the rest were not attempted)
+        result = failures[0]
+        link_type = LINK_TYPE_NAMES[result.plan.kind]
+        if self.is_batch:
+            messagebox.showerror("Error",
+                               f"Failed to create {link_type.lower()} {result.plan.location_desc}:\n{result.error}\n\n"
+                               "No links were changed.")
+        else:
+            messagebox.showerror("Error", 
+                               f"Failed to create {link_type.lower()}:\n{result.error}")
+        self.progress.pack_forget()
+    
+    def run(self):
+        """Run the GUI"""
+        try:
+            self.root.mainloop()
+        finally:
+            if self.worker is not None:
+                self.worker.close()
+            if self.metrics_path:
+                self.engine.metrics.write(self.metrics_path, command="gui")
+        self.root.destroy()
+
+
+def open_batch_dialog(paths):
+    """Show one Send To dialog for a batch of paths (the daemon's batch handler)"""
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        root = tk.Tk()
+        root.withdraw()
+        messagebox.showerror("junctwin", "Path not found:\n" + "\n".join(missing))
+        root.destroy()
+    existing = [path for path in paths if os.path.exists(path)]
+    if existing:
+        JunctionCreatorGUI(existing).run()
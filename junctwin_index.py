@@ -0,0 +1,263 @@
+"""
+Link inventory index for junctwin
+Scans folder trees for junctions, symbolic links and hard-linked files and
+keeps them in a SQLite database, so later queries never walk the disk again.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from junctwin_backends import JUNCTION, HARDLINK, SYMLINK, entry_is_link, entry_link_kind, entry_lstat, read_link_target
+from junctwin_walk import Walker, is_plain_dir
+
+
+# One indexed link: where it is, what kind it is and what it points to
+LinkRecord = namedtuple("LinkRecord", "path kind target dev ino nlink")
+
+# What a scan did: folders listed, folders skipped as unchanged, links found in listed folders
+ScanStats = namedtuple("ScanStats", "dirs_listed dirs_unchanged links_found")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    parent   TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS links (
+    path   TEXT PRIMARY KEY,
+    dir    TEXT NOT NULL,
+    kind   TEXT NOT NULL,
+    target TEXT,
+    dev    INTEGER,
+    ino    INTEGER,
+    nlink  INTEGER
+);
+CREATE INDEX IF NOT EXISTS links_dir ON links (dir);
+CREATE INDEX IF NOT EXISTS links_inode ON links (dev, ino);
+"""
+
+
+def default_index_path():
+    """Per-user location of the link index"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(base) / "junctwin" / "index.sqlite"
+
+
+def _mtime_ns(entry):
+    """Modification time of the folder entry itself, or None if it cannot be read"""
+    try:
+        return entry.stat(follow_symlinks=False).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _subtree_bounds(path):
+    """Key range covering every path strictly below path"""
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class LinkIndex:
+    """SQLite-backed inventory of the links under one or more roots"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else default_index_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # The engine may report link changes from worker threads
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _forget(self, path):
+        """Drop a folder and everything indexed below it"""
+        low, high = _subtree_bounds(path)
+        self.db.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+        self.db.execute("DELETE FROM links WHERE dir = ? OR (dir >= ? AND dir < ?)", (path, low, high))
+
+    def _link_row(self, entry):
+        """The links row for entry, or None if it is not a link or hard-linked file"""
+        st = entry_lstat(entry)
+        kind = entry_link_kind(entry, st)
+        if kind is None:
+            return None
+        target = read_link_target(entry.path) if entry_is_link(entry) else None
+        return entry.path, os.path.dirname(entry.path), kind, target, st.st_dev, st.st_ino, st.st_nlink
+
+    def _insert_links(self, rows):
+        """Write link rows collected by a scan, emptying the list"""
+        self.db.executemany("INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        rows.clear()
+
+    def _relist(self, path, mtime_ns, stored, unseen):
+        """Start listing path again: drop its links and note the subfolders indexed in it"""
+        self.db.execute("DELETE FROM links WHERE dir = ?", (path,))
+        self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (path, os.path.dirname(path), mtime_ns))
+        children = self.db.execute("SELECT path, mtime_ns FROM dirs WHERE parent = ?", (path,)).fetchall()
+        stored.update(children)
+        if children:
+            unseen[path] = {child for child, _ in children}
+
+    def scan(self, root, full=False):
+        """Bring the index up to date for the tree under root
+
+        A folder is only listed again if its modification time changed
+        since the last scan (something was added, removed or renamed in
+        it); unchanged folders cost a single stat. Pass full=True to list
+        every folder regardless, e.g. to refresh hard link counts.
+        """
+        root = os.path.abspath(root)
+        stored = dict(self.db.execute("SELECT path, mtime_ns FROM dirs WHERE path = ?", (root,)))
+
+        def is_unchanged(entry):
+            # DirEntry caches the stat, so asking again later costs nothing
+            return not full and stored.get(entry.path, False) == _mtime_ns(entry)
+
+        # Unchanged folders are left unlisted by the walk and their indexed subfolders checked instead
+        walker = Walker(prune=is_unchanged)
+        tops = [(root, os.stat(root).st_mtime_ns)]
+        listed = unchanged = found = 0
+        rows = []
+
+        with self.db:
+            while tops:
+                top, mtime_ns = tops.pop()
+                if not full and stored.get(top) == mtime_ns:
+                    # Nothing added or removed here: reuse the indexed subfolders
+                    unchanged += 1
+                    children = self.db.execute("SELECT path, mtime_ns FROM dirs WHERE parent = ?",
+                                               (top,)).fetchall()
+                    stored.update(children)
+                    for child, _ in children:
+                        try:
+                            tops.append((child, os.stat(child, follow_symlinks=False).st_mtime_ns))
+                        except OSError:
+                            self._forget(child)
+                    continue
+
+                # Indexed subfolders of the folders being listed, until met again
+                unseen = {}
+                counts = listed, found
+                self._relist(top, mtime_ns, stored, unseen)
+                try:
+                    for _, entry, entered in walker.walk(top):
+                        if not is_plain_dir(entry):
+                            try:
+                                row = self._link_row(entry)
+                            except OSError:
+                                continue
+                            if row is not None:
+                                rows.append(row)
+                                found += 1
+                            if len(rows) >= 1000:
+                                self._insert_links(rows)
+                            continue
+                        parent = os.path.dirname(entry.path)
+                        if parent in unseen:
+                            unseen[parent].discard(entry.path)
+                            if not unseen[parent]:
+                                del unseen[parent]
+                        if entered:
+                            self._relist(entry.path, _mtime_ns(entry), stored, unseen)
+                            listed += 1
+                        elif is_unchanged(entry):
+                            tops.append((entry.path, _mtime_ns(entry)))
+                        else:
+                            # Could not be listed
+                            self._forget(entry.path)
+                except OSError:
+                    rows.clear()
+                    self._forget(top)
+                    listed, found = counts
+                    continue
+                listed += 1
+                self._insert_links(rows)
+
+                # Forget subfolders that disappeared since the last scan
+                for children in unseen.values():
+                    for child in children:
+                        self._forget(child)
+
+        return ScanStats(listed, unchanged, found)
+
+    def query(self, kind=None, under=None, target_under=None):
+        """Yield indexed links, optionally filtered by kind, location and target"""
+        sql, params = "SELECT path, kind, target, dev, ino, nlink FROM links WHERE 1 = 1", []
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if under:
+            low, high = _subtree_bounds(os.path.abspath(under))
+            sql += " AND path >= ? AND path < ?"
+            params += [low, high]
+        if target_under:
+            low, high = _subtree_bounds(os.path.abspath(target_under))
+            sql += " AND target >= ? AND target < ?"
+            params += [low, high]
+        for row in self.db.execute(sql + " ORDER BY path", params):
+            yield LinkRecord(*row)
+
+    def siblings(self, path):
+        """All indexed names of the file at path (including path itself)"""
+        st = os.stat(path, follow_symlinks=False)
+        return self.names(st.st_dev, st.st_ino)
+
+    def names(self, dev, ino):
+        """All indexed hard link names of the file with this (device, inode)"""
+        return [row[0] for row in self.db.execute(
+            "SELECT path FROM links WHERE dev = ? AND ino = ? AND kind = ? ORDER BY path",
+            (dev, ino, HARDLINK))]
+
+    # Engine listener interface: keep the index current as junctwin changes links
+
+    def link_created(self, plan):
+        """Record a link junctwin just made from a LinkPlan (clones and copies are not links)"""
+        if plan.kind not in (JUNCTION, HARDLINK, SYMLINK):
+            return
+        link_path = os.path.abspath(plan.link_path)
+        try:
+            st = os.stat(link_path, follow_symlinks=False)
+        except OSError:
+            return
+        rows = []
+        if plan.kind == HARDLINK:
+            # The original name becomes a hard link too, if it was not one already
+            target = os.path.abspath(plan.target)
+            rows.append((target, os.path.dirname(target), HARDLINK, None, st.st_dev, st.st_ino, st.st_nlink))
+            rows.append((link_path, os.path.dirname(link_path), HARDLINK, None, st.st_dev, st.st_ino, st.st_nlink))
+        else:
+            rows.append((link_path, os.path.dirname(link_path), plan.kind, str(plan.target),
+                         st.st_dev, st.st_ino, st.st_nlink))
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            if plan.kind == HARDLINK:
+                self.db.execute("UPDATE links SET nlink = ? WHERE dev = ? AND ino = ?",
+                                (st.st_nlink, st.st_dev, st.st_ino))
+
+    def link_removed(self, link_path, st):
+        """Forget a link junctwin just deleted; st is its lstat from before the delete"""
+        link_path = os.path.abspath(link_path)
+        with self.lock:
+            self.db.execute("DELETE FROM links WHERE path = ?", (link_path,))
+            if st is not None and st.st_nlink > 1:
+                self.db.execute("UPDATE links SET nlink = nlink - 1 WHERE dev = ? AND ino = ?",
+                                (st.st_dev, st.st_ino))
+                # A file left with a single name is no longer a hard link
+                self.db.execute("DELETE FROM links WHERE dev = ? AND ino = ? AND kind = ? AND nlink <= 1",
+                                (st.st_dev, st.st_ino, HARDLINK))
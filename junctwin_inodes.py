@@ -0,0 +1,173 @@
+"""
+Compact (device, inode) -> paths map and (device, inode) set for junctwin
+Keeps every name of every hard-linked file in flat arrays instead of a dict of
+Path objects, so tens of millions of entries fit in memory.
+"""
+
+from array import array
+
+
+EMPTY = -1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+class InodeMap:
+    """Open-addressing hash table from (device, inode) to the paths naming it
+
+    Keys live in two unsigned 64-bit arrays. Each slot points at the
+    first of its paths; paths are chained through a 'next' array and
+    their UTF-8 bytes are packed end to end in one bytearray. Lookups
+    and inserts are O(1) on average.
+    """
+
+    def __init__(self, capacity=1024):
+        size = 16
+        while size * 7 < capacity * 10:
+            size *= 2
+        self._alloc(size)
+        self._next = array("q")
+        self._offsets = array("Q", [0])
+        self._blob = bytearray()
+
+    def _alloc(self, size):
+        self._mask = size - 1
+        self._devs = array("Q", bytes(8 * size))
+        self._inos = array("Q", bytes(8 * size))
+        self._heads = array("q", [EMPTY]) * size
+        self._used = bytearray(size)
+        self._keys = 0
+
+    def _slot(self, dev, ino):
+        """Slot holding (dev, ino), or the free slot where it would go"""
+        dev &= _MASK64
+        ino &= _MASK64
+        i = ((ino * _GOLDEN) ^ dev) & self._mask
+        while self._used[i]:
+            if self._inos[i] == ino and self._devs[i] == dev:
+                return i
+            i = (i + 1) & self._mask
+        return i
+
+    def _grow(self):
+        old = (self._devs, self._inos, self._heads, self._used)
+        self._alloc((self._mask + 1) * 2)
+        devs, inos, heads, used = old
+        for i in range(len(used)):
+            if used[i]:
+                j = self._slot(devs[i], inos[i])
+                self._used[j] = 1
+                self._devs[j], self._inos[j], self._heads[j] = devs[i], inos[i], heads[i]
+                self._keys += 1
+
+    def _path(self, path_id):
+        return self._blob[self._offsets[path_id]:self._offsets[path_id + 1]].decode("utf-8", "surrogateescape")
+
+    def add(self, dev, ino, path):
+        """Record one more name for (dev, ino) in O(1)
+
+        Names are not checked against those already recorded (that would
+        decode them all, making a file with n names cost O(n^2)): callers
+        add each name once, as a walk meets every path once.
+        """
+        if (self._keys + 1) * 10 > (self._mask + 1) * 7:
+            self._grow()
+        i = self._slot(dev, ino)
+        if not self._used[i]:
+            self._used[i] = 1
+            self._devs[i], self._inos[i] = dev & _MASK64, ino & _MASK64
+            self._keys += 1
+
+        self._blob += str(path).encode("utf-8", "surrogateescape")
+        self._offsets.append(len(self._blob))
+        self._next.append(self._heads[i])
+        self._heads[i] = len(self._next) - 1
+
+    def get(self, dev, ino):
+        """All recorded names of (dev, ino), oldest first"""
+        i = self._slot(dev, ino)
+        if not self._used[i]:
+            return []
+        paths, path_id = [], self._heads[i]
+        while path_id != EMPTY:
+            paths.append(self._path(path_id))
+            path_id = self._next[path_id]
+        paths.reverse()
+        return paths
+
+    def __contains__(self, key):
+        return bool(self.get(*key))
+
+    def items(self):
+        """Yield (dev, ino, names) for every key, names oldest first"""
+        for i in range(self._mask + 1):
+            if self._used[i]:
+                names = self.get(self._devs[i], self._inos[i])
+                if names:
+                    yield self._devs[i], self._inos[i], names
+
+    def __len__(self):
+        """Number of names recorded"""
+        return len(self._next)
+
+
+class InodeSet:
+    """Open-addressing hash set of (device, inode) pairs
+
+    The same layout as InodeMap without the paths: two unsigned 64-bit
+    arrays and a used flag per slot, about 24 bytes per entry, so a
+    walker can remember every hard-linked file it has counted.
+    """
+
+    def __init__(self, capacity=1024):
+        size = 16
+        while size * 7 < capacity * 10:
+            size *= 2
+        self._alloc(size)
+
+    def _alloc(self, size):
+        self._mask = size - 1
+        self._devs = array("Q", bytes(8 * size))
+        self._inos = array("Q", bytes(8 * size))
+        self._used = bytearray(size)
+        self._keys = 0
+
+    def _slot(self, dev, ino):
+        i = ((ino * _GOLDEN) ^ dev) & self._mask
+        while self._used[i]:
+            if self._inos[i] == ino and self._devs[i] == dev:
+                return i
+            i = (i + 1) & self._mask
+        return i
+
+    def _grow(self):
+        devs, inos, used = self._devs, self._inos, self._used
+        self._alloc((self._mask + 1) * 2)
+        for i in range(len(used)):
+            if used[i]:
+                j = self._slot(devs[i], inos[i])
+                self._used[j] = 1
+                self._devs[j], self._inos[j] = devs[i], inos[i]
+                self._keys += 1
+
+    def add(self, dev, ino):
+        """Add (dev, ino); returns True if it was not in the set yet"""
+        dev &= _MASK64
+        ino &= _MASK64
+        i = self._slot(dev, ino)
+        if self._used[i]:
+            return False
+        if (self._keys + 1) * 10 > (self._mask + 1) * 7:
+            self._grow()
+            i = self._slot(dev, ino)
+        self._used[i] = 1
+        self._devs[i], self._inos[i] = dev, ino
+        self._keys += 1
+        return True
+
+    def __contains__(self, key):
+        dev, ino = key
+        return bool(self._used[self._slot(dev & _MASK64, ino & _MASK64)])
+
+    def __len__(self):
+        return self._keys
@@ -0,0 +1,409 @@
+"""
+Operation journal and transactional batches for junctwin
+Every planned and completed link operation is appended to a journal, so a
+failed batch can be rolled back to the links it replaced and any past batch
+can be undone later.
+"""
+
+import os
+import json
+import errno
+import time
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from junctwin_backends import JUNCTION, SYMLINK, HARDLINK, LinkError, path_link_kind, read_link_target
+from junctwin_engine import LinkPlan, LinkResult, CREATED, REPLACED, EXISTS, FAILED, existing_fallback
+from junctwin_index import default_index_path
+
+
+# Operations recorded in the journal
+CREATE = "create"
+REPLACE = "replace"
+REMOVE = "remove"
+
+# Result status for an entry removed by a transaction
+REMOVED = "removed"
+
+# What was at a link path before an operation touched it
+Prior = namedtuple("Prior", "kind target dev ino")
+
+
+def default_journal_path():
+    """Per-user location of the operation journal, next to the link index"""
+    return default_index_path().with_name("journal.jsonl")
+
+
+def new_batch_id():
+    return time.strftime("%Y%m%d-%H%M%S-") + os.urandom(3).hex()
+
+
+def describe_link(path):
+    """Prior state of whatever is at path, or None if nothing is there"""
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+    kind = path_link_kind(path, st)
+    target = read_link_target(path) if kind in (JUNCTION, SYMLINK) else None
+    return Prior(kind, target, st.st_dev, st.st_ino)
+
+
+class Journal:
+    """Append-only JSON-lines log of link operations
+
+    Records are written through a large buffer and only forced to disk
+    (fsync) every sync_every records, every sync_interval seconds, and
+    at batch boundaries, so journaling adds little to big batches.
+    """
+
+    def __init__(self, path=None, sync_every=1000, sync_interval=1.0):
+        self.path = Path(path) if path else default_journal_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def write(self, record, sync=False):
+        """Append one record; sync=True makes it durable before returning"""
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1024 * 1024)
+            self._file.write(line)
+            self._unsynced += 1
+            if (sync or self._unsynced >= self.sync_every
+                    or time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def records(self, batch_id=None):
+        """Read records back, optionally only those of one batch"""
+        if self._file is not None:
+            with self.lock:
+                self._file.flush()
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash
+                    continue
+                if batch_id is None or record.get("batch") == batch_id:
+                    yield record
+
+    def batches(self):
+        """(batch id, begin record, final op) for every batch, oldest first"""
+        batches = {}
+        for record in self.records():
+            if record.get("op") == "begin":
+                batches[record["batch"]] = [record, None]
+            elif record.get("op") in ("commit", "rollback") and record.get("batch") in batches:
+                batches[record["batch"]][1] = record["op"]
+        return [(batch_id, begin, final) for batch_id, (begin, final) in batches.items()]
+
+
+class Transaction:
+    """An all-or-nothing set of link operations
+
+    Anything at a link path is first renamed aside to a backup name, so
+    until commit() every replaced link can be put back exactly as it was.
+    Usable wherever a LinkEngine is expected (apply/apply_all), including
+    the parallel batch executor.
+    """
+
+    def __init__(self, engine, journal, description="", undo_of=None, all_or_nothing=True):
+        self.engine = engine
+        self.journal = journal
+        self.batch_id = new_batch_id()
+        self.all_or_nothing = all_or_nothing
+        self.failed = False
+        self._done = []
+        self._lock = threading.Lock()
+        begin = {"batch": self.batch_id, "op": "begin", "time": time.time(), "command": description}
+        if undo_of:
+            begin["undo_of"] = undo_of
+        journal.write(begin, sync=True)
+
+    @property
+    def listeners(self):
+        return self.engine.listeners
+
+    def record_result(self, result):
+        return self.engine.record_result(result)
+
+    def _record(self, op, plan, prior, backup, done):
+        record = {"batch": self.batch_id, "op": op, "state": "done" if done else "planned",
+                  "path": str(plan.link_path), "kind": plan.kind,
+                  "target": str(plan.target) if plan.target is not None else None,
+                  "prior": prior._asdict() if prior else None,
+                  "backup": str(backup) if backup else None}
+        self.journal.write(record)
+
+    def _backup_path(self, link_path):
+        return link_path.with_name(f".{link_path.name}.{self.batch_id}.junctwin-old")
+
+    def _move_aside(self, plan, op, prior):
+        backup = self._backup_path(plan.link_path)
+        self._record(op, plan, prior, backup, done=False)
+        os.replace(plan.link_path, backup)
+        return backup
+
+    def apply(self, plan, replace=False):
+        """Create one link as part of the transaction"""
+        if self.failed and self.all_or_nothing:
+            return LinkResult(plan, FAILED, LinkError("Not attempted, an earlier link in the batch failed"))
+
+        backup = None
+        metrics, labels = self.engine.metrics, {"backend": self.engine.backend.name, "kind": plan.kind}
+        try:
+            with metrics.phase("validate", **labels):
+                prior = describe_link(plan.link_path)
+                fallback = existing_fallback(plan) if replace and prior is None else None
+                if fallback is not None:
+                    # Made as a later kind by an earlier run: that is the file to keep or replace
+                    plan, prior = fallback, describe_link(fallback.link_path)
+            if prior is not None and not replace:
+                return self.record_result(LinkResult(plan, EXISTS, None))
+            op = REPLACE if prior is not None else CREATE
+            if prior is not None:
+                with metrics.phase("delete-existing", **labels):
+                    backup = self._move_aside(plan, op, prior)
+            else:
+                self._record(op, plan, prior, None, done=False)
+            try:
+                fell_back, created = self.engine.create(plan)
+            except OSError:
+                if backup is not None:
+                    os.replace(backup, plan.link_path)
+                raise
+        except (LinkError, OSError) as e:
+            self.failed = True
+            return self.record_result(LinkResult(plan, FAILED, e))
+        if fell_back is not plan:
+            # Made as a later kind in the file link order, under that kind's name
+            if backup is not None:
+                os.replace(backup, plan.link_path)
+            self._record(op, plan, prior, None, done=False)
+            if not created:
+                if replace:
+                    # An earlier run's fallback under that name: replace it in turn
+                    return self.apply(fell_back, replace=True)
+                return self.record_result(LinkResult(fell_back, EXISTS, None))
+            plan, prior, backup, op = fell_back, None, None, CREATE
+
+        self._record(op, plan, prior, backup, done=True)
+        with self._lock:
+            self._done.append((plan, prior, backup))
+        for listener in self.listeners:
+            listener.link_created(plan)
+        return self.record_result(LinkResult(plan, REPLACED if prior is not None else CREATED, None))
+
+    def apply_all(self, plans, replace=False):
+        for plan in plans:
+            yield self.apply(plan, replace)
+
+    def retarget(self, plan):
+        """Re-point an existing junction or symlink as part of the transaction
+
+        Where the backend can change the link in place there is no backup:
+        the journal keeps the old target, and rollback or undo point the
+        link back at it. Otherwise this is a replace like apply().
+        """
+        retarget = getattr(self.engine.backend, "retarget", None)
+        if retarget is None:
+            return self.apply(plan, replace=True)
+        if self.failed and self.all_or_nothing:
+            return LinkResult(plan, FAILED, LinkError("Not attempted, an earlier link in the batch failed"))
+
+        labels = {"backend": self.engine.backend.name, "kind": plan.kind}
+        try:
+            prior = describe_link(plan.link_path)
+            if prior is None:
+                raise LinkError("The link no longer exists", errno.ENOENT, str(plan.link_path))
+            self._record(REPLACE, plan, prior, None, done=False)
+            with self.engine.metrics.phase("retarget", **labels):
+                in_place = retarget(plan.kind, plan.link_path, plan.target)
+        except (LinkError, OSError) as e:
+            self.failed = True
+            return self.record_result(LinkResult(plan, FAILED, e))
+        if not in_place:
+            return self.apply(plan, replace=True)
+
+        self._record(REPLACE, plan, prior, None, done=True)
+        with self._lock:
+            self._done.append((plan, prior, None))
+        for listener in self.listeners:
+            listener.link_created(plan)
+        return self.record_result(LinkResult(plan, REPLACED, None))
+
+    def remove(self, link_path):
+        """Remove a link as part of the transaction (kept as a backup until commit)"""
+        link_path = Path(link_path)
+        prior = describe_link(link_path)
+        plan = LinkPlan(None, link_path, None, "")
+        if prior is None:
+            return self.record_result(LinkResult(plan, REMOVED, None))
+        try:
+            backup = self._move_aside(plan, REMOVE, prior)
+        except OSError as e:
+            self.failed = True
+            return self.record_result(LinkResult(plan, FAILED, e))
+        self._record(REMOVE, plan, prior, backup, done=True)
+        with self._lock:
+            self._done.append((plan, prior, backup))
+        return self.record_result(LinkResult(plan, REMOVED, None))
+
+    def commit(self):
+        """Make the batch final: delete the backups of everything replaced or removed"""
+        for plan, prior, backup in self._done:
+            if backup is None:
+                continue
+            try:
+                self.engine.backend.remove(backup)
+            except OSError:
+                pass
+            if plan.kind is None:
+                for listener in self.listeners:
+                    listener.link_removed(plan.link_path, None)
+        self.journal.write({"batch": self.batch_id, "op": "commit", "time": time.time()}, sync=True)
+
+    def rollback(self):
+        """Undo everything done so far, restoring replaced links from their backups"""
+        restored = 0
+        for plan, prior, backup in reversed(self._done):
+            try:
+                if plan.kind is not None and prior is not None and backup is None:
+                    # Retargeted in place: point it back the same way
+                    self.engine.backend.retarget(prior.kind, plan.link_path, prior.target)
+                    for listener in self.listeners:
+                        listener.link_created(LinkPlan(prior.kind, plan.link_path, prior.target, ""))
+                    restored += 1
+                    continue
+                if plan.kind is not None and os.path.lexists(plan.link_path):
+                    self.engine.backend.remove(plan.link_path)
+                    for listener in self.listeners:
+                        listener.link_removed(plan.link_path, None)
+                if backup is not None:
+                    os.replace(backup, plan.link_path)
+                    if prior.kind in (JUNCTION, SYMLINK):
+                        for listener in self.listeners:
+                            listener.link_created(LinkPlan(prior.kind, plan.link_path, prior.target, ""))
+                restored += 1
+            except OSError:
+                continue
+        self.journal.write({"batch": self.batch_id, "op": "rollback", "time": time.time()}, sync=True)
+        return restored
+
+
+def _hardlink_targets(journal, paths):
+    """path -> every target the journal records a hard link at that path pointing to, in one read"""
+    targets = {path: [] for path in paths}
+    if targets:
+        for r in journal.records():
+            if r.get("path") in targets and r.get("kind") == HARDLINK and r.get("target"):
+                targets[r["path"]].append(r["target"])
+    return targets
+
+
+def _other_name(journaled, index, link_path, prior):
+    """Another existing name of a hard-linked file, from the index or the journaled targets"""
+    candidates = index.names(prior.dev, prior.ino) if index is not None else []
+    candidates += journaled.get(str(link_path), [])
+    for name in candidates:
+        if name == str(link_path):
+            continue
+        try:
+            st = os.stat(name, follow_symlinks=False)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) == (prior.dev, prior.ino):
+            return name
+    return None
+
+
+def undo_batch(journal, batch_id, engine, index=None):
+    """Reverse a past batch in a new transaction, returning (transaction, results)
+
+    Links the batch created are removed and the links it replaced or
+    removed are recreated from their journaled kind and target. A prior
+    hard link is restored from another name of the same file, found in the
+    link index (when one is given) or in earlier journal records. Backups
+    left by an interrupted batch are moved back directly.
+    """
+    ops = [r for r in journal.records(batch_id) if r.get("op") in (CREATE, REPLACE, REMOVE)]
+    if not ops:
+        raise ValueError(f"No operations recorded for batch {batch_id}")
+
+    # Latest record per path wins: 'done' if the operation finished, else 'planned'
+    latest = {}
+    for record in ops:
+        latest[record["path"]] = record
+
+    # Earlier names of the hard links to restore, read from the whole journal once
+    # (the batches that made them), not once per link
+    journaled = _hardlink_targets(journal, [path for path, r in latest.items() if r["state"] == "done"
+                                            and (r.get("prior") or {}).get("kind") == HARDLINK])
+
+    transaction = Transaction(engine, journal, f"undo {batch_id}", undo_of=batch_id)
+    results = []
+    for record in reversed(list(latest.values())):
+        link_path = Path(record["path"])
+        prior = Prior(**record["prior"]) if record.get("prior") else None
+        backup = record.get("backup")
+
+        if backup and os.path.lexists(backup):
+            # Interrupted before commit: the original is still there under its backup name
+            plan = LinkPlan(prior.kind if prior else None, link_path, prior.target if prior else None, "")
+            if os.path.lexists(link_path):
+                removed = transaction.remove(link_path)
+                results.append(removed)
+                if removed.status == FAILED:
+                    continue
+            try:
+                os.replace(backup, link_path)
+            except OSError as e:
+                # What stood in its place was moved aside above: roll back rather than lose both
+                transaction.failed = True
+                results.append(LinkResult(plan, FAILED, e))
+                continue
+            results.append(LinkResult(plan, REPLACED, None))
+            continue
+
+        if record["state"] != "done":
+            continue
+
+        if prior is None:
+            results.append(transaction.remove(link_path))
+            continue
+
+        target = prior.target
+        if prior.kind == HARDLINK:
+            target = _other_name(journaled, index, link_path, prior)
+        if prior.kind is None or target is None:
+            # Reported, but not a reason to abandon the rest of the undo
+            error = LinkError(f"Cannot restore {link_path}: no other name of the original is known")
+            results.append(LinkResult(LinkPlan(prior.kind, link_path, None, ""), FAILED, error))
+            continue
+        plan = LinkPlan(prior.kind, link_path, Path(target), f"in {link_path.parent.name}")
+        results.append(transaction.apply(plan, replace=True))
+
+    return transaction, results
@@ -0,0 +1,180 @@
+"""
+Metrics for junctwin link operations
+Counts link results and errors and keeps latency histograms per backend, link
+kind and phase (validate, delete-existing, create), exported as JSON lines or
+as a Prometheus text file.
+"""
+
+import os
+import time
+import errno
+import threading
+from collections import Counter
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, float("inf"))
+
+HELP = {
+    "junctwin_links_total": "Link operations by outcome",
+    "junctwin_errors_total": "Failed link operations by error class",
+    "junctwin_phase_seconds": "Time spent in each phase of a link operation",
+    "junctwin_command_seconds": "Wall time of a junctwin command",
+}
+
+
+def error_class(error):
+    """Short, stable name for an error: its errno symbol, else its type"""
+    code = getattr(error, "errno", None)
+    return errno.errorcode.get(code, type(error).__name__) if code else type(error).__name__
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics, self.name, self.labels = metrics, name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullMetrics:
+    """Stand-in used when nothing is being measured; every call is a no-op"""
+
+    _timer = _NoTimer()
+
+    def phase(self, phase, **labels):
+        return self._timer
+
+    def timer(self, name, **labels):
+        return self._timer
+
+    def count(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def result(self, result, backend):
+        pass
+
+
+class Metrics(NullMetrics):
+    """Counters and latency histograms, safe to update from worker threads"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def phase(self, phase, **labels):
+        """Time one phase of a link operation: with metrics.phase("create", kind=...)"""
+        return _Timer(self, "junctwin_phase_seconds", dict(labels, phase=phase))
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (cumulated on export), then sum and count
+                histogram = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def result(self, result, backend):
+        """Count one LinkResult"""
+        kind = result.plan.kind or "none"
+        self.count("junctwin_links_total", status=result.status, kind=kind, backend=backend)
+        if result.error is not None:
+            self.count("junctwin_errors_total", error=error_class(result.error), kind=kind, backend=backend)
+
+    def samples(self):
+        """One dict per counter and histogram, for JSON export"""
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                yield {"metric": name, "type": "counter", "labels": dict(labels), "value": value}
+            for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+                cumulative, running = {}, 0
+                for bound, n in zip(BUCKETS, buckets):
+                    running += n
+                    cumulative["+Inf" if bound == float("inf") else repr(bound)] = running
+                yield {"metric": name, "type": "histogram", "labels": dict(labels),
+                       "count": count, "sum": total, "buckets": cumulative}
+
+    def write_jsonl(self, path, **context):
+        """Append this run's samples to a JSON-lines file (one file can collect many runs)"""
+        import json
+        stamp = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for sample in self.samples():
+                f.write(json.dumps(dict(sample, time=stamp, **context), separators=(",", ":")) + "\n")
+
+    def write_prometheus(self, path):
+        """Write the Prometheus text format, replacing the file in one step (for textfile collectors)"""
+        lines, described = [], set()
+        for sample in self.samples():
+            name = sample["metric"]
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {sample['type']}")
+            labels = sample["labels"]
+            if sample["type"] == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {sample['value']}")
+                continue
+            for bound, running in sample["buckets"].items():
+                lines.append(f"{name}_bucket{_format_labels(dict(labels, le=bound))} {running}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {sample['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+
+        temp_path = f"{path}.junctwin-tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def write(self, path, **context):
+        """Export by file extension: .prom for Prometheus, anything else JSON lines"""
+        if str(path).endswith(".prom"):
+            self.write_prometheus(path)
+        else:
+            self.write_jsonl(path, **context)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+# Shared no-op instance for engines created without metrics
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,81 @@
+"""
+Mirror a folder tree as links for junctwin
+Recreates the folder structure at a second location with real folders, and
+links every file back to the original ('cp -al' semantics), using the same
+[link]/[symlink] naming as the Send To GUI.
+"""
+
+import os
+import posixpath
+from pathlib import Path
+
+from junctwin_backends import entry_is_link
+from junctwin_engine import LinkPlan, LinkResult, link_name_for, file_link_kind, FAILED
+from junctwin_walk import NEVER, _matches, is_plain_dir, walk
+
+
+# Status for source entries that are not mirrored (links inside the source tree)
+SKIPPED = "skipped"
+
+
+def iter_files(root, include=(), exclude=(), follow=NEVER):
+    """Yield (rel_dir, DirEntry) for every file under root, depth-first
+
+    Folders are yielded as (rel_path, None) as they are entered. The walk
+    is junctwin_walk's, so memory stays bounded by the tree depth and
+    excluded folders are not entered. With the default NEVER policy,
+    links and junctions found in the source are yielded like files but
+    never followed; with ONCE or ALWAYS they are entered like folders
+    (never in a loop).
+    """
+    for rel_dir, entry, entered in walk(root, follow, exclude):
+        if entered:
+            yield (posixpath.join(rel_dir, entry.name) if rel_dir else entry.name), None
+        elif is_plain_dir(entry):
+            # Unreadable, or already walked through another link
+            continue
+        elif not include or _matches(posixpath.join(rel_dir, entry.name), entry.name, include):
+            yield rel_dir, entry
+
+
+def mirror_plan(source, dest_dir, dest_root):
+    """Plan for the link that stands in for one source file in the mirror"""
+    # Per folder, since a volume may be mounted anywhere inside the source tree
+    # (answered from the volume cache, not by probing the disk again)
+    kind = file_link_kind(os.path.dirname(str(source)), dest_root)
+    source = Path(source)
+    return LinkPlan(kind, dest_dir / link_name_for(source, kind), source, f"in {dest_dir.name}")
+
+
+def mirror_tree(source_root, dest_root, engine, include=(), exclude=()):
+    """Mirror source_root under dest_root, yielding one LinkResult per file
+
+    Safe to re-run after an interruption: files that were already linked
+    report 'exists' and are left alone, so a second run picks up where the
+    first one stopped.
+    """
+    source_root = Path(source_root).resolve()
+    dest_root = Path(dest_root).resolve()
+    if not source_root.is_dir():
+        raise NotADirectoryError(f"Not a folder: {source_root}")
+    if dest_root == source_root or source_root in dest_root.parents:
+        raise ValueError("The mirror cannot be placed inside the source folder")
+
+    dest_root.mkdir(parents=True, exist_ok=True)
+
+    for rel_dir, entry in iter_files(source_root, include, exclude):
+        dest_dir = dest_root.joinpath(*rel_dir.split("/")) if rel_dir else dest_root
+
+        if entry is None:
+            # A folder: create it as we enter it, so the mirror grows incrementally
+            try:
+                dest_dir.mkdir(exist_ok=True)
+            except OSError as e:
+                yield LinkResult(LinkPlan(None, dest_dir, source_root / rel_dir, ""), FAILED, e)
+            continue
+
+        plan = mirror_plan(entry.path, dest_dir, dest_root)
+        if entry_is_link(entry):
+            yield LinkResult(plan, SKIPPED, None)
+        else:
+            yield engine.apply(plan)
@@ -0,0 +1,126 @@
+"""
+Desired-state planning for junctwin
+Compares the links a manifest asks for with what is on disk and reports which
+need creating, replacing or removing, so applying a manifest again only
+touches what changed.
+"""
+
+import os
+from collections import namedtuple
+
+from junctwin_backends import HARDLINK, CLONE, COPY, entry_link_kind
+from junctwin_engine import LinkPlan, LinkResult, SUFFIXES, FAILED, apply_parallel, existing_fallback
+from junctwin_journal import describe_link
+
+
+# Plan actions
+CREATE = "create"
+REPLACE = "replace"
+UNCHANGED = "unchanged"
+REMOVE = "remove"
+
+ACTIONS = (CREATE, REPLACE, REMOVE, UNCHANGED)
+DIFF_MARKS = {CREATE: "+", REPLACE: "~", UNCHANGED: "=", REMOVE: "-"}
+
+# One line of the plan: what to do, the wanted link (or the link to remove) and what is there now
+Change = namedtuple("Change", "action plan actual")
+
+
+def _same_target(a, b, base):
+    a = os.path.normpath(os.path.join(base, str(a)))
+    b = os.path.normpath(os.path.join(base, str(b)))
+    return os.path.normcase(a) == os.path.normcase(b)
+
+
+def is_up_to_date(plan, actual):
+    """Check if the link on disk already is the link the plan describes"""
+    if plan.kind in (CLONE, COPY):
+        # Plain files: current while size and modification time still match the target's
+        if actual is None or actual.kind is not None:
+            return False
+        try:
+            st, target_st = os.stat(plan.link_path), os.stat(plan.target)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (target_st.st_size, target_st.st_mtime_ns)
+    if actual is None or actual.kind != plan.kind:
+        return False
+    if plan.kind == HARDLINK:
+        try:
+            st = os.stat(plan.target)
+        except OSError:
+            return False
+        return (st.st_dev, st.st_ino) == (actual.dev, actual.ino)
+    return _same_target(actual.target, plan.target, os.path.dirname(str(plan.link_path)))
+
+
+def _junctwin_links(folder):
+    """Links in folder carrying a junctwin name suffix"""
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if any(suffix in entry.name for suffix in SUFFIXES.values()):
+                    try:
+                        kind = entry_link_kind(entry)
+                    except OSError:
+                        continue
+                    if kind is not None:
+                        yield entry.path, kind
+    except OSError:
+        return
+
+
+def diff_plans(items, prune=False):
+    """Compare planned links with the disk, yielding a Change per link
+
+    items are LinkPlans, or FAILED LinkResults from planning, which are
+    passed through unchanged. With prune=True, junctwin-named links in the
+    folders the manifest manages that the manifest no longer mentions are
+    reported for removal.
+    """
+    wanted = set()
+    folders = set()
+    for item in items:
+        if isinstance(item, LinkResult):
+            yield item
+            continue
+        plan = item
+        wanted.add(os.path.normcase(str(plan.link_path)))
+        folders.add(str(plan.link_path.parent))
+        try:
+            actual = describe_link(plan.link_path)
+            fallback = None if actual is not None else existing_fallback(plan)
+            if fallback is not None:
+                # An earlier apply fell back to a later file link kind: compare with that
+                plan, actual = fallback, describe_link(fallback.link_path)
+                wanted.add(os.path.normcase(str(plan.link_path)))
+        except OSError as e:
+            yield LinkResult(plan, FAILED, e)
+            continue
+        if actual is None:
+            yield Change(CREATE, plan, None)
+        elif is_up_to_date(plan, actual):
+            yield Change(UNCHANGED, plan, actual)
+        else:
+            yield Change(REPLACE, plan, actual)
+
+    if prune:
+        for folder in sorted(folders):
+            for path, kind in _junctwin_links(folder):
+                if os.path.normcase(path) not in wanted:
+                    actual = describe_link(path)
+                    yield Change(REMOVE, LinkPlan(kind, path, actual.target if actual else None,
+                                                  f"in {os.path.basename(folder)}"), actual)
+
+
+def apply_changes(changes, transaction, jobs=1):
+    """Carry out the create/replace/remove changes, yielding a LinkResult for each"""
+    removals = [c for c in changes if c.action == REMOVE]
+    plans = [c.plan for c in changes if c.action in (CREATE, REPLACE)]
+
+    for change in removals:
+        yield transaction.remove(change.plan.link_path)
+    if jobs > 1:
+        yield from apply_parallel(transaction, plans, replace=True, jobs=jobs)
+    else:
+        yield from transaction.apply_all(plans, replace=True)
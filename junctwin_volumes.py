@@ -0,0 +1,146 @@
+"""
+Volume topology for junctwin
+Maps folders to the volume they live on (serial number or device, file system
+type, hard link and symbolic link support), so the link type can be chosen by
+real volume rather than by drive letter. Each volume is probed once per
+process and each folder looked up once.
+"""
+
+import os
+from collections import namedtuple
+
+
+# A mounted volume: where it is mounted, its identity and what links it can hold
+Volume = namedtuple("Volume", "root serial fs_type hardlinks symlinks remote")
+
+# File systems (as named in /proc/self/mountinfo) that cannot hold some link types
+NO_HARDLINKS = {"vfat", "msdos", "exfat", "iso9660", "udf"}
+NO_SYMLINKS = {"vfat", "msdos", "exfat"}
+REMOTE = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "fuse.sshfs"}
+
+# Win32 volume flags and drive types
+FILE_SUPPORTS_REPARSE_POINTS = 0x00000080
+FILE_SUPPORTS_HARD_LINKS = 0x00400000
+DRIVE_REMOTE = 4
+
+
+def _unescape_mount(path):
+    # mountinfo writes space, tab, newline and backslash as octal escapes
+    for code, char in (("\\040", " "), ("\\011", "\t"), ("\\012", "\n"), ("\\134", "\\")):
+        path = path.replace(code, char)
+    return path
+
+
+def read_mountinfo(path="/proc/self/mountinfo"):
+    """{mount point: (device, fs type)} from the kernel's mount table, or None"""
+    mounts = {}
+    try:
+        with open(path, encoding="utf-8", errors="surrogateescape") as f:
+            for line in f:
+                fields = line.split()
+                separator = fields.index("-")
+                major, minor = fields[2].split(":")
+                # Later lines mount over earlier ones at the same point
+                mounts[_unescape_mount(fields[4])] = (os.makedev(int(major), int(minor)),
+                                                      fields[separator + 1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return mounts
+
+
+class VolumeTopology:
+    """Per-process cache of folder -> Volume
+
+    On Windows the volume root comes from GetVolumePathNameW (which sees
+    mounted folders) and its serial number and capabilities from
+    GetVolumeInformationW, so a subst drive and the drive it maps to
+    count as one volume and two shares on one server do not. Elsewhere
+    the kernel mount table is read once and folders are matched to their
+    mount point without touching the disk.
+    """
+
+    def __init__(self):
+        self._folders = {}
+        self._roots = {}
+        self._mounts = None
+        self._kernel32 = None
+
+    def volume_of(self, folder):
+        """Volume holding folder (which need not exist yet)"""
+        key = os.path.normcase(os.path.abspath(str(folder)))
+        volume = self._folders.get(key)
+        if volume is None:
+            volume = self._folders[key] = self._probe_windows(key) if os.name == "nt" else self._probe_posix(key)
+        return volume
+
+    def same_volume(self, folder_a, folder_b):
+        return self.volume_of(folder_a).serial == self.volume_of(folder_b).serial
+
+    def _probe_posix(self, folder):
+        if self._mounts is None:
+            self._mounts = read_mountinfo() or {}
+        path = os.path.realpath(folder)
+        while path not in self._mounts and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        if path not in self._mounts:
+            # No mount table (not Linux): identify the volume by device number
+            return self._stat_volume(folder)
+        if path not in self._roots:
+            dev, fs_type = self._mounts[path]
+            self._roots[path] = Volume(path, dev, fs_type, fs_type not in NO_HARDLINKS,
+                                       fs_type not in NO_SYMLINKS, fs_type in REMOTE)
+        return self._roots[path]
+
+    def _stat_volume(self, folder):
+        # Nearest existing folder, since links are often planned into folders not made yet
+        path = folder
+        while True:
+            try:
+                dev = os.stat(path).st_dev
+                break
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    dev = None
+                    break
+                path = parent
+        return Volume(path, dev, None, True, True, False)
+
+    def _probe_windows(self, folder):
+        import ctypes
+        from ctypes import wintypes
+        if self._kernel32 is None:
+            self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32 = self._kernel32
+
+        buffer = ctypes.create_unicode_buffer(1024)
+        if not kernel32.GetVolumePathNameW(folder, buffer, len(buffer)):
+            # Unreachable path: fall back to the drive or share as written
+            root = os.path.splitdrive(folder)[0] + "\\"
+            return Volume(root, root.upper(), None, True, True, root.startswith("\\\\"))
+        root = buffer.value
+        if root in self._roots:
+            return self._roots[root]
+
+        serial = wintypes.DWORD()
+        flags = wintypes.DWORD()
+        fs_name = ctypes.create_unicode_buffer(64)
+        if kernel32.GetVolumeInformationW(root, None, 0, ctypes.byref(serial), None,
+                                          ctypes.byref(flags), fs_name, len(fs_name)):
+            fs_type = fs_name.value
+            volume = Volume(root, serial.value, fs_type,
+                            bool(flags.value & FILE_SUPPORTS_HARD_LINKS) or fs_type == "NTFS",
+                            bool(flags.value & FILE_SUPPORTS_REPARSE_POINTS),
+                            root.startswith("\\\\") or kernel32.GetDriveTypeW(root) == DRIVE_REMOTE)
+        else:
+            volume = Volume(root, root.upper(), None, True, True, root.startswith("\\\\"))
+        self._roots[root] = volume
+        return volume
+
+
+# Shared by the GUI, batch planning and mirroring within one process
+topology = VolumeTopology()
+
+
+def volume_of(folder):
+    return topology.volume_of(folder)
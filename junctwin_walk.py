@@ -0,0 +1,226 @@
+"""
+Cycle-safe folder walker for junctwin
+One depth-first walk over os.scandir shared by mirror, dedupe, export and du,
+with a choice of whether junctions and folder symlinks are followed. Folders
+already entered are remembered by (device, inode) in a compact set, so a
+junction pointing back at one of its own ancestors cannot loop the walk.
+"""
+
+import os
+import queue
+import posixpath
+import threading
+from fnmatch import fnmatch
+
+from junctwin_backends import entry_is_link
+from junctwin_inodes import InodeSet
+
+
+# Link-following policies
+NEVER = "never"      # list junctions and folder symlinks, never enter them
+ONCE = "once"        # enter each physical folder once, by whatever path is met first
+ALWAYS = "always"    # enter every link, except into a folder already on the current path
+FOLLOW_POLICIES = (NEVER, ONCE, ALWAYS)
+
+
+def _matches(rel_path, name, patterns):
+    return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
+
+
+def is_plain_dir(entry):
+    """A real folder (not a junction or folder symlink), from the DirEntry's cached type"""
+    return entry.is_dir(follow_symlinks=False) and not entry_is_link(entry)
+
+
+class Walker:
+    """Follow policy and visited folders for one walk (or several sharing them)
+
+    With NEVER nothing is stat'ed beyond what os.scandir already returns.
+    The other policies need one stat per folder (never per file) for its
+    (device, inode). ONCE keeps every folder entered in an InodeSet;
+    ALWAYS only compares against the folders on the current path, so
+    the same data reached through two links is walked twice but a link
+    to an ancestor is not. enter() may be called from several threads.
+
+    prune, if given, is asked about every folder the walk would enter
+    (with its DirEntry) and returning True leaves that folder unlisted,
+    e.g. because its contents are already known.
+    """
+
+    def __init__(self, follow=NEVER, exclude=(), prune=None):
+        if follow not in FOLLOW_POLICIES:
+            raise ValueError(f"Unknown follow policy: {follow} (choose from {', '.join(FOLLOW_POLICIES)})")
+        self.follow = follow
+        self.exclude = exclude
+        self.prune = prune
+        self.visited = InodeSet()
+        self.lock = threading.Lock()
+
+    def folder_key(self, path):
+        """(device, inode) of the folder at path, following links; None where not needed"""
+        if self.follow == NEVER:
+            return None
+        st = os.stat(path)
+        return st.st_dev, st.st_ino
+
+    def start(self, root):
+        """Record the folder a walk starts from as visited; returns its key"""
+        key = self.folder_key(root)
+        if key is not None:
+            with self.lock:
+                self.visited.add(*key)
+        return key
+
+    def enter(self, entry, ancestors=()):
+        """Decide whether to list entry's contents: returns (enter, key)
+
+        ancestors holds the keys of the folders on the current path (only
+        consulted with ALWAYS). Entering records the folder as visited.
+        """
+        if is_plain_dir(entry):
+            if self.follow == NEVER:
+                return not (self.prune and self.prune(entry)), None
+        elif self.follow == NEVER or not entry_is_link(entry) or not entry.is_dir():
+            # Files, and links when not following (or links to files)
+            return False, None
+        if self.prune and self.prune(entry):
+            return False, None
+        try:
+            key = self.folder_key(entry.path)
+        except OSError:
+            return False, None
+        if key in ancestors:
+            return False, key
+        if self.follow == ONCE:
+            with self.lock:
+                if not self.visited.add(*key):
+                    return False, key
+        return True, key
+
+    def walk(self, root):
+        """Yield (rel_dir, entry, entered) for everything under root, depth first
+
+        rel_dir is the entry's folder relative to root ('' at the top,
+        '/'-separated, through the link's name when a link was followed).
+        entered is True for folders whose contents follow next. Only one
+        open os.scandir iterator per level is kept, so memory is bounded
+        by the depth of the tree, not its size. Excluded entries (glob on
+        name or relative path) are skipped entirely; unreadable and pruned
+        folders are yielded with entered False.
+        """
+        root = os.fspath(root)
+        root_key = self.start(root)
+        ancestors = {root_key} if self.follow == ALWAYS else ()
+        stack = [("", os.scandir(root), root_key)]
+        try:
+            while stack:
+                rel_dir, iterator, _ = stack[-1]
+                entry = next(iterator, None)
+                if entry is None:
+                    iterator.close()
+                    _, _, key = stack.pop()
+                    if self.follow == ALWAYS:
+                        ancestors.discard(key)
+                    continue
+
+                rel_path = posixpath.join(rel_dir, entry.name) if rel_dir else entry.name
+                if self.exclude and _matches(rel_path, entry.name, self.exclude):
+                    continue
+
+                entered, key = self.enter(entry, ancestors)
+                if entered:
+                    try:
+                        stack.append((rel_path, os.scandir(entry.path), key))
+                        if self.follow == ALWAYS:
+                            ancestors.add(key)
+                    except OSError:
+                        entered = False
+                yield rel_dir, entry, entered
+        finally:
+            for _, iterator, _ in stack:
+                iterator.close()
+
+    def walk_parallel(self, root, visit, jobs=8):
+        """Read folders on jobs threads, yielding the non-None visit(entry) results
+
+        Each folder is listed by one worker, which calls visit for every
+        entry (so per-entry work such as stat or readlink runs in parallel
+        too) and hands the folder's results over in one list. Results come
+        in no particular order. At most a few folders' worth of results
+        wait to be consumed at any time, so memory stays bounded. Closing
+        the generator early stops the workers after their current folder.
+        """
+        root = os.fspath(root)
+        root_key = self.start(root)
+        work = queue.Queue()
+        results = queue.Queue(maxsize=jobs * 4)
+        done = object()
+        stop = threading.Event()
+
+        def list_folder(path, rel_dir, ancestors):
+            found = []
+            if stop.is_set():
+                return found
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if stop.is_set():
+                            break
+                        rel_path = posixpath.join(rel_dir, entry.name) if rel_dir else entry.name
+                        if self.exclude and _matches(rel_path, entry.name, self.exclude):
+                            continue
+                        entered, key = self.enter(entry, ancestors)
+                        if entered:
+                            work.put((entry.path, rel_path, ancestors + (key,) if self.follow == ALWAYS else ()))
+                        try:
+                            item = visit(entry)
+                        except OSError:
+                            continue
+                        if item is not None:
+                            found.append(item)
+            except OSError:
+                pass
+            return found
+
+        def worker():
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                try:
+                    found = list_folder(*item)
+                    if found:
+                        results.put(found)
+                finally:
+                    work.task_done()
+
+        def finish():
+            work.join()
+            for _ in threads:
+                work.put(None)
+            results.put(done)
+
+        work.put((root, "", (root_key,) if self.follow == ALWAYS else ()))
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, jobs))]
+        for thread in threads:
+            thread.start()
+        threading.Thread(target=finish, daemon=True).start()
+        finished = False
+        try:
+            while True:
+                found = results.get()
+                if found is done:
+                    finished = True
+                    return
+                yield from found
+        finally:
+            if not finished:
+                # Stopped early: let workers blocked on a full queue through until all have quit
+                stop.set()
+                while results.get() is not done:
+                    pass
+
+
+def walk(root, follow=NEVER, exclude=()):
+    """Walk root with a fresh Walker; see Walker.walk"""
+    return Walker(follow, exclude).walk(root)
@@ -0,0 +1,331 @@
+"""
+Watch mode for junctwin
+Keeps a mirrored tree (see junctwin_mirror) in step with its source: file
+system change notifications (ReadDirectoryChangesW on Windows, inotify on
+Linux) report what changed, bursts are collected into one batch, and only the
+changed paths are linked or unlinked. Nothing is rescanned while the tree is
+idle.
+"""
+
+import os
+import stat
+import time
+import queue
+import struct
+import threading
+import posixpath
+from pathlib import Path
+
+from junctwin_backends import SYMLINK, JUNCTION, LinkError, path_link_kind
+from junctwin_engine import LinkPlan, LinkResult, SUFFIXES, FILE_KINDS, FAILED, link_name_for
+from junctwin_journal import REMOVED, describe_link
+from junctwin_mirror import _matches, mirror_plan, mirror_tree
+from junctwin_plan import is_up_to_date
+
+
+# Queued instead of a path when the notification buffer overflowed and changes were lost
+OVERFLOW = None
+
+
+class InotifyWatcher:
+    """Reports changed paths under root through Linux inotify (one watch per folder)"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_EXCL_UNLINK = 0x04000000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+            | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+    HEADER = struct.Struct("iIII")
+
+    def __init__(self, root, changes):
+        import ctypes
+        import ctypes.util
+        self.root = str(root)
+        self.changes = changes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._ctypes = ctypes
+        self._fd = self._libc.inotify_init1(self.IN_CLOEXEC)
+        if self._fd < 0:
+            self._raise("inotify_init1")
+        self._dirs = {}
+
+    def _raise(self, what, path=None):
+        code = self._ctypes.get_errno()
+        hint = " (raise fs.inotify.max_user_watches)" if code == 28 else ""
+        raise LinkError(f"{what} failed: {os.strerror(code)}{hint}", code, path)
+
+    def _add_tree(self, rel_dir):
+        """Watch rel_dir and every real folder below it (links are not followed)"""
+        top = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        for folder, subdirs, _ in os.walk(top):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self.MASK)
+            if wd < 0:
+                if self._ctypes.get_errno() == 2:
+                    continue  # gone again already
+                self._raise("inotify_add_watch", folder)
+            rel = os.path.relpath(folder, self.root).replace(os.sep, "/")
+            self._dirs[wd] = "" if rel == "." else rel
+
+    def _forget_tree(self, rel_dir):
+        prefix = rel_dir + "/"
+        for wd, rel in list(self._dirs.items()):
+            if rel == rel_dir or rel.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def start(self):
+        self._add_tree("")
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                # Blocks without using CPU until something changes
+                data = os.read(self._fd, 64 * 1024)
+            except OSError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.HEADER.unpack_from(data, offset)
+                name = data[offset + self.HEADER.size:offset + self.HEADER.size + length].rstrip(b"\0")
+                offset += self.HEADER.size + length
+                self._event(wd, mask, os.fsdecode(name))
+
+    def _event(self, wd, mask, name):
+        if mask & self.IN_Q_OVERFLOW:
+            self.changes.put(OVERFLOW)
+            return
+        if mask & self.IN_IGNORED:
+            self._dirs.pop(wd, None)
+            return
+        rel_dir = self._dirs.get(wd)
+        if rel_dir is None or not name:
+            return
+        rel = posixpath.join(rel_dir, name) if rel_dir else name
+        if mask & self.IN_ISDIR:
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                self._add_tree(rel)
+            elif mask & self.IN_MOVED_FROM:
+                self._forget_tree(rel)
+        self.changes.put(rel)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class WindowsWatcher:
+    """Reports changed paths under root through ReadDirectoryChangesW (whole subtree, one handle)"""
+
+    FILE_LIST_DIRECTORY = 0x0001
+    FILE_SHARE_ALL = 0x00000007
+    OPEN_EXISTING = 3
+    FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+    FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+    FILE_NOTIFY_CHANGE_DIR_NAME = 0x00000002
+    FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, root, changes):
+        import ctypes
+        from ctypes import wintypes
+        self.root = str(root)
+        self.changes = changes
+        self._ctypes = ctypes
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._kernel32.CreateFileW.restype = wintypes.HANDLE
+        self._handle = self._kernel32.CreateFileW(
+            self.root, self.FILE_LIST_DIRECTORY, self.FILE_SHARE_ALL, None,
+            self.OPEN_EXISTING, self.FILE_FLAG_BACKUP_SEMANTICS, None)
+        if self._handle in (None, wintypes.HANDLE(-1).value):
+            winerror = ctypes.get_last_error()
+            raise LinkError(ctypes.FormatError(winerror).strip(), None, self.root, winerror)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        ctypes = self._ctypes
+        from ctypes import wintypes
+        buffer = ctypes.create_string_buffer(self.BUFFER_SIZE)
+        returned = wintypes.DWORD()
+        flags = (self.FILE_NOTIFY_CHANGE_FILE_NAME | self.FILE_NOTIFY_CHANGE_DIR_NAME
+                 | self.FILE_NOTIFY_CHANGE_LAST_WRITE)
+        while True:
+            # Blocks without using CPU until something changes
+            if not self._kernel32.ReadDirectoryChangesW(self._handle, buffer, len(buffer), True, flags,
+                                                        ctypes.byref(returned), None, None):
+                return
+            if returned.value == 0:
+                # More changes than fit in the buffer
+                self.changes.put(OVERFLOW)
+                continue
+            data, offset = buffer.raw[:returned.value], 0
+            while True:
+                # FILE_NOTIFY_INFORMATION: next offset, action, name length in bytes, name
+                next_offset, _, length = struct.unpack_from("<III", data, offset)
+                name = data[offset + 12:offset + 12 + length].decode("utf-16-le")
+                self.changes.put(name.replace("\\", "/"))
+                if not next_offset:
+                    break
+                offset += next_offset
+
+    def close(self):
+        self._kernel32.CloseHandle(self._handle)
+
+
+def make_watcher(root, changes):
+    if os.name == "nt":
+        return WindowsWatcher(root, changes)
+    if hasattr(os, "uname") and os.uname().sysname == "Linux":
+        return InotifyWatcher(root, changes)
+    raise LinkError("Watching folders is only supported on Windows and Linux")
+
+
+class TreeWatch:
+    """Keeps dest_root a linked mirror of source_root as files come and go"""
+
+    def __init__(self, source_root, dest_root, engine, include=(), exclude=(), debounce=0.5):
+        self.source_root = Path(source_root).resolve()
+        self.dest_root = Path(dest_root).resolve()
+        self.engine = engine
+        self.include = include
+        self.exclude = exclude
+        self.debounce = debounce
+        # Under constant churn a batch is still closed after this long
+        self.max_wait = max(5.0, debounce * 10)
+        self.changes = queue.Queue()
+        self.watcher = None
+
+    def start(self):
+        """Subscribe to changes, then bring the mirror up to date once, yielding its results
+
+        The watch starts first, so nothing that changes during the initial
+        pass is missed (it is simply checked again in the first batch).
+        """
+        if self.dest_root == self.source_root or self.source_root in self.dest_root.parents:
+            raise ValueError("The mirror cannot be placed inside the source folder")
+        self.watcher = make_watcher(self.source_root, self.changes)
+        self.watcher.start()
+        yield from mirror_tree(self.source_root, self.dest_root, self.engine, self.include, self.exclude)
+
+    def _next_batch(self):
+        """Wait (idle) for a change, then collect until debounce seconds pass without more"""
+        batch = {self.changes.get()}
+        deadline = time.monotonic() + self.max_wait
+        while time.monotonic() < deadline:
+            try:
+                batch.add(self.changes.get(timeout=self.debounce))
+            except queue.Empty:
+                break
+        return batch
+
+    def batches(self):
+        """Yield the results of each batch of changes, forever"""
+        while True:
+            batch = self._next_batch()
+            if OVERFLOW in batch:
+                # Changes were lost: fall back to one full pass
+                yield list(mirror_tree(self.source_root, self.dest_root, self.engine,
+                                       self.include, self.exclude))
+            else:
+                yield list(self.sync(batch))
+
+    def sync(self, rel_paths):
+        """Bring the mirror of the given source paths up to date"""
+        # A folder handled as a whole covers everything inside it
+        rel_paths = set(rel_paths)
+        top_level = [rel for rel in sorted(rel_paths)
+                     if not any(parent in rel_paths for parent in _parents(rel))]
+
+        plans = []
+        for rel in top_level:
+            name = posixpath.basename(rel)
+            if self.exclude and _matches(rel, name, self.exclude):
+                continue
+            source = self.source_root.joinpath(*rel.split("/"))
+            dest_dir = self.dest_root.joinpath(*rel.split("/")[:-1])
+            try:
+                st = os.stat(source, follow_symlinks=False)
+            except FileNotFoundError:
+                yield from self._remove(source, dest_dir / name, dest_dir)
+                continue
+            except OSError as e:
+                yield LinkResult(LinkPlan(None, dest_dir / name, source, ""), FAILED, e)
+                continue
+
+            kind = path_link_kind(source, st)
+            if kind in (SYMLINK, JUNCTION):
+                # Links inside the source are not mirrored (as in 'mirror')
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                yield from mirror_tree(source, dest_dir / name, self.engine, self.include, self.exclude)
+            elif stat.S_ISREG(st.st_mode):
+                if self.include and not _matches(rel, name, self.include):
+                    continue
+                plan = mirror_plan(source, dest_dir, self.dest_root)
+                if not is_up_to_date(plan, describe_link(plan.link_path)):
+                    try:
+                        dest_dir.mkdir(parents=True, exist_ok=True)
+                    except OSError as e:
+                        yield LinkResult(plan, FAILED, e)
+                        continue
+                    plans.append(plan)
+
+        # One engine call for everything this batch creates or re-links
+        yield from self.engine.apply_all(plans, replace=True)
+
+    def _remove(self, source, dest_path, dest_dir):
+        """Take away the mirror of a source file or folder that is gone"""
+        try:
+            st = os.stat(dest_path, follow_symlinks=False)
+        except OSError:
+            st = None
+        if st is not None and stat.S_ISDIR(st.st_mode) and path_link_kind(dest_path, st) is None:
+            yield from self._remove_tree(dest_path)
+            return
+        # Every kind a file may have been mirrored as, whatever the order is now
+        for kind in FILE_KINDS:
+            link_path = dest_dir / link_name_for(source, kind)
+            if os.path.lexists(link_path):
+                yield self._remove_link(LinkPlan(kind, link_path, source, f"in {dest_dir.name}"))
+
+    def _remove_tree(self, dest_folder):
+        """Remove the links junctwin made in a mirrored folder, then the folders left empty"""
+        suffixes = tuple(SUFFIXES.values())
+        for folder, _, files in os.walk(dest_folder, topdown=False):
+            for name in files:
+                if any(suffix in name for suffix in suffixes):
+                    yield self._remove_link(LinkPlan(None, Path(folder, name), None, f"in {os.path.basename(folder)}"))
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass  # holds files that are not ours
+
+    def _remove_link(self, plan):
+        try:
+            self.engine.remove(plan.link_path)
+        except OSError as e:
+            return LinkResult(plan, FAILED, e)
+        return LinkResult(plan, REMOVED, None)
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+
+
+def _parents(rel):
+    while "/" in rel:
+        rel = rel.rsplit("/", 1)[0]
+        yield rel
@@ -0,0 +1,159 @@
+"""
+Elevated worker for junctwin
+Link operations that need administrator rights are queued by the unprivileged
+dialog and handed to one elevated junctwin process over a local connection,
+so a whole batch costs one UAC prompt and the dialog keeps its state.
+"""
+
+import os
+import sys
+import json
+import threading
+from pathlib import Path
+
+from junctwin_backends import LinkError, get_backend
+from junctwin_engine import LinkEngine, LinkPlan, LinkResult
+
+SCRIPT = Path(__file__).resolve().parent / "junctwin.py"
+
+# How long to wait for the worker to connect (it may be waiting on a UAC prompt)
+CONNECT_TIMEOUT = 120
+
+
+def launch_elevated(args):
+    """Start 'junctwin.py args' with administrator rights (Windows: one UAC prompt)"""
+    import ctypes
+    SW_HIDE = 0
+    params = " ".join(f'"{arg}"' for arg in [str(SCRIPT)] + args)
+    # ShellExecuteW returns a value above 32 on success; the user declining is a failure
+    if ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, params, None, SW_HIDE) <= 32:
+        raise LinkError("Administrator rights were not granted")
+
+
+def launch_subprocess(args):
+    """Stand-in for launch_elevated where there is no UAC: an ordinary child process"""
+    import subprocess
+    subprocess.Popen([sys.executable, str(SCRIPT)] + args)
+
+
+def _plan_to_json(plan):
+    return [plan.kind, str(plan.link_path), str(plan.target), plan.location_desc]
+
+
+def _result_to_json(result):
+    # The kind and path carried out, which differ from the plan's after a file link fallback
+    done = [result.plan.kind, str(result.plan.link_path)]
+    error = result.error
+    if error is None:
+        return [result.status, None, None, None] + done
+    return [result.status, str(error), getattr(error, "errno", None), getattr(error, "winerror", None)] + done
+
+
+class ElevatedWorker:
+    """Front-end handle on one elevated worker process
+
+    start() launches the worker (prompting for elevation once) and waits
+    for it to connect back; run_batch() then hands it whole batches. Only
+    plain JSON crosses the connection, and it is authenticated with a
+    random key, so the elevated side never runs anything it is sent.
+    """
+
+    def __init__(self, launcher=None):
+        self.launcher = launcher or (launch_elevated if os.name == "nt" else launch_subprocess)
+        self.listener = None
+        self.conn = None
+
+    def start(self, timeout=CONNECT_TIMEOUT):
+        from multiprocessing.connection import Listener
+        from junctwin_engine import file_kinds
+        authkey = os.urandom(32)
+        self.listener = Listener(authkey=authkey)
+        # The worker tries file link kinds in the same order as this process
+        self.launcher(["--file-links", ",".join(file_kinds), "worker",
+                       "--connect", str(self.listener.address), "--authkey", authkey.hex()])
+
+        accepted = {}
+
+        def accept():
+            try:
+                accepted["conn"] = self.listener.accept()
+            except Exception as e:
+                accepted["error"] = e
+
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if "conn" not in accepted:
+            self.close()
+            raise LinkError("The elevated junctwin worker did not start")
+        self.conn = accepted["conn"]
+        return self
+
+    def run_batch(self, plans, replace=False, description="", all_or_nothing=True):
+        """Create the links in the worker, as one journaled transaction; returns LinkResults"""
+        plans = list(plans)
+        request = {"op": "batch", "plans": [_plan_to_json(p) for p in plans], "replace": replace,
+                   "description": description, "all_or_nothing": all_or_nothing}
+        try:
+            self.conn.send_bytes(json.dumps(request).encode("utf-8"))
+            reply = json.loads(self.conn.recv_bytes().decode("utf-8"))
+        except (OSError, EOFError) as e:
+            raise LinkError(f"Lost the elevated junctwin worker: {e}")
+        results = []
+        for plan, (status, message, code, winerror, kind, link_path) in zip(plans, reply["results"]):
+            error = LinkError(message, code, str(plan.link_path), winerror) if message else None
+            if kind != plan.kind:
+                plan = plan._replace(kind=kind, link_path=Path(link_path))
+            results.append(LinkResult(plan, status, error))
+        return results
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.send_bytes(json.dumps({"op": "exit"}).encode("utf-8"))
+            except OSError:
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _run_batch(request, engine, journal_path=None):
+    from junctwin_journal import Journal, Transaction
+    plans = [LinkPlan(kind, Path(link_path), Path(target), desc)
+             for kind, link_path, target, desc in request["plans"]]
+    journal = Journal(journal_path)
+    try:
+        transaction = Transaction(engine, journal, request.get("description", ""),
+                                  all_or_nothing=request.get("all_or_nothing", True))
+        results = list(transaction.apply_all(plans, replace=request.get("replace", False)))
+        if transaction.failed and transaction.all_or_nothing:
+            transaction.rollback()
+        else:
+            transaction.commit()
+    finally:
+        journal.close()
+    return {"batch": transaction.batch_id, "results": [_result_to_json(r) for r in results]}
+
+
+def serve_worker(address, authkey, backend=None, journal_path=None):
+    """Worker side: connect back to the front end and run batches until told to exit"""
+    from multiprocessing.connection import Client
+    engine = LinkEngine(get_backend(backend))
+    with Client(address, authkey=authkey) as conn:
+        while True:
+            try:
+                request = json.loads(conn.recv_bytes().decode("utf-8"))
+            except EOFError:
+                break
+            if request.get("op") != "batch":
+                break
+            conn.send_bytes(json.dumps(_run_batch(request, engine, journal_path)).encode("utf-8"))
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# The junctwin modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import junctwin_engine
+from junctwin_backends import PosixBackend
+from junctwin_engine import LinkEngine
+
+
+@pytest.fixture(autouse=True)
+def default_file_kinds(monkeypatch):
+    """Every test starts from the default file link order, whatever JUNCTWIN_FILE_LINKS says"""
+    monkeypatch.setattr(junctwin_engine, "file_kinds", junctwin_engine.DEFAULT_FILE_KINDS)
+
+
+@pytest.fixture
+def engine():
+    return LinkEngine(PosixBackend())
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A file and a folder to link to, and an empty folder to link from"""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "data.txt").write_text("data")
+    (tmp_path / "src" / "folder").mkdir()
+    (tmp_path / "dst").mkdir()
+    return tmp_path
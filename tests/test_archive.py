@@ -0,0 +1,80 @@
+import io
+import os
+import tarfile
+
+from junctwin_archive import INSIDE_FIELD, export_tree, import_tree
+from junctwin_engine import CREATED, FAILED
+
+
+def _archive(path, members):
+    """Write a tar of (TarInfo, data or None) pairs"""
+    with tarfile.open(path, "w", format=tarfile.PAX_FORMAT) as tar:
+        for info, data in members:
+            if data is not None:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            else:
+                tar.addfile(info)
+    return path
+
+
+def _member(name, type_=tarfile.REGTYPE, linkname="", pax_headers=None):
+    info = tarfile.TarInfo(name)
+    info.type = type_
+    info.linkname = linkname
+    info.pax_headers = pax_headers or {}
+    return info
+
+
+def _statuses(results):
+    return {str(result.plan.link_path): result.status for result in results}
+
+
+def test_import_refuses_names_outside_dest(tmp_path, engine):
+    archive = _archive(tmp_path / "evil.tar", [
+        (_member("../escaped.txt"), b"x"),
+        (_member("/absolute.txt"), b"x"),
+        (_member("ok/../../escaped2.txt"), b"x"),
+        (_member("inside.txt"), b"fine"),
+    ])
+    dest = tmp_path / "dest"
+    results = list(import_tree(archive, dest, engine))
+
+    assert [r.status for r in results] == [FAILED, FAILED, FAILED, CREATED]
+    assert sorted(os.listdir(tmp_path)) == ["dest", "evil.tar"]
+    assert (dest / "inside.txt").read_text() == "fine"
+
+
+def test_import_refuses_links_leading_outside_dest(tmp_path, engine):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "secret.txt").write_text("secret")
+    archive = _archive(tmp_path / "evil.tar", [
+        (_member("hard.txt", tarfile.LNKTYPE, "../outside/secret.txt"), None),
+        (_member("junction", tarfile.SYMTYPE, "../../outside", {INSIDE_FIELD: "1"}), None),
+        # A link to a folder outside, then a file written through it
+        (_member("door", tarfile.SYMTYPE, str(outside)), None),
+        (_member("door/planted.txt"), b"x"),
+    ])
+    dest = tmp_path / "dest"
+    results = _statuses(import_tree(archive, dest, engine))
+
+    assert results[str(dest / "hard.txt")] == FAILED
+    assert results[str(dest / "junction")] == FAILED
+    assert os.listdir(outside) == ["secret.txt"]
+    assert not os.path.islink(dest / "door")
+
+
+def test_export_import_keeps_links(source, engine):
+    root = source / "src"
+    os.link(root / "data.txt", root / "folder" / "data[link].txt")
+    os.symlink("../data.txt", root / "folder" / "data[symlink].txt")
+    archive = source / "tree.tar"
+    list(export_tree(root, archive))
+
+    dest = source / "restored"
+    results = list(import_tree(archive, dest, engine))
+    assert not [r for r in results if r.status == FAILED]
+    assert os.path.samefile(dest / "data.txt", dest / "folder" / "data[link].txt")
+    # Links inside the tree point into the restored copy, not the original
+    assert os.path.realpath(dest / "folder" / "data[symlink].txt") == str(dest / "data.txt")
@@ -0,0 +1,165 @@
+import errno
+import os
+
+import pytest
+
+import junctwin_engine
+from junctwin_backends import JUNCTION, HARDLINK, SYMLINK, CLONE, COPY, LinkError, PosixBackend
+from junctwin_engine import (TO_SOURCE, TO_TARGET, CREATED, REPLACED, EXISTS, FAILED,
+                             LinkEngine, LinkSpecError, plan_link, run_batch)
+
+
+class RefusingBackend(PosixBackend):
+    """PosixBackend on a volume that does not support some link kinds"""
+
+    def __init__(self, *refused):
+        self.refused = set(refused)
+
+    def create(self, kind, link_path, target):
+        if kind in self.refused:
+            raise LinkError("Not supported here", errno.EXDEV, str(link_path))
+        return super().create(kind, link_path, target)
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def test_file_to_source_links_in_target_folder(source):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    assert plan.kind == HARDLINK
+    assert plan.link_path == source / "dst" / "data[link].txt"
+    assert plan.target == source / "src" / "data.txt"
+
+
+def test_folder_to_target_links_in_source_folder(source):
+    plan = plan_link(source / "src" / "folder", source / "dst", TO_TARGET)
+    assert plan.kind == JUNCTION
+    assert plan.link_path == source / "src" / "folder" / "dst[junct]"
+    assert plan.target == source / "dst"
+
+
+def test_file_to_target_links_beside_source(source):
+    (source / "dst" / "other.txt").write_text("other")
+    plan = plan_link(source / "src" / "data.txt", source / "dst" / "other.txt", TO_TARGET)
+    assert plan.link_path == source / "src" / "other[link].txt"
+    assert plan.target == source / "dst" / "other.txt"
+
+
+def test_plan_link_refuses_bad_specs(source):
+    with pytest.raises(LinkSpecError):
+        plan_link(source / "src", source / "src", TO_SOURCE)
+    with pytest.raises(LinkSpecError):
+        plan_link(source / "src" / "data.txt", source / "src" / "data.txt.x", TO_SOURCE)
+    with pytest.raises(LinkSpecError):
+        plan_link(source / "src", source / "dst", "sideways")
+
+
+# ---------------------------------------------------------------------------
+# Batches
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_run_batch_yields_results_in_spec_order(source, engine, jobs):
+    specs = []
+    for folder in range(5):
+        dst = source / f"dst{folder}"
+        dst.mkdir()
+        for number in range(10):
+            src = source / "src" / f"f{folder}-{number}.txt"
+            src.write_text(str(number))
+            specs.append((src, dst, TO_SOURCE))
+    specs.insert(17, (source / "missing.txt", source / "dst0", TO_SOURCE))
+
+    results = list(run_batch(specs, engine, jobs=jobs))
+
+    assert len(results) == len(specs)
+    assert results[17].status == FAILED
+    for spec, result in zip(specs[:17] + specs[18:], results[:17] + results[18:]):
+        assert result.status == CREATED
+        assert result.plan.target == spec[0]
+        assert os.path.samefile(result.plan.link_path, spec[0])
+
+
+def test_apply_without_replace_leaves_existing_link(source, engine):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    assert engine.apply(plan).status == CREATED
+    assert engine.apply(plan).status == EXISTS
+    assert engine.apply(plan, replace=True).status == REPLACED
+    assert os.path.samefile(plan.link_path, plan.target)
+
+
+# ---------------------------------------------------------------------------
+# File link fallback
+# ---------------------------------------------------------------------------
+
+def test_refused_hardlink_falls_back_to_symlink(source):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    result = LinkEngine(RefusingBackend(HARDLINK)).apply(plan)
+    assert result.status == CREATED
+    assert result.plan.kind == SYMLINK
+    assert result.plan.link_path == source / "dst" / "data[symlink].txt"
+    assert os.readlink(result.plan.link_path) == str(plan.target)
+    assert not os.path.lexists(plan.link_path)
+
+
+def test_fallback_goes_down_the_whole_order(source, monkeypatch):
+    monkeypatch.setattr(junctwin_engine, "file_kinds", (HARDLINK, CLONE, SYMLINK, COPY))
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    result = LinkEngine(RefusingBackend(HARDLINK, CLONE, SYMLINK)).apply(plan)
+    assert result.status == CREATED
+    assert result.plan.kind == COPY
+    assert result.plan.link_path == source / "dst" / "data[copy].txt"
+    assert result.plan.link_path.read_text() == "data"
+    assert not os.path.islink(result.plan.link_path)
+
+
+def test_every_kind_refused_reports_first_error(source):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    result = LinkEngine(RefusingBackend(HARDLINK, SYMLINK)).apply(plan)
+    assert result.status == FAILED
+    assert result.error.errno == errno.EXDEV
+    assert os.listdir(source / "dst") == []
+
+
+def test_folders_never_fall_back(source):
+    plan = plan_link(source / "src" / "folder", source / "dst", TO_SOURCE)
+    result = LinkEngine(RefusingBackend(JUNCTION)).apply(plan)
+    assert result.status == FAILED
+    assert os.listdir(source / "dst") == []
+
+
+def test_earlier_fallback_is_found_again(source):
+    engine = LinkEngine(RefusingBackend(HARDLINK))
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    engine.apply(plan)
+    result = engine.apply(plan)
+    assert result.status == EXISTS
+    assert result.plan.kind == SYMLINK
+    assert engine.apply(plan, replace=True).status == REPLACED
+    assert sorted(os.listdir(source / "dst")) == ["data[symlink].txt"]
+
+
+def test_replace_keeps_the_link_when_falling_back(source):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    os.link(plan.target, plan.link_path)
+    stale = source / "dst" / "data[symlink].txt"
+    os.symlink(source / "nowhere", stale)
+
+    result = LinkEngine(RefusingBackend(HARDLINK)).apply(plan, replace=True)
+
+    assert result.status == REPLACED
+    assert result.plan.link_path == stale
+    assert os.readlink(stale) == str(plan.target)
+    # The hard link the user already had is still there
+    assert os.path.samefile(plan.link_path, plan.target)
+    assert sorted(os.listdir(source / "dst")) == ["data[link].txt", "data[symlink].txt"]
+
+
+def test_failed_replace_restores_the_original(source):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    os.link(plan.target, plan.link_path)
+    result = LinkEngine(RefusingBackend(HARDLINK, SYMLINK)).apply(plan, replace=True)
+    assert result.status == FAILED
+    assert os.path.samefile(plan.link_path, plan.target)
+    assert os.listdir(source / "dst") == ["data[link].txt"]
@@ -0,0 +1,33 @@
+import time
+
+from junctwin_inodes import InodeMap, InodeSet
+
+
+def test_inode_map_keeps_names_in_order():
+    inodes = InodeMap(capacity=4)
+    for number in range(1000):
+        inodes.add(1, number % 10, f"/files/{number}")
+    assert len(inodes) == 1000
+    assert inodes.get(1, 3) == [f"/files/{number}" for number in range(3, 1000, 10)]
+    assert inodes.get(2, 3) == []
+    assert (1, 9) in inodes and (1, 10) not in inodes
+    assert sorted((dev, ino) for dev, ino, _ in inodes.items()) == [(1, ino) for ino in range(10)]
+
+
+def test_many_names_for_one_file_scale_linearly():
+    # Each add used to decode every earlier name of the file: 50000 names took minutes
+    inodes = InodeMap()
+    start = time.perf_counter()
+    for number in range(50000):
+        inodes.add(1, 1, f"/shared/target[link] {number}.txt")
+    assert time.perf_counter() - start < 2
+    assert len(inodes.get(1, 1)) == 50000
+
+
+def test_inode_set_reports_new_keys():
+    seen = InodeSet(capacity=4)
+    assert seen.add(1, 2)
+    assert not seen.add(1, 2)
+    assert all(seen.add(dev, 7) for dev in range(100))
+    assert (5, 7) in seen and (5, 8) not in seen
+    assert len(seen) == 101
@@ -0,0 +1,137 @@
+import errno
+import os
+
+import pytest
+
+import junctwin_journal
+from junctwin_backends import HARDLINK, SYMLINK, LinkError, PosixBackend
+from junctwin_engine import TO_SOURCE, CREATED, REPLACED, FAILED, LinkEngine, LinkPlan, plan_link
+from junctwin_journal import REMOVED, Journal, Transaction, describe_link, undo_batch
+
+
+class FailingBackend(PosixBackend):
+    """PosixBackend that cannot create links at some paths"""
+
+    def __init__(self, *names):
+        self.names = set(names)
+
+    def create(self, kind, link_path, target):
+        if os.path.basename(link_path) in self.names:
+            raise LinkError("Disk on fire", errno.EIO, str(link_path))
+        return super().create(kind, link_path, target)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = Journal(tmp_path / "journal.jsonl")
+    yield journal
+    journal.close()
+
+
+def _backups(folder):
+    return [name for name in os.listdir(folder) if name.endswith(".junctwin-old")]
+
+
+def test_rollback_restores_replaced_links(source, engine, journal):
+    other = source / "src" / "other.txt"
+    other.write_text("other")
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    os.symlink(other, plan.link_path)
+    new = plan_link(other, source / "dst", TO_SOURCE)
+
+    transaction = Transaction(engine, journal)
+    assert transaction.apply(plan, replace=True).status == REPLACED
+    assert transaction.apply(new).status == CREATED
+    transaction.rollback()
+
+    assert os.readlink(plan.link_path) == str(other)
+    assert not os.path.lexists(new.link_path)
+    assert _backups(source / "dst") == []
+
+
+def test_commit_removes_backups(source, engine, journal):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    os.symlink(source / "nowhere", plan.link_path)
+    transaction = Transaction(engine, journal)
+    transaction.apply(plan, replace=True)
+    transaction.commit()
+    assert os.path.samefile(plan.link_path, plan.target)
+    assert _backups(source / "dst") == []
+    assert [final for _, _, final in journal.batches()] == ["commit"]
+
+
+def test_failure_stops_the_rest_of_the_batch(source, journal):
+    plans = []
+    for name in ("a", "b", "c"):
+        (source / "src" / f"{name}.txt").write_text(name)
+        plans.append(plan_link(source / "src" / f"{name}.txt", source / "dst", TO_SOURCE))
+    transaction = Transaction(LinkEngine(FailingBackend("b[link].txt")), journal)
+
+    results = list(transaction.apply_all(plans))
+    assert [r.status for r in results] == [CREATED, FAILED, FAILED]
+    assert transaction.failed
+    transaction.rollback()
+    assert os.listdir(source / "dst") == []
+
+
+def test_undo_removes_created_links(source, engine, journal):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    transaction = Transaction(engine, journal)
+    transaction.apply(plan)
+    transaction.commit()
+
+    undo, results = undo_batch(journal, transaction.batch_id, engine)
+    undo.commit()
+    assert not os.path.lexists(plan.link_path)
+    assert os.path.exists(plan.target)
+    assert [r.status for r in results] == [REMOVED]
+
+
+def test_undo_restores_a_replaced_hard_link(source, engine, journal):
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    first = Transaction(engine, journal)
+    first.apply(plan)
+    first.commit()
+
+    other = source / "src" / "other.txt"
+    other.write_text("other")
+    second = Transaction(engine, journal)
+    second.apply(LinkPlan(SYMLINK, plan.link_path, other, ""), replace=True)
+    second.commit()
+    assert os.path.islink(plan.link_path)
+
+    undo, results = undo_batch(journal, second.batch_id, engine)
+    undo.commit()
+    assert [r.status for r in results] == [REPLACED]
+    assert describe_link(plan.link_path).kind == HARDLINK
+    assert os.path.samefile(plan.link_path, plan.target)
+
+
+def test_undo_of_unknown_batch_is_refused(engine, journal):
+    with pytest.raises(ValueError):
+        undo_batch(journal, "no-such-batch", engine)
+
+
+def test_undo_reports_a_backup_it_cannot_restore(source, engine, journal, monkeypatch):
+    # An interrupted batch: the old link moved aside, the new one made, never committed
+    plan = plan_link(source / "src" / "data.txt", source / "dst", TO_SOURCE)
+    os.symlink(source / "nowhere", plan.link_path)
+    interrupted = Transaction(engine, journal)
+    interrupted.apply(plan, replace=True)
+
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if interrupted.batch_id in str(src):
+            raise OSError(errno.EIO, "Disk on fire", str(src))
+        return real_replace(src, dst)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(junctwin_journal.os, "replace", replace)
+        undo, results = undo_batch(journal, interrupted.batch_id, engine)
+
+    assert results[-1].status == FAILED
+    assert undo.failed
+    undo.rollback()
+    # Nothing lost: the new link is back where it was
+    assert os.path.samefile(plan.link_path, plan.target)
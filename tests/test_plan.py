@@ -0,0 +1,94 @@
+import errno
+import os
+
+import pytest
+
+import junctwin_engine
+from junctwin_backends import HARDLINK, COPY, LinkError, PosixBackend
+from junctwin_engine import TO_SOURCE, FAILED, LinkEngine, plan_specs
+from junctwin_journal import Journal, Transaction
+from junctwin_plan import CREATE, REPLACE, REMOVE, UNCHANGED, apply_changes, diff_plans
+
+
+class NoHardlinkBackend(PosixBackend):
+    def create(self, kind, link_path, target):
+        if kind == HARDLINK:
+            raise LinkError("Not supported here", errno.EXDEV, str(link_path))
+        return super().create(kind, link_path, target)
+
+
+@pytest.fixture
+def specs(source):
+    specs = []
+    for name in ("a", "b", "c"):
+        (source / "src" / f"{name}.txt").write_text(name)
+        specs.append((source / "src" / f"{name}.txt", source / "dst", TO_SOURCE))
+    specs.append((source / "src" / "folder", source / "dst", TO_SOURCE))
+    return specs
+
+
+def _plan(specs, prune=False):
+    return list(diff_plans(plan_specs(specs), prune=prune))
+
+
+def _apply(changes, engine, journal_path, jobs=1):
+    journal = Journal(journal_path)
+    try:
+        transaction = Transaction(engine, journal)
+        results = list(apply_changes(changes, transaction, jobs))
+        transaction.commit()
+    finally:
+        journal.close()
+    return results
+
+
+def _actions(changes):
+    return [change.action for change in changes]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_applying_twice_changes_nothing(source, specs, engine, jobs):
+    changes = _plan(specs)
+    assert _actions(changes) == [CREATE] * 4
+    assert not any(r.status == FAILED for r in _apply(changes, engine, source / "j.jsonl", jobs))
+
+    again = _plan(specs, prune=True)
+    assert _actions(again) == [UNCHANGED] * 4
+    assert _apply(again, engine, source / "j.jsonl", jobs) == []
+
+
+def test_only_what_changed_is_planned(source, specs, engine):
+    _apply(_plan(specs), engine, source / "j.jsonl")
+    # A hard link whose file was replaced no longer shares its data
+    (source / "src" / "b.txt").unlink()
+    (source / "src" / "b.txt").write_text("new b")
+
+    changes = _plan(specs[1:], prune=True)
+    assert sorted(_actions(changes)) == sorted([REPLACE, UNCHANGED, UNCHANGED, REMOVE])
+    _apply(changes, engine, source / "j.jsonl")
+
+    assert _actions(_plan(specs[1:], prune=True)) == [UNCHANGED] * 3
+    assert not os.path.lexists(source / "dst" / "a[link].txt")
+    assert (source / "dst" / "b[link].txt").read_text() == "new b"
+
+
+def test_fallback_links_are_up_to_date(source, specs):
+    engine = LinkEngine(NoHardlinkBackend())
+    _apply(_plan(specs), engine, source / "j.jsonl")
+    assert sorted(os.listdir(source / "dst")) == ["a[symlink].txt", "b[symlink].txt", "c[symlink].txt",
+                                                  "folder[junct]"]
+
+    again = _plan(specs, prune=True)
+    assert _actions(again) == [UNCHANGED] * 4
+    assert [change.plan.link_path.name for change in again[:3]] == ["a[symlink].txt", "b[symlink].txt",
+                                                                    "c[symlink].txt"]
+
+
+def test_copies_are_compared_by_size_and_time(source, specs, engine, monkeypatch):
+    monkeypatch.setattr(junctwin_engine, "file_kinds", (COPY,))
+    _apply(_plan(specs[:1]), engine, source / "j.jsonl")
+    assert (source / "dst" / "a[copy].txt").read_text() == "a"
+    assert _actions(_plan(specs[:1])) == [UNCHANGED]
+
+    (source / "src" / "a.txt").write_text("changed")
+    assert _actions(_plan(specs[:1])) == [REPLACE]